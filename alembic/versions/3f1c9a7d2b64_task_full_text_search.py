@@ -0,0 +1,91 @@
+"""task full-text search
+
+Revision ID: 3f1c9a7d2b64
+Revises: 8c2e68301fff
+Create Date: 2026-10-18 12:04:31.512087
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2b64'
+down_revision: Union[str, None] = '8c2e68301fff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # the generated column is filled in for existing rows automatically
+        op.execute(
+            "ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', "
+            "coalesce(title, '') || ' ' || coalesce(description, ''))) STORED"
+        )
+        op.execute(
+            'CREATE INDEX IF NOT EXISTS ix_task_search_vector '
+            'ON task USING GIN (search_vector)'
+        )
+    elif dialect == 'sqlite':
+        # the FTS index is keyed by an explicit column, as VACUUM may
+        # renumber implicit rowids of `task`
+        op.execute('ALTER TABLE task ADD COLUMN search_rowid INTEGER')
+        op.execute('UPDATE task SET search_rowid = rowid')
+        op.execute(
+            'CREATE UNIQUE INDEX IF NOT EXISTS ix_task_search_rowid '
+            'ON task (search_rowid)'
+        )
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5("
+            "title, description, content='task', content_rowid='search_rowid', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            'CREATE TRIGGER IF NOT EXISTS task_fts_after_insert '
+            'AFTER INSERT ON task BEGIN '
+            'UPDATE task SET search_rowid = '
+            '(SELECT coalesce(max(search_rowid), 0) + 1 FROM task) '
+            'WHERE rowid = new.rowid; '
+            'INSERT INTO task_fts(rowid, title, description) '
+            "SELECT search_rowid, title, coalesce(description, '') FROM task "
+            'WHERE rowid = new.rowid; '
+            'END'
+        )
+        op.execute(
+            'CREATE TRIGGER IF NOT EXISTS task_fts_after_delete '
+            'AFTER DELETE ON task BEGIN '
+            'INSERT INTO task_fts(task_fts, rowid, title, description) '
+            "VALUES ('delete', old.search_rowid, old.title, "
+            "coalesce(old.description, '')); "
+            'END'
+        )
+        op.execute(
+            'CREATE TRIGGER IF NOT EXISTS task_fts_after_update '
+            'AFTER UPDATE OF title, description ON task BEGIN '
+            'INSERT INTO task_fts(task_fts, rowid, title, description) '
+            "VALUES ('delete', old.search_rowid, old.title, "
+            "coalesce(old.description, '')); "
+            'INSERT INTO task_fts(rowid, title, description) '
+            "VALUES (new.search_rowid, new.title, coalesce(new.description, '')); "
+            'END'
+        )
+        # index existing tasks
+        op.execute("INSERT INTO task_fts(task_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_task_search_vector')
+        op.execute('ALTER TABLE task DROP COLUMN IF EXISTS search_vector')
+    elif dialect == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS task_fts_after_update')
+        op.execute('DROP TRIGGER IF EXISTS task_fts_after_delete')
+        op.execute('DROP TRIGGER IF EXISTS task_fts_after_insert')
+        op.execute('DROP TABLE IF EXISTS task_fts')
+        op.execute('DROP INDEX IF EXISTS ix_task_search_rowid')
+        op.execute('ALTER TABLE task DROP COLUMN search_rowid')
@@ -0,0 +1,43 @@
+"""archived tasks keyset index
+
+Revision ID: 5d2b8f0c1e47
+Revises: a7c3e5f19b28
+Create Date: 2026-10-18 21:05:12.514309
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b8f0c1e47'
+down_revision: Union[str, None] = 'a7c3e5f19b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # `id` breaks ties of `added_at` in pages of archived tasks
+    archived = sa.column('is_archived').is_(True)
+    op.drop_index('ix_task_user_id_added_at_archived', table_name='task')
+    op.create_index(
+        'ix_task_user_id_added_at_id_archived',
+        'task',
+        ['user_id', 'added_at', 'id'],
+        sqlite_where=archived,
+        postgresql_where=archived,
+    )
+
+
+def downgrade() -> None:
+    archived = sa.column('is_archived').is_(True)
+    op.drop_index('ix_task_user_id_added_at_id_archived', table_name='task')
+    op.create_index(
+        'ix_task_user_id_added_at_archived',
+        'task',
+        ['user_id', 'added_at'],
+        sqlite_where=archived,
+        postgresql_where=archived,
+    )
@@ -0,0 +1,89 @@
+"""user stats
+
+Revision ID: 5f2c8e1a9d47
+Revises: 9b4e1d7c2a35
+Create Date: 2026-10-18 23:58:42.107395
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from planty.infrastructure.utils import GUID
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2c8e1a9d47'
+down_revision: Union[str, None] = '9b4e1d7c2a35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (sizes of existing attachments are unknown)
+    op.add_column('attachment', sa.Column('size', sa.BigInteger(), nullable=True))
+    op.create_table(
+        'user_stats',
+        sa.Column('user_id', GUID(), nullable=False),
+        sa.Column('tasks_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column(
+            'archived_tasks_count', sa.Integer(), server_default='0', nullable=False
+        ),
+        sa.Column('sections_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column(
+            'attachments_count', sa.Integer(), server_default='0', nullable=False
+        ),
+        sa.Column(
+            'storage_bytes', sa.BigInteger(), server_default='0', nullable=False
+        ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index('ix_user_added_at', 'user', ['added_at', 'id'])
+    op.create_index(
+        'ix_user_stats_tasks_count', 'user_stats', ['tasks_count', 'user_id']
+    )
+    op.create_index(
+        'ix_user_stats_attachments_count',
+        'user_stats',
+        ['attachments_count', 'user_id'],
+    )
+    op.create_index(
+        'ix_user_stats_storage_bytes', 'user_stats', ['storage_bytes', 'user_id']
+    )
+    # (every counter is counted separately, so that they aren't multiplied by
+    # each other like in joins of all user data)
+    op.execute(
+        '''
+        INSERT INTO user_stats (
+            user_id,
+            tasks_count,
+            archived_tasks_count,
+            sections_count,
+            attachments_count,
+            storage_bytes
+        )
+        SELECT
+            u.id,
+            (SELECT count(*) FROM task t WHERE t.user_id = u.id),
+            (SELECT count(*) FROM task t WHERE t.user_id = u.id AND t.is_archived),
+            (SELECT count(*) FROM section s WHERE s.user_id = u.id),
+            (
+                SELECT count(*) FROM attachment a
+                JOIN task t ON t.id = a.task_id
+                WHERE t.user_id = u.id
+            ),
+            0
+        FROM "user" u
+        '''
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_stats_storage_bytes', table_name='user_stats')
+    op.drop_index('ix_user_stats_attachments_count', table_name='user_stats')
+    op.drop_index('ix_user_stats_tasks_count', table_name='user_stats')
+    op.drop_index('ix_user_added_at', table_name='user')
+    op.drop_table('user_stats')
+    op.drop_column('attachment', 'size')
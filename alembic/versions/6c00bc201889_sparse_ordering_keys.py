@@ -0,0 +1,50 @@
+"""sparse ordering keys
+
+Revision ID: 6c00bc201889
+Revises: b8e4d2a17c53
+Create Date: 2026-10-18 16:12:45.730914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c00bc201889'
+down_revision: Union[str, None] = 'b8e4d2a17c53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (SQLite integers are 64-bit anyway)
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column('task', 'index', type_=sa.BigInteger())
+        op.alter_column('section', 'index', type_=sa.BigInteger())
+    # dense indexes 0..N-1 become keys with gaps of 2**20 between them (the
+    # step is inlined, so the migration doesn't change with the application)
+    op.execute(sa.text('UPDATE task SET "index" = "index" * 1048576'))
+    op.execute(sa.text('UPDATE section SET "index" = "index" * 1048576'))
+
+
+def downgrade() -> None:
+    # positions of tasks and sections among their siblings
+    op.execute(
+        sa.text(
+            'UPDATE task SET "index" = (SELECT count(*) FROM task AS sibling '
+            'WHERE sibling.section_id = task.section_id '
+            'AND sibling."index" < task."index")'
+        )
+    )
+    op.execute(
+        sa.text(
+            'UPDATE section SET "index" = (SELECT count(*) FROM section AS sibling '
+            'WHERE sibling.parent_id = section.parent_id '
+            'AND sibling."index" < section."index")'
+        )
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column('task', 'index', type_=sa.Integer())
+        op.alter_column('section', 'index', type_=sa.Integer())
@@ -0,0 +1,34 @@
+"""task section not archived index
+
+Revision ID: 7a3d5c9e2b18
+Revises: 5f2c8e1a9d47
+Create Date: 2026-10-18 21:12:40.518306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3d5c9e2b18'
+down_revision: Union[str, None] = '5f2c8e1a9d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (partial indexes' predicates must be the same as in queries, see models.py)
+    not_archived = sa.column('is_archived').is_(False)
+    op.create_index(
+        'ix_task_section_id_index_not_archived',
+        'task',
+        ['section_id', 'index'],
+        sqlite_where=not_archived,
+        postgresql_where=not_archived,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_task_section_id_index_not_archived', table_name='task')
@@ -0,0 +1,32 @@
+"""pending attachments
+
+Revision ID: 8d2b6f4e1a93
+Revises: c5e8a1f3b7d6
+Create Date: 2026-10-18 23:52:16.530284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2b6f4e1a93'
+down_revision: Union[str, None] = 'c5e8a1f3b7d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (existing attachments are considered uploaded)
+    op.add_column(
+        'attachment',
+        sa.Column(
+            'is_pending', sa.Boolean(), server_default=sa.false(), nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('attachment', 'is_pending')
@@ -0,0 +1,38 @@
+"""deleted objects outbox
+
+Revision ID: 9b4e1d7c2a35
+Revises: e3a9c61f7d05
+Create Date: 2026-10-18 23:41:09.318274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e1d7c2a35'
+down_revision: Union[str, None] = 'e3a9c61f7d05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'deleted_object',
+        sa.Column(
+            'id',
+            sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+            nullable=False,
+        ),
+        sa.Column('s3_file_key', sa.String(), nullable=False),
+        sa.Column('added_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_attachment_s3_file_key', 'attachment', ['s3_file_key'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attachment_s3_file_key', table_name='attachment')
+    op.drop_table('deleted_object')
@@ -0,0 +1,58 @@
+"""section materialized path
+
+Revision ID: a7c3e5f19b28
+Revises: d41f7a9e3c02
+Create Date: 2026-10-18 19:26:51.014377
+
+"""
+from typing import Sequence, Union
+from uuid import UUID
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5f19b28'
+down_revision: Union[str, None] = 'd41f7a9e3c02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    is_postgresql = bind.dialect.name == "postgresql"
+    op.add_column(
+        'section',
+        sa.Column(
+            'path',
+            sa.String(collation="C") if is_postgresql else sa.String(),
+            nullable=True,
+        ),
+    )
+
+    # "/<root id>/<parent id>/<id>/" (see `SectionModel.path`)
+    parent_ids = dict(bind.execute(sa.text('SELECT id, parent_id FROM section')).all())
+    paths: dict[object, str] = {}
+
+    def get_path(section_id: object) -> str:
+        if section_id not in paths:
+            parent_id = parent_ids[section_id]
+            parent_path = get_path(parent_id) if parent_id is not None else "/"
+            paths[section_id] = f"{parent_path}{UUID(str(section_id)).hex}/"
+        return paths[section_id]
+
+    if parent_ids:
+        bind.execute(
+            sa.text('UPDATE section SET path = :path WHERE id = :id'),
+            [{"id": id_, "path": get_path(id_)} for id_ in parent_ids],
+        )
+    # (SQLite can't alter columns without recreating the table)
+    if is_postgresql:
+        op.alter_column('section', 'path', nullable=False)
+    op.create_index('ix_section_path', 'section', ['path'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_section_path', table_name='section')
+    op.drop_column('section', 'path')
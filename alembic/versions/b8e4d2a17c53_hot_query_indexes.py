@@ -0,0 +1,55 @@
+"""hot query indexes
+
+Revision ID: b8e4d2a17c53
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 14:41:07.208163
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4d2a17c53'
+down_revision: Union[str, None] = '3f1c9a7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (partial indexes' predicates must be the same as in queries, see models.py)
+    not_archived = sa.column('is_archived').is_(False)
+    archived = sa.column('is_archived').is_(True)
+    op.create_index(
+        'ix_task_user_id_due_to_not_archived',
+        'task',
+        ['user_id', 'due_to'],
+        sqlite_where=not_archived,
+        postgresql_where=not_archived,
+    )
+    op.create_index(
+        'ix_task_user_id_added_at_archived',
+        'task',
+        ['user_id', 'added_at'],
+        sqlite_where=archived,
+        postgresql_where=archived,
+    )
+    op.create_index('ix_task_section_id_index', 'task', ['section_id', 'index'])
+    op.create_index('ix_section_user_id', 'section', ['user_id'])
+    op.create_index(
+        'ix_section_parent_id_index', 'section', ['parent_id', 'index']
+    )
+    op.create_index(
+        'ix_attachment_task_id_index', 'attachment', ['task_id', 'index']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_attachment_task_id_index', table_name='attachment')
+    op.drop_index('ix_section_parent_id_index', table_name='section')
+    op.drop_index('ix_section_user_id', table_name='section')
+    op.drop_index('ix_task_section_id_index', table_name='task')
+    op.drop_index('ix_task_user_id_added_at_archived', table_name='task')
+    op.drop_index('ix_task_user_id_due_to_not_archived', table_name='task')
@@ -0,0 +1,62 @@
+"""change versions
+
+Revision ID: c5e8a1f3b7d6
+Revises: 7a3d5c9e2b18
+Create Date: 2026-10-18 23:41:09.274815
+
+"""
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e8a1f3b7d6"
+down_revision: Union[str, None] = "7a3d5c9e2b18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column("data_version", sa.BigInteger(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "change",
+        sa.Column("version", sa.BigInteger(), server_default="0", nullable=False),
+    )
+    op.add_column("change", sa.Column("added_at", sa.DateTime(), nullable=True))
+
+    # Existing changes keep their ids as versions, so that cursors of clients
+    # stay valid (versions of these changes aren't contiguous, so clients
+    # syncing through them will load all the data once)
+    op.execute("UPDATE change SET version = id")
+    op.execute(
+        sa.text("UPDATE change SET added_at = :now").bindparams(
+            now=datetime.now(timezone.utc).replace(tzinfo=None)
+        )
+    )
+    op.execute(
+        'UPDATE "user" SET data_version = coalesce('
+        "(SELECT max(change.version) FROM change "
+        'WHERE change.user_id = "user".id), 0)'
+    )
+    with op.batch_alter_table("change") as batch_op:
+        batch_op.alter_column("version", server_default=None)
+        batch_op.alter_column("added_at", nullable=False)
+
+    op.drop_index("ix_change_user_id_id", table_name="change")
+    op.create_index("ix_change_user_id_version", "change", ["user_id", "version"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_change_user_id_version", table_name="change")
+    op.create_index("ix_change_user_id_id", "change", ["user_id", "id"])
+    with op.batch_alter_table("change") as batch_op:
+        batch_op.drop_column("added_at")
+        batch_op.drop_column("version")
+    op.drop_column("user", "data_version")
@@ -0,0 +1,31 @@
+"""user sections version
+
+Revision ID: d41f7a9e3c02
+Revises: 6c00bc201889
+Create Date: 2026-10-18 18:03:27.561204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f7a9e3c02'
+down_revision: Union[str, None] = '6c00bc201889'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'user',
+        sa.Column(
+            'sections_version', sa.Integer(), server_default='0', nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'sections_version')
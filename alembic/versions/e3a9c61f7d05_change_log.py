@@ -0,0 +1,42 @@
+"""change log
+
+Revision ID: e3a9c61f7d05
+Revises: 5d2b8f0c1e47
+Create Date: 2026-10-18 22:14:37.902561
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from planty.infrastructure.utils import GUID
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a9c61f7d05'
+down_revision: Union[str, None] = '5d2b8f0c1e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'change',
+        sa.Column(
+            'id',
+            sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+            nullable=False,
+        ),
+        sa.Column('user_id', GUID(), nullable=False),
+        sa.Column('entity_type', sa.String(), nullable=False),
+        sa.Column('entity_id', GUID(), nullable=False),
+        sa.Column('is_removed', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_change_user_id_id', 'change', ['user_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_change_user_id_id', table_name='change')
+    op.drop_table('change')
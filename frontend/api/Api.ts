@@ -107,6 +107,12 @@ export interface RequestAttachmentUpload {
   aes_key_b64: string;
   /** Aes Iv B64 */
   aes_iv_b64: string;
+  /**
+   * Size
+   * @exclusiveMin 0
+   * @max 52428800
+   */
+  size: number;
 }
 
 /** SectionCreateRequest */
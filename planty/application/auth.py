@@ -1,10 +1,14 @@
-from typing import Any, AsyncGenerator
-from fastapi import Depends
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, Optional
+from fastapi import Depends, Request
+from fastapi_users import BaseUserManager, exceptions
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 import uuid
 from fastapi_users import FastAPIUsers
 from planty.application.services.user_manager import UserManager
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from fastapi_users_db_sqlalchemy.access_token import (
     SQLAlchemyAccessTokenDatabase,
 )
@@ -19,6 +23,7 @@ from fastapi_users.authentication import CookieTransport
 
 
 from planty.domain.task import User
+from planty.infrastructure.cache import access_token_cache
 from planty.infrastructure.database import get_async_session
 from planty.infrastructure.models import AccessTokenModel, UserModel
 
@@ -44,12 +49,71 @@ async def get_access_token_db(
     yield SQLAlchemyAccessTokenDatabase(session, AccessTokenModel)
 
 
+class CachedDatabaseStrategy(DatabaseStrategy[UserModel, uuid.UUID, AccessTokenModel]):
+    # Every authenticated request reads the token and the user from the
+    # database, so users are cached by tokens (see `access_token_cache`) and
+    # authentication of the following requests costs no database round trips.
+    #
+    # Column values are cached instead of models, and every request gets its
+    # own detached copy of the user. So the user can still be updated or
+    # deleted in the request's session (e.g. by the users router), and
+    # concurrent requests don't share the same instance.
+    #
+    # Tokens are looked up like `DatabaseStrategy.read_token` does, but the
+    # token is kept to cache the user no longer than the token lives.
+
+    async def read_token(
+        self,
+        token: Optional[str],
+        user_manager: BaseUserManager[UserModel, uuid.UUID],
+    ) -> Optional[UserModel]:
+        if token is None:
+            return None
+        user_values = access_token_cache.get(token)
+        if user_values is not None:
+            user = UserModel(**user_values)
+            make_transient_to_detached(user)
+            return user
+
+        max_age = None
+        if self.lifetime_seconds:
+            max_age = datetime.now(timezone.utc) - timedelta(
+                seconds=self.lifetime_seconds
+            )
+        access_token = await self.database.get_by_token(token, max_age)
+        if access_token is None:
+            return None
+        try:
+            user = await user_manager.get(user_manager.parse_id(access_token.user_id))
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+
+        ttl = None
+        if max_age is not None:
+            ttl = (access_token.created_at - max_age).total_seconds()
+        access_token_cache.set(token, user.id, _get_column_values(user), ttl=ttl)
+        return user
+
+    async def destroy_token(self, token: str, user: UserModel) -> None:
+        await super().destroy_token(token, user)
+        # (after the token is removed, so that it can't be cached again by a
+        # concurrent request)
+        access_token_cache.invalidate(token)
+
+
+_user_columns = [attr.key for attr in inspect(UserModel).column_attrs]
+
+
+def _get_column_values(user: UserModel) -> dict[str, Any]:
+    return {column: getattr(user, column) for column in _user_columns}
+
+
 def get_database_strategy(
     access_token_db: AccessTokenDatabase[AccessTokenModel] = Depends(
         get_access_token_db
     ),
 ) -> DatabaseStrategy[Any, Any, Any]:
-    return DatabaseStrategy(access_token_db, lifetime_seconds=TOKEN_LIFETIME)
+    return CachedDatabaseStrategy(access_token_db, lifetime_seconds=TOKEN_LIFETIME)
 
 
 cookie_transport = CookieTransport(cookie_max_age=TOKEN_LIFETIME)
@@ -78,13 +142,41 @@ current_user_dependency = fastapi_users_obj.current_user(verified=True)
 admin_user_dependency = fastapi_users_obj.current_user(superuser=True)
 
 
-def current_user(
+# Authentication uses the session of the request (`get_async_session` is
+# resolved once per request), which is then used by the unit of work of the
+# route too. The transaction of authentication (if the user wasn't cached) is
+# finished right away, so that its connection isn't held while the route
+# works, e.g. reads in a read-only unit of work or waits for S3.
+
+
+async def current_user(
+    request: Request,
     user: UserModel = Depends(current_user_dependency),
+    session: AsyncSession = Depends(get_async_session),
 ) -> User:
+    await _finish_transaction(session)
+    _remember_superuser(request, user)
     return user.to_entity()
 
 
-def admin_user(
+async def admin_user(
+    request: Request,
     user: UserModel = Depends(admin_user_dependency),
+    session: AsyncSession = Depends(get_async_session),
 ) -> User:
+    await _finish_transaction(session)
+    _remember_superuser(request, user)
     return user.to_entity()
+
+
+async def _finish_transaction(session: AsyncSession) -> None:
+    # (nothing is written, and loaded users aren't expired on commit unlike
+    # on rollback)
+    if session.in_transaction():
+        await session.commit()
+
+
+def _remember_superuser(request: Request, user: UserModel) -> None:
+    # (middlewares see the state of the request, e.g. only superusers get
+    # profiles of their requests, see `ProfilingMiddleware`)
+    request.state.is_superuser = user.is_superuser
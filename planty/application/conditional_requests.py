@@ -0,0 +1,46 @@
+# Conditional GET requests: responses with user data get an ETag made of the
+# version of this data (`user.data_version`, which is incremented by every
+# change in commit order, see `SQLAlchemyChangeLogRepository`). So if the
+# client's copy is current, the version is the only thing which is read from
+# the database and the client gets "304 Not Modified" without the response
+# body.
+
+from uuid import UUID
+
+from fastapi import Request, Response, status
+
+from planty.application.uow import IUnitOfWork
+
+# (responses may be stored by browsers, but must be revalidated every time)
+CACHE_CONTROL = "private, no-cache"
+
+
+async def get_user_data_etag(uow: IUnitOfWork, user_id: UUID, *extra: object) -> str:
+    # `extra` is anything else the response depends on (e.g. today's date).
+    # The user id is included so that a copy of another user, who was logged
+    # in the same browser before, can't be considered current.
+    version = await uow.change_log_repo.get_data_version(user_id)
+    return '"' + ".".join([user_id.hex, str(version), *map(str, extra)]) + '"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # (If-None-Match uses weak comparison)
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+def make_not_modified_response(etag: str) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_etag(response, etag)
+    return response
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
@@ -43,11 +43,35 @@ class AttachmentNotFoundException(EntityNotFoundException):
     entity_name = "attachment"
 
 
+class MultipartUploadNotFoundException(EntityNotFoundException):
+    entity_name = "multipart upload"
+
+
+class IncompleteMultipartUpload(PlantyException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    detail = "Not all parts of the attachment are uploaded"
+
+
 class IncorrectDateInterval(PlantyException):
     status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
     detail = "Incorrect date interval"
 
 
+class TooManyPeriods(PlantyException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    detail = "Too many periods in the date interval"
+
+
+class IncorrectCursor(PlantyException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    detail = "Incorrect pagination cursor"
+
+
+class SyncCursorExpired(PlantyException):
+    status_code = status.HTTP_410_GONE
+    detail = "Changes since the cursor are no longer available, load all data again"
+
+
 class ForbiddenException(PlantyException):
     status_code = status.HTTP_403_FORBIDDEN
     detail = "You're not authorized for this"
@@ -0,0 +1,153 @@
+# Per-route metrics of requests: how many requests were handled, how much
+# time they took and how many SQL statements they sent (and how long these
+# took). Statements are counted by listeners of engine events, which add them
+# to the request being handled (it's kept in a context variable, so
+# concurrent requests aren't mixed up). Metrics are exposed in the Prometheus
+# text format on `/metrics`.
+#
+# Metrics are kept by every process separately, as Prometheus expects.
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# (requests not matched by any route, e.g. with 404 for unknown paths)
+UNMATCHED_ROUTE = "unmatched"
+
+
+@dataclass
+class RequestQueries:
+    statements: int = 0
+    db_time: float = 0.0
+
+
+@dataclass
+class RouteMetrics:
+    requests: int = 0
+    time: float = 0.0
+    statements: int = 0
+    db_time: float = 0.0
+    # the most statements sent by one request
+    max_statements: int = 0
+
+
+_current_request: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "current_request", default=None
+)
+
+
+class RequestMetrics:
+    def __init__(self) -> None:
+        # (method, route path) -> metrics
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+
+    def attach(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", _after_execute)
+
+    def record(
+        self, method: str, route: str, queries: RequestQueries, duration: float
+    ) -> None:
+        metrics = self.routes.setdefault((method, route), RouteMetrics())
+        metrics.requests += 1
+        metrics.time += duration
+        metrics.statements += queries.statements
+        metrics.db_time += queries.db_time
+        metrics.max_statements = max(metrics.max_statements, queries.statements)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name, kind, help_text, attribute in [
+            (
+                "planty_http_requests_total",
+                "counter",
+                "Requests handled by the route",
+                "requests",
+            ),
+            (
+                "planty_http_request_duration_seconds_total",
+                "counter",
+                "Time spent handling requests of the route",
+                "time",
+            ),
+            (
+                "planty_db_statements_total",
+                "counter",
+                "SQL statements sent by requests of the route",
+                "statements",
+            ),
+            (
+                "planty_db_duration_seconds_total",
+                "counter",
+                "Time spent executing SQL statements of requests of the route",
+                "db_time",
+            ),
+            (
+                "planty_db_statements_max",
+                "gauge",
+                "The most SQL statements sent by one request of the route",
+                "max_statements",
+            ),
+        ]:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, route), metrics in sorted(self.routes.items()):
+                labels = f'method="{_escape(method)}",route="{_escape(route)}"'
+                lines.append(f"{name}{{{labels}}} {getattr(metrics, attribute)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        self.routes.clear()
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _before_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, *args: Any
+) -> None:
+    queries = _current_request.get()
+    if queries is not None:
+        # (failed statements are counted too, but not their time)
+        queries.statements += 1
+        context.metrics_start_time = time.perf_counter()
+
+
+def _after_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, *args: Any
+) -> None:
+    queries = _current_request.get()
+    if queries is not None and hasattr(context, "metrics_start_time"):
+        queries.db_time += time.perf_counter() - context.metrics_start_time
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries()
+        token = _current_request.set(queries)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_request.reset(token)
+            # (the matched route is put into the scope by the router)
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            self.metrics.record(
+                scope["method"], route, queries, time.perf_counter() - start
+            )
@@ -0,0 +1,129 @@
+# Profiling of requests with pyinstrument, which is enabled by
+# `settings.profiling_enabled` (so that it can be used in production without
+# redeploying, with pyinstrument installed):
+# - a superuser gets the profile of a request instead of its response by
+#   adding `?profile=html` (or `speedscope`) or the `X-Profile` header, other
+#   users get the response as usual. Requests without the auth cookie aren't
+#   profiled at all, and responses are held back only till it's known that
+#   the user is a superuser, so other clients can't make the app buffer them
+# - `settings.profiling_sample_rate` of all requests are profiled to
+#   `settings.profiling_dir`
+#
+# Only the task of the request is profiled (pyinstrument's async mode), so
+# concurrent requests don't get into the profile.
+
+import asyncio
+import random
+import re
+from pathlib import Path
+from typing import Literal, Optional
+
+from loguru import logger
+from pyinstrument import Profiler
+from pyinstrument.renderers import SpeedscopeRenderer
+from starlette.datastructures import Headers, QueryParams
+from starlette.requests import HTTPConnection
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from planty.application.auth import cookie_transport
+from planty.config import settings
+from planty.utils import get_datetime_now
+
+ProfileFormat = Literal["html", "speedscope"]
+
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_HEADER = "x-profile"
+
+_MEDIA_TYPES = {"html": "text/html", "speedscope": "application/json"}
+_FILE_EXTENSIONS = {"html": "html", "speedscope": "speedscope.json"}
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: float = settings.profiling_sample_rate,
+        directory: str = settings.profiling_dir,
+        sampled_format: ProfileFormat = settings.profiling_format,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.sampled_format: ProfileFormat = sampled_format
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        requested_format = _get_requested_format(scope)
+        if cookie_transport.cookie_name not in HTTPConnection(scope).cookies:
+            # (anonymous requests can't be of a superuser)
+            requested_format = None
+        is_sampled = random.random() < self.sample_rate
+        if requested_format is None and not is_sampled:
+            await self.app(scope, receive, send)
+            return
+
+        # The response is held back if the user can get the profile instead.
+        # The user is known by the start of the response (see `current_user`),
+        # responses of other users are sent as usual from then on.
+        messages: list[Message] = []
+        is_held_back = requested_format is not None
+        state = scope.setdefault("state", {})
+
+        async def send_or_hold_back(message: Message) -> None:
+            nonlocal is_held_back
+            if (
+                is_held_back
+                and message["type"] == "http.response.start"
+                and not state.get("is_superuser", False)
+            ):
+                is_held_back = False
+            if is_held_back:
+                messages.append(message)
+            else:
+                await send(message)
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_or_hold_back)
+        finally:
+            profiler.stop()
+            if is_sampled:
+                try:
+                    await self._save(scope, profiler)
+                except OSError:
+                    logger.exception("Failed to save the profile of a request")
+
+        if requested_format is None or not is_held_back:
+            return
+        profile = await asyncio.to_thread(_render, profiler, requested_format)
+        response = Response(profile, media_type=_MEDIA_TYPES[requested_format])
+        await response(scope, receive, send)
+
+    async def _save(self, scope: Scope, profiler: Profiler) -> None:
+        path_slug = re.sub(r"\W+", "_", scope["path"]).strip("_")
+        file_name = (
+            f"{get_datetime_now():%Y%m%dT%H%M%S%f}-{scope['method']}-{path_slug}"
+            f".{_FILE_EXTENSIONS[self.sampled_format]}"
+        )
+        profile = await asyncio.to_thread(_render, profiler, self.sampled_format)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread((self.directory / file_name).write_text, profile)
+
+
+def _get_requested_format(scope: Scope) -> Optional[ProfileFormat]:
+    value = QueryParams(scope["query_string"]).get(PROFILE_QUERY_PARAM)
+    if value is None:
+        value = Headers(scope=scope).get(PROFILE_HEADER)
+    if value is None:
+        return None
+    return "speedscope" if value == "speedscope" else "html"
+
+
+def _render(profiler: Profiler, profile_format: ProfileFormat) -> str:
+    if profile_format == "speedscope":
+        return profiler.output(renderer=SpeedscopeRenderer())
+    return profiler.output_html()
@@ -1,15 +1,31 @@
 from datetime import date
+from typing import Optional, Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status, Request
+from fastapi import APIRouter, Depends, Query, Response, status, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.ext.asyncio import AsyncSession
+from types_aiobotocore_s3 import S3Client
 
 from planty.application.auth import admin_user, current_user
+from planty.application.conditional_requests import (
+    get_user_data_etag,
+    is_not_modified,
+    make_not_modified_response,
+    set_etag,
+)
+from planty.application.exceptions import IncorrectDateInterval, TooManyPeriods
 from planty.application.schemas import (
     ArchivedTasksResponse,
+    AttachmentsGCStats,
     AttachmentUploadInfo,
+    CachesStatsResponse,
+    DatabaseRoutingStats,
+    MultipartUploadInfo,
     RequestAttachmentUpload,
+    RequestAttachmentsUpload,
+    RequestMultipartAttachmentUpload,
     SectionCreateRequest,
     SectionCreateResponse,
     SectionMoveRequest,
@@ -19,11 +35,13 @@ from planty.application.schemas import (
     SectionUpdateResponse,
     ShuffleSectionRequest,
     StatsResponse,
+    SyncResponse,
     TaskCreateRequest,
     TaskCreateResponse,
     TaskMoveRequest,
     TaskRemoveRequest,
     TasksByDatesResponse,
+    TasksCountsResponse,
     TaskSearchResponse,
     TaskToggleArchivedRequest,
     TaskToggleCompletedRequest,
@@ -31,23 +49,40 @@ from planty.application.schemas import (
     TaskUpdateResponse,
 )
 from planty.application.services.admin import AdminService
+from planty.application.services.attachments_gc import (
+    AttachmentsGarbageCollector,
+    get_attachments_gc,
+)
+from planty.application.services.sync import SyncService
 from planty.application.services.tasks import (
     SectionService,
     TaskService,
 )
-from planty.application.uow import SqlAlchemyUnitOfWork
+from planty.application.uow import ReadOnlyUnitOfWork, SqlAlchemyUnitOfWork
+from planty.domain.calendar import count_periods
 from planty.domain.task import User
+from planty.domain.types import CalendarPeriodType, UserStatsSortKey
+from planty.infrastructure.database import get_async_session
+from planty.infrastructure.s3 import get_s3_client
+from planty.utils import get_today
 
 router = APIRouter(tags=["User tasks"], prefix="/api")
 
 templates = Jinja2Templates(directory="planty/application/templates")
 
+MAX_SEARCH_LIMIT = 200
+MAX_ARCHIVED_TASKS_LIMIT = 200
+MAX_USER_STATS_LIMIT = 500
+MAX_COUNT_PERIODS = 366
+
 
 @router.post("/task", status_code=status.HTTP_201_CREATED)
 async def create_task(
-    task_data: TaskCreateRequest, user: User = Depends(current_user)
+    task_data: TaskCreateRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> TaskCreateResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         task_id = await section_service.create_task(user.id, task_data)
         await uow.commit()
@@ -57,9 +92,11 @@ async def create_task(
 # TODO: use query params for DELETE, body must be empty!
 @router.delete("/task")
 async def remove_task(
-    task_data: TaskRemoveRequest, user: User = Depends(current_user)
+    task_data: TaskRemoveRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> None:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         await section_service.remove_task(user.id, task_data.task_id)
         await uow.commit()
@@ -67,46 +104,78 @@ async def remove_task(
 
 @router.patch("/task")
 async def update_task(
-    task_data: TaskUpdateRequest, user: User = Depends(current_user)
+    task_data: TaskUpdateRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> TaskUpdateResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         task_service = TaskService(uow=uow)
         task = await task_service.update_task(user.id, task_data)
         await uow.commit()
         return TaskUpdateResponse(task=task)
 
 
-@router.get("/task/by_date")
+@router.get("/task/by_date", response_model=TasksByDatesResponse)
 async def get_tasks_by_date(
+    request: Request,
     not_before: date,
     not_after: date,
     user: User = Depends(current_user),
     with_overdue: bool = False,
-) -> TasksByDatesResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+) -> Response:
+    async with ReadOnlyUnitOfWork(user.id) as uow:
+        # (tasks before today aren't shown, and overdue ones depend on it too)
+        etag = await get_user_data_etag(uow, user.id, get_today())
+        if is_not_modified(request, etag):
+            return make_not_modified_response(etag)
         task_service = TaskService(uow=uow)
         tasks_by_date = await task_service.get_tasks_by_date(
             user.id, not_before, not_after, with_overdue
         )
-        await uow.commit()
+        set_etag(tasks_by_date, etag)
         return tasks_by_date
 
 
+@router.get("/task/count_by_period")
+async def get_tasks_count_by_period(
+    not_before: date,
+    not_after: date,
+    user: User = Depends(current_user),
+    period: CalendarPeriodType = "weeks",
+) -> TasksCountsResponse:
+    if not_after < not_before:
+        raise IncorrectDateInterval()
+    if count_periods(not_before, not_after, period) > MAX_COUNT_PERIODS:
+        raise TooManyPeriods()
+    async with ReadOnlyUnitOfWork(user.id) as uow:
+        task_service = TaskService(uow=uow)
+        return await task_service.get_tasks_count_by_periods(
+            user.id, not_before, not_after, period
+        )
+
+
 @router.get("/task/search")
 async def get_tasks_by_search_query(
-    query: str, user: User = Depends(current_user)
+    query: str,
+    user: User = Depends(current_user),
+    limit: int = Query(default=50, ge=1, le=MAX_SEARCH_LIMIT),
+    offset: int = Query(default=0, ge=0),
 ) -> TaskSearchResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with ReadOnlyUnitOfWork(user.id) as uow:
         task_service = TaskService(uow=uow)
-        tasks = await task_service.get_tasks_by_search_query(user.id, query)
+        tasks = await task_service.get_tasks_by_search_query(
+            user.id, query, limit=limit, offset=offset
+        )
         return tasks
 
 
 @router.post("/task/move")
 async def move_task(
-    request: TaskMoveRequest, user: User = Depends(current_user)
+    request: TaskMoveRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> None:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         await section_service.move_task(user.id, request)
         await uow.commit()
@@ -115,9 +184,11 @@ async def move_task(
 # TODO: make this endpoint idempotent
 @router.post("/task/toggle_completed")
 async def toggle_task_completed(
-    request: TaskToggleCompletedRequest, user: User = Depends(current_user)
+    request: TaskToggleCompletedRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> SectionResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         section = await section_service.toggle_task_completed(
             user.id,
@@ -131,9 +202,11 @@ async def toggle_task_completed(
 # TODO: make this endpoint idempotent
 @router.post("/task/toggle_archived")
 async def toggle_task_archived(
-    request: TaskToggleArchivedRequest, user: User = Depends(current_user)
+    request: TaskToggleArchivedRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> SectionResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         section = await section_service.toggle_task_archived(
             user.id,
@@ -151,6 +224,7 @@ async def toggle_task_archived(
         "storage. The frontend is responsible for encrypting the file client-side "
         "using AES-128 CBC with the provided key and IV. After encryption, the frontend "
         "directly uploads the file to the S3 storage using the pre-signed URL and fields. "
+        "The storage accepts only a file of the declared `size` (of the encrypted file)."
         "\n\nThe frontend can include the 'Content-Disposition' header in the "
         "upload request to specify the file name, ensuring that the file is downloaded "
         "later with the correct name."
@@ -159,60 +233,209 @@ async def toggle_task_archived(
     ),
 )
 async def get_attachment_uploading_info(
-    request: RequestAttachmentUpload, user: User = Depends(current_user)
+    request: RequestAttachmentUpload,
+    user: User = Depends(current_user),
+    s3_client: S3Client = Depends(get_s3_client),
+    session: AsyncSession = Depends(get_async_session),
 ) -> AttachmentUploadInfo:
-    async with SqlAlchemyUnitOfWork() as uow:
-        task_service = TaskService(uow=uow)
+    async with SqlAlchemyUnitOfWork(session) as uow:
+        task_service = TaskService(uow=uow, s3_client=s3_client)
         upload_info = await task_service.add_attachment(user.id, request)
         await uow.commit()
     return upload_info
 
 
+@router.post(
+    "/task/attachments",
+    description=(
+        "Same as `POST /task/attachment`, but for many attachments (of any tasks) "
+        "at once. Upload infos are returned in the order of requested attachments."
+    ),
+)
+async def get_attachments_uploading_info(
+    request: RequestAttachmentsUpload,
+    user: User = Depends(current_user),
+    s3_client: S3Client = Depends(get_s3_client),
+    session: AsyncSession = Depends(get_async_session),
+) -> list[AttachmentUploadInfo]:
+    async with SqlAlchemyUnitOfWork(session) as uow:
+        task_service = TaskService(uow=uow, s3_client=s3_client)
+        upload_infos = await task_service.add_attachments(user.id, request.attachments)
+        await uow.commit()
+    return upload_infos
+
+
+@router.post(
+    "/task/attachment/multipart",
+    description=(
+        "Same as `POST /task/attachment`, but for big attachments, which are "
+        "uploaded in parts. Every part is uploaded with PUT to its own pre-signed "
+        "URL (parts can be uploaded in parallel), and then the upload is completed "
+        "with `POST .../multipart/{upload_id}/complete`."
+        "\n\nIf the upload fails, `GET .../multipart/{upload_id}` returns the "
+        "already uploaded parts (with fresh URLs for the rest of them), so the "
+        "upload can be resumed."
+    ),
+)
+async def start_multipart_attachment_upload(
+    request: RequestMultipartAttachmentUpload,
+    user: User = Depends(current_user),
+    s3_client: S3Client = Depends(get_s3_client),
+    session: AsyncSession = Depends(get_async_session),
+) -> MultipartUploadInfo:
+    async with SqlAlchemyUnitOfWork(session) as uow:
+        task_service = TaskService(uow=uow, s3_client=s3_client)
+        upload_info = await task_service.add_multipart_attachment(user.id, request)
+        await uow.commit()
+    return upload_info
+
+
+@router.get("/task/{task_id}/attachment/{attachment_id}/multipart/{upload_id}")
+async def get_multipart_attachment_upload(
+    task_id: UUID,
+    attachment_id: UUID,
+    upload_id: str,
+    user: User = Depends(current_user),
+    s3_client: S3Client = Depends(get_s3_client),
+) -> MultipartUploadInfo:
+    async with ReadOnlyUnitOfWork(user.id) as uow:
+        task_service = TaskService(uow=uow, s3_client=s3_client)
+        return await task_service.get_multipart_upload(
+            user.id, task_id, attachment_id, upload_id
+        )
+
+
+@router.post(
+    "/task/{task_id}/attachment/{attachment_id}/multipart/{upload_id}/complete"
+)
+async def complete_multipart_attachment_upload(
+    task_id: UUID,
+    attachment_id: UUID,
+    upload_id: str,
+    user: User = Depends(current_user),
+    s3_client: S3Client = Depends(get_s3_client),
+    session: AsyncSession = Depends(get_async_session),
+) -> None:
+    async with SqlAlchemyUnitOfWork(session) as uow:
+        task_service = TaskService(uow=uow, s3_client=s3_client)
+        await task_service.complete_multipart_upload(
+            user.id, task_id, attachment_id, upload_id
+        )
+        await uow.commit()
+
+
+@router.delete("/task/{task_id}/attachment/{attachment_id}/multipart/{upload_id}")
+async def abort_multipart_attachment_upload(
+    task_id: UUID,
+    attachment_id: UUID,
+    upload_id: str,
+    user: User = Depends(current_user),
+    s3_client: S3Client = Depends(get_s3_client),
+    session: AsyncSession = Depends(get_async_session),
+) -> None:
+    async with SqlAlchemyUnitOfWork(session) as uow:
+        task_service = TaskService(uow=uow, s3_client=s3_client)
+        await task_service.abort_multipart_upload(
+            user.id, task_id, attachment_id, upload_id
+        )
+        await uow.commit()
+
+
 @router.delete("/task/{task_id}/attachment/{attachment_id}")
 async def remove_attachment(
-    task_id: UUID, attachment_id: UUID, user: User = Depends(current_user)
+    task_id: UUID,
+    attachment_id: UUID,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> None:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         task_service = TaskService(uow=uow)
         await task_service.remove_attachment(user.id, task_id, attachment_id)
         await uow.commit()
 
 
-@router.get("/tasks/archived")
+@router.get(
+    "/tasks/archived",
+    response_model=ArchivedTasksResponse,
+    description=(
+        "Returns archived tasks from the most recently added ones. With `limit` "
+        "or `cursor`, they are returned by pages (follow `next_cursor`), "
+        "otherwise all of them are returned at once."
+    ),
+)
 async def get_archived_tasks(
+    request: Request,
+    response: Response,
     user: User = Depends(current_user),
-) -> ArchivedTasksResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_ARCHIVED_TASKS_LIMIT),
+    cursor: Optional[str] = None,
+) -> Union[ArchivedTasksResponse, Response]:
+    async with ReadOnlyUnitOfWork(user.id) as uow:
+        etag = await get_user_data_etag(uow, user.id)
+        if is_not_modified(request, etag):
+            return make_not_modified_response(etag)
         task_service = TaskService(uow=uow)
-        return await task_service.get_archived_tasks(user.id)
+        archived_tasks = await task_service.get_archived_tasks(user.id, limit, cursor)
+        set_etag(response, etag)
+        return archived_tasks
+
+
+@router.get(
+    "/sync",
+    description=(
+        "Returns the current state of tasks, sections and attachments changed "
+        "since the given cursor (and ids of removed ones). Without `since`, only "
+        "the current cursor is returned: take it before loading all the data, "
+        "then keep syncing from the returned cursors while `has_more` is true. "
+        "Changes are kept for a limited time: with an older cursor, 410 is "
+        "returned, then load all the data again."
+    ),
+)
+async def sync(
+    user: User = Depends(current_user),
+    since: Optional[int] = Query(default=None, ge=0),
+) -> SyncResponse:
+    async with ReadOnlyUnitOfWork(user.id) as uow:
+        sync_service = SyncService(uow=uow)
+        return await sync_service.get_changes(user.id, since)
 
 
 @router.post("/section", status_code=status.HTTP_201_CREATED)
 async def create_section(
-    section_data: SectionCreateRequest, user: User = Depends(current_user)
+    section_data: SectionCreateRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> SectionCreateResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         section = await section_service.add(user.id, section_data)
         await uow.commit()
         return SectionCreateResponse(id=section.id)
 
 
-@router.get("/section/{section_id}")
+@router.get("/section/{section_id}", response_model=SectionResponse)
 async def get_section(
-    section_id: UUID, user: User = Depends(current_user)
-) -> SectionResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    request: Request, section_id: UUID, user: User = Depends(current_user)
+) -> Response:
+    async with ReadOnlyUnitOfWork(user.id) as uow:
         section_service = SectionService(uow=uow)
+        # (304 must not confirm the existence of somebody else's section)
+        await section_service.check_section_owner(user.id, section_id)
+        etag = await get_user_data_etag(uow, user.id)
+        if is_not_modified(request, etag):
+            return make_not_modified_response(etag)
         section = await section_service.get_section(user.id, section_id)
+        set_etag(section, etag)
         return section
 
 
 @router.patch("/section")
 async def patch_section(
-    section_data: SectionUpdateRequest, user: User = Depends(current_user)
+    section_data: SectionUpdateRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> SectionUpdateResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         section = await section_service.update_section(user.id, section_data)
         await uow.commit()
@@ -221,33 +444,43 @@ async def patch_section(
 
 @router.post("/section/move")
 async def move_section(
-    request: SectionMoveRequest, user: User = Depends(current_user)
+    request: SectionMoveRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> None:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         await section_service.move_section(user.id, request)
         await uow.commit()
 
 
-@router.get("/sections")
+@router.get("/sections", response_model=SectionsListResponse)
 async def get_sections(
+    request: Request,
+    response: Response,
     user: User = Depends(current_user),
     leaves_only: bool = False,
     as_tree: bool = True,
-) -> SectionsListResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+) -> Union[SectionsListResponse, Response]:
+    async with ReadOnlyUnitOfWork(user.id) as uow:
+        etag = await get_user_data_etag(uow, user.id)
+        if is_not_modified(request, etag):
+            return make_not_modified_response(etag)
         section_service = SectionService(uow=uow)
         sections = await section_service.get_all_sections(
             user.id, leaves_only=leaves_only, as_tree=as_tree
         )
+        set_etag(response, etag)
         return sections
 
 
 @router.post("/section/shuffle")
 async def shuffle_section(
-    request: ShuffleSectionRequest, user: User = Depends(current_user)
+    request: ShuffleSectionRequest,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> SectionResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         section_service = SectionService(uow=uow)
         section = await section_service.shuffle(user.id, request)
         await uow.commit()
@@ -259,10 +492,40 @@ async def shuffle_section(
 
 
 @router.get("/user/stats")
-async def get_stats(admin_user: User = Depends(admin_user)) -> StatsResponse:
-    async with SqlAlchemyUnitOfWork() as uow:
+async def get_stats(
+    admin_user: User = Depends(admin_user),
+    sort_by: UserStatsSortKey = "added_at",
+    descending: bool = True,
+    limit: int = Query(default=50, ge=1, le=MAX_USER_STATS_LIMIT),
+    offset: int = Query(default=0, ge=0),
+) -> StatsResponse:
+    async with ReadOnlyUnitOfWork() as uow:
         admin_service = AdminService(uow=uow)
-        return await admin_service.get_stats()
+        return await admin_service.get_stats(
+            sort_by, descending, limit=limit, offset=offset
+        )
+
+
+@router.get("/user/stats/caches")
+async def get_caches_stats(
+    admin_user: User = Depends(admin_user),
+) -> CachesStatsResponse:
+    return AdminService.get_caches_stats()
+
+
+@router.get("/user/stats/database")
+async def get_database_stats(
+    admin_user: User = Depends(admin_user),
+) -> DatabaseRoutingStats:
+    return AdminService.get_database_stats()
+
+
+@router.get("/user/stats/attachments_gc")
+async def get_attachments_gc_stats(
+    admin_user: User = Depends(admin_user),
+    attachments_gc: AttachmentsGarbageCollector = Depends(get_attachments_gc),
+) -> AttachmentsGCStats:
+    return await attachments_gc.get_stats()
 
 
 @router.get("/user/verify", response_class=HTMLResponse)
@@ -273,8 +536,12 @@ async def verify_user_form(
 
 
 @router.post("/user/{user_id}/verify")
-async def verify_user(user_id: UUID, admin: User = Depends(admin_user)) -> None:
-    async with SqlAlchemyUnitOfWork() as uow:
+async def verify_user(
+    user_id: UUID,
+    admin: User = Depends(admin_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> None:
+    async with SqlAlchemyUnitOfWork(session) as uow:
         admin_service = AdminService(uow=uow)
         await admin_service.verify_user(user_id)
         await uow.commit()
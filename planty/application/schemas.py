@@ -1,10 +1,23 @@
 from datetime import date, datetime
-from typing import Any, Optional
+from typing import Any, Literal, Optional
 from uuid import UUID
 import uuid
 
-from pydantic import BaseModel, ConfigDict, NonNegativeInt
-
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    NonNegativeInt,
+    computed_field,
+    field_validator,
+)
+
+from planty.application.services.attachments import (
+    MAX_ATTACHMENT_SIZE,
+    MAX_ATTACHMENTS_PER_REQUEST,
+    MAX_MULTIPART_ATTACHMENT_SIZE,
+    get_attachment_url,
+)
 from planty.domain.task import Attachment, RecurrenceInfo, Task
 
 from fastapi_users import schemas as fastapi_users_schemas
@@ -103,13 +116,44 @@ class RequestAttachmentUpload(Schema):
     task_id: UUID
     aes_key_b64: str
     aes_iv_b64: str
+    # (size of the encrypted file: only a file of exactly this size can be
+    # uploaded, so it's counted in user stats as is)
+    size: int = Field(gt=0, le=MAX_ATTACHMENT_SIZE)
 
 
 class AttachmentUploadInfo(Schema):
+    attachment_id: UUID
     post_url: str
     post_fields: dict[str, Any]
 
 
+class RequestAttachmentsUpload(Schema):
+    attachments: list[RequestAttachmentUpload] = Field(
+        min_length=1, max_length=MAX_ATTACHMENTS_PER_REQUEST
+    )
+
+
+class RequestMultipartAttachmentUpload(RequestAttachmentUpload):
+    size: int = Field(gt=0, le=MAX_MULTIPART_ATTACHMENT_SIZE)
+    # (stored with the file, since multipart uploads can't set it per part)
+    content_disposition: Optional[str] = None
+
+
+class UploadedPart(Schema):
+    part_number: int
+    size: int
+    etag: str
+
+
+class MultipartUploadInfo(Schema):
+    attachment_id: UUID
+    upload_id: str
+    part_size: int
+    # (URL of the part number N is `part_urls[N - 1]`)
+    part_urls: list[str]
+    uploaded_parts: list[UploadedPart]
+
+
 class RequestAttachmentRemove(Schema):
     task_id: UUID
     attachment_id: UUID
@@ -121,8 +165,14 @@ class AttachmentResponse(Attachment):
     s3_file_key: str
     task_id: UUID
     added_at: datetime
+    # (pending attachments aren't shown at all)
+    is_pending: bool = Field(default=False, exclude=True)
 
-    url: str
+    # (computed, so attachments can be validated right from domain entities)
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def url(self) -> str:
+        return get_attachment_url(self.s3_file_key)
 
 
 class TaskResponse(Schema):
@@ -139,6 +189,11 @@ class TaskResponse(Schema):
 
     attachments: list[AttachmentResponse]
 
+    @field_validator("attachments", mode="before")
+    @classmethod
+    def skip_pending_attachments(cls, attachments: Any) -> Any:
+        return [a for a in attachments if not getattr(a, "is_pending", False)]
+
 
 class SectionResponse(Schema):
     id: UUID
@@ -173,19 +228,62 @@ class TasksByDatesResponse(Schema):
     overdue: list[TaskResponse]
 
 
+class TasksCount(Schema):
+    period_start: date
+    count: int
+
+
+TasksCountsResponse = list[TasksCount]
+
+
 # TODO: remove if response_converted will be rewritten
 class ArchivedTasks(Schema):  # almost like `Section`
     tasks: list[Task]
+    next_cursor: Optional[str] = None
 
 
 class ArchivedTasksResponse(Schema):
     title: str = "Archived tasks"
     tasks: list[TaskResponse]
+    # pass it as `cursor` to get the next page, `None` for the last page
+    next_cursor: Optional[str] = None
 
 
 TaskSearchResponse = list[TaskResponse]
 
 
+class SyncTask(TaskResponse):
+    # ordering key among tasks of the section (archived tasks aren't ordered)
+    index: int
+
+
+class SyncSection(Schema):
+    id: UUID
+    title: str
+    parent_id: Optional[UUID]
+    added_at: datetime
+    # ordering key among subsections of the parent
+    index: int
+
+
+class SyncRemoved(Schema):
+    tasks: list[UUID]
+    sections: list[UUID]
+    attachments: list[UUID]
+
+
+class SyncResponse(Schema):
+    # current state of everything changed since the given cursor
+    tasks: list[SyncTask]
+    sections: list[SyncSection]
+    attachments: list[AttachmentResponse]
+    removed: SyncRemoved
+    # pass it as `since` next time
+    cursor: int
+    # whether there are more changes after `cursor`
+    has_more: bool
+
+
 class UserRead(fastapi_users_schemas.BaseUser[uuid.UUID]):
     pass
 
@@ -201,10 +299,50 @@ class UserUpdate(fastapi_users_schemas.BaseUserUpdate):
 class UserStats(Schema):
     id: UUID
     email: str
+    added_at: datetime
+    is_superuser: bool
+    is_verified: bool
     tasks_count: int
+    archived_tasks_count: int
     sections_count: int
     attachments_count: int
-    model_config = ConfigDict(extra="allow")
+    # (attachments uploaded before their sizes were recorded aren't counted)
+    storage_bytes: int
 
 
 StatsResponse = list[UserStats]
+
+
+class CacheStats(Schema):
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+
+# cache name -> stats of the cache in the process which handled the request
+CachesStatsResponse = dict[str, CacheStats]
+
+
+class DatabaseRoutingStats(Schema):
+    # (of the process which handled the request)
+    read_write_units: int
+    read_only_units: int
+    # read-only units which read from the primary, as the replica was behind
+    primary_fallbacks: int
+    # where read-only units of work read from
+    read_only_target: Literal["primary", "replica"]
+
+
+class AttachmentsGCStats(Schema):
+    # number of queued objects (of removed attachments) to delete from S3
+    backlog: int
+    # the rest is counted by the process which handled the request
+    deleted_objects: int
+    failed_objects: int
+    # objects without attachments found by reconciliation
+    reclaimed_orphans: int
+    reclaimed_bytes: int
+    # stale multipart uploads
+    aborted_uploads: int
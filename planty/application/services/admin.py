@@ -1,15 +1,67 @@
+from typing import Any, Union
 from uuid import UUID
 
-from planty.application.schemas import StatsResponse
-from planty.application.uow import IUnitOfWork
+from pydantic import NonNegativeInt, PositiveInt
+
+from planty.application.schemas import (
+    CacheStats,
+    CachesStatsResponse,
+    DatabaseRoutingStats,
+    StatsResponse,
+)
+from planty.application.uow import IUnitOfWork, routing_stats
+from planty.domain.types import UserStatsSortKey
+from planty.infrastructure.cache import (
+    AccessTokenCache,
+    VersionedLRUCache,
+    access_token_cache,
+    sections_tree_cache,
+)
+from planty.infrastructure.database import read_only_target
 
 
 class AdminService:
     def __init__(self, uow: IUnitOfWork):
         self.uow = uow
 
-    async def get_stats(self) -> StatsResponse:
-        return await self.uow.user_repo.get_all_users()
+    async def get_stats(
+        self,
+        sort_by: UserStatsSortKey,
+        descending: bool,
+        limit: PositiveInt,
+        offset: NonNegativeInt,
+    ) -> StatsResponse:
+        return await self.uow.user_repo.get_all_users(
+            sort_by, descending, limit=limit, offset=offset
+        )
 
     async def verify_user(self, user_id: UUID) -> None:
         await self.uow.user_repo.verify_user(user_id)
+
+    # (the stats below are kept in memory, so no unit of work is needed)
+    @staticmethod
+    def get_caches_stats() -> CachesStatsResponse:
+        caches: dict[str, Union[AccessTokenCache[Any], VersionedLRUCache[Any, Any]]]
+        caches = {
+            "access_token": access_token_cache,
+            "sections_tree": sections_tree_cache,
+        }
+        return {
+            name: CacheStats(
+                size=len(cache),
+                hits=cache.hits,
+                misses=cache.misses,
+                evictions=cache.evictions,
+                hit_ratio=cache.hit_ratio,
+            )
+            for name, cache in caches.items()
+        }
+
+    @staticmethod
+    def get_database_stats() -> DatabaseRoutingStats:
+        return DatabaseRoutingStats(
+            read_write_units=routing_stats.read_write,
+            read_only_units=routing_stats.read_only,
+            primary_fallbacks=routing_stats.primary_fallbacks,
+            read_only_target=read_only_target,
+        )
@@ -1,46 +1,188 @@
 # TODO: limit file uploading for each user
 
-from typing import Any
+import contextlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterator, Optional
 import uuid
 
-from aiobotocore.session import AioSession
+from botocore.exceptions import ClientError
+from types_aiobotocore_s3 import S3Client
 
+from planty.application.exceptions import MultipartUploadNotFoundException
 from planty.config import settings
 
+# max size of attachments uploaded with one presigned POST
+MAX_ATTACHMENT_SIZE = 50 * 1048576  # 50 MiB
+
+# Bigger attachments are uploaded in parts (S3 multipart upload): every part
+# gets its own presigned URL, so parts can be uploaded in parallel, and failed
+# uploads can be resumed by uploading only the missing parts.
+# (S3 requires parts to be at least 5 MiB, except for the last one)
+MULTIPART_PART_SIZE = 16 * 1048576  # 16 MiB
+MAX_MULTIPART_ATTACHMENT_SIZE = 5 * 1024 * 1048576  # 5 GiB
+
+# max number of attachments presigned by one request
+MAX_ATTACHMENTS_PER_REQUEST = 100
+
+# max number of objects deleted by one request to S3
+DELETE_OBJECTS_BATCH_SIZE = 1000
+
+PRESIGNED_URL_LIFETIME = 3600  # 1 hour
+
+
+# (the client is shared by all requests, see `create_s3_client`)
+
 
 async def generate_presigned_post_url(
-    s3_session: AioSession,
+    s3_client: S3Client, size: Optional[int] = None
 ) -> tuple[str, dict[str, Any], str]:
+    # (if the size is declared, the file must be of exactly this size)
     file_key = str(uuid.uuid4())
+    post_info = await s3_client.generate_presigned_post(
+        Bucket=settings.aws_attachments_bucket,
+        Key=file_key,
+        ExpiresIn=PRESIGNED_URL_LIFETIME,
+        Conditions=[
+            ["starts-with", "$Content-Disposition", ""],
+            (
+                ["content-length-range", size, size]
+                if size is not None
+                else ["content-length-range", 0, MAX_ATTACHMENT_SIZE]
+            ),
+        ],
+    )
+    return post_info["url"], post_info["fields"], file_key
+
+
+async def delete_objects(s3_client: S3Client, file_keys: list[str]) -> list[str]:
+    # -> keys of objects which weren't deleted (missing objects are considered
+    # deleted). Up to `DELETE_OBJECTS_BATCH_SIZE` keys can be given.
+    response = await s3_client.delete_objects(
+        Bucket=settings.aws_attachments_bucket,
+        Delete={"Objects": [{"Key": key} for key in file_keys], "Quiet": True},
+    )
+    return [error["Key"] for error in response.get("Errors", []) if "Key" in error]
+
+
+async def list_objects(
+    s3_client: S3Client,
+) -> AsyncIterator[list[tuple[str, int, datetime]]]:
+    # -> (key, size, last modified) of all stored objects, by pages
+    paginator = s3_client.get_paginator("list_objects_v2")
+    async for page in paginator.paginate(Bucket=settings.aws_attachments_bucket):
+        yield [
+            (obj["Key"], obj["Size"], obj["LastModified"])
+            for obj in page.get("Contents", [])
+        ]
+
+
+async def list_multipart_uploads(
+    s3_client: S3Client,
+) -> AsyncIterator[list[tuple[str, str, datetime]]]:
+    # -> (key, upload id, initiation time) of all incomplete multipart uploads,
+    # by pages
+    paginator = s3_client.get_paginator("list_multipart_uploads")
+    async for page in paginator.paginate(Bucket=settings.aws_attachments_bucket):
+        yield [
+            (upload["Key"], upload["UploadId"], upload["Initiated"])
+            for upload in page.get("Uploads", [])
+        ]
+
+
+def get_attachment_url(s3_file_key: str) -> str:
+    return f"{settings.aws_url}/{settings.aws_attachments_bucket}/{s3_file_key}"
+
 
-    async with s3_session.create_client(
-        "s3",
-        endpoint_url=settings.aws_url,
-        aws_secret_access_key=settings.aws_secret_access_key,
-        aws_access_key_id=settings.aws_access_key_id,
-    ) as client:
-        post_info = await client.generate_presigned_post(
+def get_parts_count(size: int) -> int:
+    return -(-size // MULTIPART_PART_SIZE)
+
+
+async def create_multipart_upload(
+    s3_client: S3Client, content_disposition: Optional[str] = None
+) -> tuple[str, str]:
+    file_key = str(uuid.uuid4())
+    if content_disposition is None:
+        response = await s3_client.create_multipart_upload(
+            Bucket=settings.aws_attachments_bucket, Key=file_key
+        )
+    else:
+        response = await s3_client.create_multipart_upload(
             Bucket=settings.aws_attachments_bucket,
             Key=file_key,
-            ExpiresIn=3600,  # 1 hour
-            Conditions=[
-                ["starts-with", "$Content-Disposition", ""],
-                ["content-length-range", 0, 50 * 1048576],  # max 50 MiB
-            ],
+            ContentDisposition=content_disposition,
         )
-        return post_info["url"], post_info["fields"], file_key
+    return file_key, response["UploadId"]
 
 
-async def delete_attachment(s3_session: AioSession, file_key: str) -> None:
-    async with s3_session.create_client(
-        "s3",
-        endpoint_url=settings.aws_url,
-        aws_secret_access_key=settings.aws_secret_access_key,
-        aws_access_key_id=settings.aws_access_key_id,
-    ) as client:
-        # assuming that attachmemnt exists
-        await client.delete_object(Bucket=settings.aws_attachments_bucket, Key=file_key)
+async def generate_presigned_part_urls(
+    s3_client: S3Client, file_key: str, upload_id: str, parts_count: int
+) -> list[str]:
+    # (presigning is done locally, without requests to S3)
+    return [
+        await s3_client.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": settings.aws_attachments_bucket,
+                "Key": file_key,
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+            },
+            ExpiresIn=PRESIGNED_URL_LIFETIME,
+        )
+        for part_number in range(1, parts_count + 1)
+    ]
 
 
-def get_attachment_url(s3_file_key: str) -> str:
-    return f"{settings.aws_url}/{settings.aws_attachments_bucket}/{s3_file_key}"
+async def get_uploaded_parts(
+    s3_client: S3Client, file_key: str, upload_id: str
+) -> list[tuple[int, int, str]]:
+    # -> (part number, size, ETag) of every uploaded part
+    parts = []
+    with _raise_if_no_upload(upload_id):
+        paginator = s3_client.get_paginator("list_parts")
+        async for page in paginator.paginate(
+            Bucket=settings.aws_attachments_bucket, Key=file_key, UploadId=upload_id
+        ):
+            for part in page.get("Parts", []):
+                parts.append((part["PartNumber"], part["Size"], part["ETag"]))
+    return parts
+
+
+async def complete_multipart_upload(
+    s3_client: S3Client,
+    file_key: str,
+    upload_id: str,
+    parts: list[tuple[int, str]],
+) -> None:
+    # `parts` are (part number, ETag) of all parts in order
+    with _raise_if_no_upload(upload_id):
+        await s3_client.complete_multipart_upload(
+            Bucket=settings.aws_attachments_bucket,
+            Key=file_key,
+            UploadId=upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": part_number, "ETag": etag}
+                    for part_number, etag in parts
+                ]
+            },
+        )
+
+
+async def abort_multipart_upload(
+    s3_client: S3Client, file_key: str, upload_id: str
+) -> None:
+    with _raise_if_no_upload(upload_id):
+        await s3_client.abort_multipart_upload(
+            Bucket=settings.aws_attachments_bucket, Key=file_key, UploadId=upload_id
+        )
+
+
+@contextlib.contextmanager
+def _raise_if_no_upload(upload_id: str) -> Iterator[None]:
+    try:
+        yield
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "NoSuchUpload":
+            raise MultipartUploadNotFoundException(upload_id=upload_id)
+        raise
@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Request
+from loguru import logger
+from types_aiobotocore_s3 import S3Client
+
+from planty.application.exceptions import MultipartUploadNotFoundException
+from planty.application.schemas import AttachmentsGCStats
+from planty.application.services.attachments import (
+    DELETE_OBJECTS_BATCH_SIZE,
+    abort_multipart_upload,
+    delete_objects,
+    list_multipart_uploads,
+    list_objects,
+)
+from planty.application.uow import ReadOnlyUnitOfWork, SqlAlchemyUnitOfWork
+from planty.config import settings
+from planty.utils import get_datetime_now
+
+# Objects are uploaded right after their attachments are committed, but
+# objects without attachments are considered orphans only after this period,
+# in case of any clock skew between the app and S3, slow commits or a lagging
+# replica
+ORPHANS_GRACE_PERIOD = timedelta(hours=1)
+
+# Multipart uploads which aren't completed in this period are aborted (S3
+# keeps their parts, and charges for them, until then), and their pending
+# attachments are removed. Clients can resume uploads till then.
+MULTIPART_UPLOAD_LIFETIME = timedelta(days=7)
+
+
+class AttachmentsGarbageCollector:
+    # Deletes S3 objects of removed attachments in background, so that
+    # requests neither wait for S3 nor delete objects of attachments which
+    # are kept because the transaction failed later.
+    #
+    # Objects are queued transactionally (see
+    # `SQLAlchemyDeletedObjectRepository`) and deleted in batches. Objects
+    # which were never queued (e.g. of deleted users, or uploaded for
+    # attachments which weren't committed) are found by reconciliation of the
+    # bucket with attachments, which runs much less often, along with aborting
+    # of stale multipart uploads.
+    #
+    # Counters are per process, like stats of caches.
+
+    def __init__(self, s3_client: S3Client):
+        self._s3_client = s3_client
+        self.deleted_objects = 0
+        self.failed_objects = 0
+        self.reclaimed_orphans = 0
+        self.reclaimed_bytes = 0
+        self.aborted_uploads = 0
+
+    async def run(self) -> None:
+        next_reconciliation_at = (
+            asyncio.get_running_loop().time()
+            + settings.attachments_reconciliation_interval
+        )
+        while True:
+            await asyncio.sleep(settings.attachments_gc_interval)
+            try:
+                await self.collect()
+                if asyncio.get_running_loop().time() >= next_reconciliation_at:
+                    await self.reconcile()
+                    await self.abort_stale_uploads()
+                    next_reconciliation_at += (
+                        settings.attachments_reconciliation_interval
+                    )
+            except Exception:
+                # (will be retried next time)
+                logger.exception("Attachments garbage collection failed")
+
+    async def collect(self) -> int:
+        # -> number of deleted objects
+        deleted_count = 0
+        while True:
+            async with SqlAlchemyUnitOfWork() as uow:
+                objects = await uow.deleted_object_repo.get_batch(
+                    limit=DELETE_OBJECTS_BATCH_SIZE
+                )
+                if not objects:
+                    break
+                failed_keys = set(
+                    await delete_objects(self._s3_client, [key for _, key in objects])
+                )
+                await uow.deleted_object_repo.remove(
+                    [id_ for id_, key in objects if key not in failed_keys]
+                )
+                await uow.commit()
+
+            deleted_count += len(objects) - len(failed_keys)
+            self.deleted_objects += len(objects) - len(failed_keys)
+            self.failed_objects += len(failed_keys)
+            if failed_keys:
+                # (failed objects are kept in the queue till the next time)
+                logger.warning(f"Failed to delete {len(failed_keys)} objects")
+                break
+            if len(objects) < DELETE_OBJECTS_BATCH_SIZE:
+                break
+        return deleted_count
+
+    async def reconcile(self) -> int:
+        # -> number of deleted orphans
+        orphans_count = 0
+        not_after = datetime.now(timezone.utc) - ORPHANS_GRACE_PERIOD
+        # (pages of the listing are up to `DELETE_OBJECTS_BATCH_SIZE` objects)
+        async for objects in list_objects(self._s3_client):
+            objects = [obj for obj in objects if obj[2] <= not_after]
+            if not objects:
+                continue
+            async with ReadOnlyUnitOfWork() as uow:
+                existing_keys = await uow.task_repo.get_existing_s3_file_keys(
+                    [key for key, _, _ in objects]
+                )
+            orphans = {
+                key: size for key, size, _ in objects if key not in existing_keys
+            }
+            if not orphans:
+                continue
+            failed_keys = await delete_objects(self._s3_client, list(orphans))
+            for key in failed_keys:
+                del orphans[key]
+            orphans_count += len(orphans)
+            self.reclaimed_orphans += len(orphans)
+            self.reclaimed_bytes += sum(orphans.values())
+            self.failed_objects += len(failed_keys)
+        if orphans_count:
+            logger.info(f"Deleted {orphans_count} orphaned objects")
+        return orphans_count
+
+    async def abort_stale_uploads(self) -> int:
+        # -> number of aborted uploads
+        aborted_count = 0
+        initiated_before = datetime.now(timezone.utc) - MULTIPART_UPLOAD_LIFETIME
+        async for uploads in list_multipart_uploads(self._s3_client):
+            for key, upload_id, initiated_at in uploads:
+                if initiated_at > initiated_before:
+                    continue
+                # (the upload may be completed or aborted meanwhile)
+                with contextlib.suppress(MultipartUploadNotFoundException):
+                    await abort_multipart_upload(self._s3_client, key, upload_id)
+                    aborted_count += 1
+        # (attachments are added after their uploads are initiated, and ones
+        # whose uploads are gone some other way are removed too)
+        async with SqlAlchemyUnitOfWork() as uow:
+            removed_count = await uow.task_repo.delete_pending_attachments(
+                added_before=get_datetime_now() - MULTIPART_UPLOAD_LIFETIME
+            )
+            await uow.commit()
+        self.aborted_uploads += aborted_count
+        if aborted_count or removed_count:
+            logger.info(
+                f"Aborted {aborted_count} stale multipart uploads, "
+                f"removed {removed_count} pending attachments"
+            )
+        return aborted_count
+
+    async def get_stats(self) -> AttachmentsGCStats:
+        async with ReadOnlyUnitOfWork() as uow:
+            backlog = await uow.deleted_object_repo.count()
+        return AttachmentsGCStats(
+            backlog=backlog,
+            deleted_objects=self.deleted_objects,
+            failed_objects=self.failed_objects,
+            reclaimed_orphans=self.reclaimed_orphans,
+            reclaimed_bytes=self.reclaimed_bytes,
+            aborted_uploads=self.aborted_uploads,
+        )
+
+
+def get_attachments_gc(request: Request) -> AttachmentsGarbageCollector:
+    attachments_gc: AttachmentsGarbageCollector = request.app.state.attachments_gc
+    return attachments_gc
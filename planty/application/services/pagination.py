@@ -0,0 +1,26 @@
+# Opaque cursors of keyset pagination. A cursor is the sort key of the last
+# item of a page, clients must only pass it back as is.
+
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+from planty.application.exceptions import IncorrectCursor
+
+
+def encode_cursor(added_at: datetime, id_: UUID) -> str:
+    data = json.dumps([added_at.isoformat(), id_.hex]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        added_at, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        added_at, id_ = datetime.fromisoformat(added_at), UUID(hex=id_)
+    except (ValueError, TypeError, AttributeError):
+        raise IncorrectCursor()
+    # (naive datetimes are stored, and they can't be compared with aware ones)
+    if added_at.tzinfo is not None:
+        raise IncorrectCursor()
+    return added_at, id_
@@ -1,10 +1,5 @@
-from itertools import chain
-from typing import Union, cast, overload
-
-from fastapi.encoders import jsonable_encoder
-
-from typing import get_origin, get_args
-
+from fastapi import Response
+from pydantic import TypeAdapter
 
 from planty.application.schemas import (
     ArchivedTasks,
@@ -16,128 +11,64 @@ from planty.application.schemas import (
     TasksByDatesResponse,
     TasksByDates,
 )
-from planty.application.services.attachments import (
-    get_attachment_url,
-)
 from planty.domain.task import Section, Task
-from typing import Any
 
-# NOTE: mypy + singledispatch + overload doesn't work at the same time..
+# There is a separate converter for every response schema, so the caller (who
+# always knows what it converts) picks it explicitly instead of checking types
+# of converted objects (and of every item of converted lists) at runtime.
+#
+# Response schemas are validated right from domain entities by reading their
+# attributes, without dumping entities to dicts first. Fields which aren't
+# exposed (like `user_id`) are just not read.
 
-possible_in_types = Union[
-    Task, Section, list[Section], TasksByDates, list[Task], ArchivedTasks
-]
-possible_out_types = Union[
-    TaskSearchResponse,
-    TaskResponse,
-    SectionResponse,
-    SectionsListResponse,
-    TasksByDatesResponse,
-    ArchivedTasksResponse,
-]
-
-
-@overload
-def convert_to_response(obj: Task) -> TaskResponse: ...
-
-
-@overload
-def convert_to_response(obj: Section) -> SectionResponse: ...
-
-
-@overload
-def convert_to_response(obj: list[Section]) -> SectionsListResponse: ...
-
-
-@overload
-def convert_to_response(obj: TasksByDates) -> TasksByDatesResponse: ...
-
-
-@overload
-def convert_to_response(obj: list[Task]) -> TaskSearchResponse: ...
-
-
-@overload
-def convert_to_response(obj: ArchivedTasks) -> ArchivedTasksResponse: ...
-
-
-# TODO: think about returning dict without casting to pydantic model:
-# https://github.com/zhanymkanov/fastapi-best-practices?tab=readme-ov-file#fastapi-response-serialization
-
-
-def convert_to_response(obj: possible_in_types) -> possible_out_types:
-    if _satisfies(obj, Task):
-        obj = cast(Task, obj)
-        task_data = obj.model_dump()
-        _adjust_task_dict(task_data)
-        return TaskResponse(**task_data)
-    elif _satisfies(obj, Section):
-        obj = cast(Section, obj)
-        section_data = obj.model_dump()
-        _adjust_section_dict(section_data)
-        return SectionResponse(**section_data)
-    elif _satisfies(obj, ArchivedTasks):
-        obj = cast(ArchivedTasks, obj)
-        archived_data = obj.model_dump()
-        for task in archived_data.get("tasks", []):
-            _adjust_task_dict(task)
-        return ArchivedTasksResponse(**archived_data)
-    elif _satisfies(obj, list[Task]):
-        obj = cast(list[Task], obj)
-        return [convert_to_response(obj_item) for obj_item in obj]
-    elif _satisfies(obj, list[Section]):
-        obj = cast(list[Section], obj)
-        return [convert_to_response(obj_item) for obj_item in obj]
-    elif _satisfies(obj, TasksByDates):
-        obj = cast(TasksByDates, obj)
-        tasks_by_dates = jsonable_encoder(obj)
-        for task in chain(
-            tasks_by_dates["overdue"], *[d["tasks"] for d in tasks_by_dates["by_dates"]]
-        ):
-            _adjust_task_dict(task)
-        tasks_by_dates: TasksByDatesResponse
-        return tasks_by_dates
-    else:
-        raise NotImplementedError(
-            f"Unsupported type for converting into response schema: {type(obj)}"
-        )
-
-
-def _adjust_task_dict(task: dict[str, Any]) -> None:
-    task.pop("user_id")
-    for attachment in task.get("attachments", []):
-        attachment["url"] = get_attachment_url(attachment["s3_file_key"])
-
-
-def _adjust_section_dict(section: dict[str, Any]) -> None:
-    section.pop("user_id")
-    section.pop("has_tasks")
-    section.pop("has_subsections")
-    for task in section.get("tasks", []):
-        _adjust_task_dict(task)
-    for subsection in section.get("subsections", []):
-        _adjust_section_dict(subsection)
-
-
-def _satisfies(obj: Any, type_hint: Any) -> bool:
-    origin = get_origin(type_hint)
-    args = get_args(type_hint)
-
-    if origin is None:
-        return isinstance(obj, type_hint)
-    elif origin is Union:
-        return any(_satisfies(obj, arg) for arg in args)
-    elif origin is list:
-        if not isinstance(obj, list):
-            return False
-        return all(_satisfies(item, args[0]) for item in obj)
-    elif origin is dict:
-        if not isinstance(obj, dict):
-            return False
-        key_type, value_type = args
-        return all(
-            _satisfies(k, key_type) and _satisfies(v, value_type)
-            for k, v in obj.items()
-        )
-    else:
-        raise NotImplementedError("Unexpected generic type")
+_tasks_response_adapter = TypeAdapter(TaskSearchResponse)
+_sections_response_adapter = TypeAdapter(SectionsListResponse)
+
+
+def convert_task_to_response(task: Task) -> TaskResponse:
+    return TaskResponse.model_validate(task, from_attributes=True)
+
+
+def convert_tasks_to_response(tasks: list[Task]) -> TaskSearchResponse:
+    return _tasks_response_adapter.validate_python(tasks, from_attributes=True)
+
+
+def convert_section_to_response(section: Section) -> SectionResponse:
+    return SectionResponse.model_validate(section, from_attributes=True)
+
+
+def convert_sections_to_response(sections: list[Section]) -> SectionsListResponse:
+    return _sections_response_adapter.validate_python(sections, from_attributes=True)
+
+
+def convert_archived_tasks_to_response(
+    archived_tasks: ArchivedTasks,
+) -> ArchivedTasksResponse:
+    return ArchivedTasksResponse.model_validate(archived_tasks, from_attributes=True)
+
+
+# Responses of the heaviest endpoints are also dumped to JSON bytes in one go,
+# so FastAPI's validation and serialization of the returned value are skipped.
+# Keep `response_model` of these endpoints for docs.
+_section_json_response_adapter = TypeAdapter(SectionResponse)
+_tasks_by_dates_json_response_adapter = TypeAdapter(TasksByDatesResponse)
+
+
+def convert_section_to_json_response(section: Section) -> Response:
+    response_data = _section_json_response_adapter.validate_python(
+        section, from_attributes=True
+    )
+    return Response(
+        _section_json_response_adapter.dump_json(response_data),
+        media_type="application/json",
+    )
+
+
+def convert_tasks_by_dates_to_json_response(tasks_by_dates: TasksByDates) -> Response:
+    response_data = _tasks_by_dates_json_response_adapter.validate_python(
+        tasks_by_dates, from_attributes=True
+    )
+    return Response(
+        _tasks_by_dates_json_response_adapter.dump_json(response_data),
+        media_type="application/json",
+    )
@@ -0,0 +1,137 @@
+from typing import Optional, Sequence, Union
+from uuid import UUID
+
+from planty.application.exceptions import SyncCursorExpired
+from planty.application.schemas import (
+    AttachmentResponse,
+    SyncRemoved,
+    SyncResponse,
+    SyncSection,
+    SyncTask,
+)
+from planty.application.services.responses_converter import (
+    convert_task_to_response,
+)
+from planty.application.uow import IUnitOfWork
+
+# max number of change log entries handled by one sync request
+SYNC_CHANGES_LIMIT = 1000
+
+
+class SyncService:
+    def __init__(self, uow: IUnitOfWork):
+        self._change_log_repo = uow.change_log_repo
+        self._task_repo = uow.task_repo
+        self._section_repo = uow.section_repo
+
+    async def get_changes(self, user_id: UUID, since: Optional[int]) -> SyncResponse:
+        if since is None:
+            # Clients start with the current cursor (taken before loading all
+            # their data) and then sync from it
+            return _make_empty_sync_response(
+                cursor=await self._change_log_repo.get_data_version(user_id)
+            )
+
+        # (one more change is requested to know if there are more of them)
+        changes = await self._change_log_repo.get_changes(
+            user_id, since, limit=SYNC_CHANGES_LIMIT + 1
+        )
+        if not changes:
+            if await self._change_log_repo.get_data_version(user_id) != since:
+                # (changes have been pruned, or the cursor is unknown at all)
+                raise SyncCursorExpired()
+            return _make_empty_sync_response(cursor=since)
+        # (versions of a user are contiguous, see `SQLAlchemyChangeLogRepository`)
+        if changes[0][0] != since + 1:
+            raise SyncCursorExpired()
+        has_more = len(changes) > SYNC_CHANGES_LIMIT
+        if has_more:
+            # Changes of a version are never split between responses, as the
+            # cursor is a version. The last one may be incomplete, so it's left
+            # for the next time, unless it's the only one.
+            last_version = changes[-1][0]
+            changes = [change for change in changes if change[0] < last_version]
+            if not changes:
+                changes = await self._change_log_repo.get_changes(
+                    user_id, since, until=last_version
+                )
+
+        # Only the latest change of every entity matters. Entities which are
+        # removed later (i.e. after the last of these changes) can't be found
+        # anymore, they are reported as removed right away.
+        is_removed_by_id: dict[str, dict[UUID, bool]] = {
+            "task": {},
+            "section": {},
+            "attachment": {},
+        }
+        for _, entity_type, entity_id, is_removed in changes:
+            is_removed_by_id[entity_type][entity_id] = is_removed
+        existing_ids = {
+            entity_type: [id_ for id_, is_removed in ids.items() if not is_removed]
+            for entity_type, ids in is_removed_by_id.items()
+        }
+
+        tasks = [
+            SyncTask(index=index, **dict(convert_task_to_response(task)))
+            for task, index in await self._task_repo.get_with_ordering_keys(
+                existing_ids["task"]
+            )
+        ]
+        sections = [
+            SyncSection(
+                id=section.id,
+                title=section.title,
+                parent_id=section.parent_id,
+                added_at=section.added_at,
+                index=index,
+            )
+            for (
+                section,
+                index,
+            ) in await self._section_repo.get_without_tasks_with_ordering_keys(
+                existing_ids["section"]
+            )
+        ]
+        # (pending attachments are reported as removed, since clients don't
+        # see them until they are uploaded)
+        attachments = [
+            AttachmentResponse.model_validate(attachment, from_attributes=True)
+            for attachment in await self._task_repo.get_attachments(
+                existing_ids["attachment"]
+            )
+            if not attachment.is_pending
+        ]
+
+        return SyncResponse(
+            tasks=tasks,
+            sections=sections,
+            attachments=attachments,
+            removed=SyncRemoved(
+                tasks=_get_removed_ids(is_removed_by_id["task"], tasks),
+                sections=_get_removed_ids(is_removed_by_id["section"], sections),
+                attachments=_get_removed_ids(
+                    is_removed_by_id["attachment"], attachments
+                ),
+            ),
+            cursor=changes[-1][0],
+            has_more=has_more,
+        )
+
+
+def _get_removed_ids(
+    is_removed_by_id: dict[UUID, bool],
+    found: Sequence[Union[SyncTask, SyncSection, AttachmentResponse]],
+) -> list[UUID]:
+    found_ids = {item.id for item in found}
+    return [id_ for id_ in is_removed_by_id if id_ not in found_ids]
+
+
+def _make_empty_sync_response(cursor: int) -> SyncResponse:
+    return SyncResponse(
+        tasks=[],
+        sections=[],
+        attachments=[],
+        removed=SyncRemoved(tasks=[], sections=[], attachments=[]),
+        cursor=cursor,
+        has_more=False,
+    )
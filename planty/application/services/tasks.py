@@ -1,19 +1,24 @@
 from datetime import date
+from typing import Optional
 from uuid import UUID
 
-import aiobotocore
-import aiobotocore.session
+from fastapi import Response
+from types_aiobotocore_s3 import S3Client
 
 from planty.application.exceptions import (
     AttachmentNotFoundException,
     ForbiddenException,
+    IncompleteMultipartUpload,
+    MultipartUploadNotFoundException,
     IncorrectDateInterval,
     TaskNotFoundException,
 )
 from planty.application.schemas import (
     ArchivedTasks,
     AttachmentUploadInfo,
+    MultipartUploadInfo,
     RequestAttachmentUpload,
+    RequestMultipartAttachmentUpload,
     ArchivedTasksResponse,
     SectionCreateRequest,
     SectionMoveRequest,
@@ -23,32 +28,51 @@ from planty.application.schemas import (
     TaskCreateRequest,
     TaskMoveRequest,
     TaskResponse,
-    TasksByDatesResponse,
+    TasksCountsResponse,
     TaskUpdateRequest,
     TaskSearchResponse,
     SectionsListResponse,
+    UploadedPart,
 )
 from planty.application.services.attachments import (
-    delete_attachment,
+    MULTIPART_PART_SIZE,
+    abort_multipart_upload,
+    complete_multipart_upload,
+    create_multipart_upload,
+    generate_presigned_part_urls,
     generate_presigned_post_url,
+    get_parts_count,
+    get_uploaded_parts,
 )
+from planty.application.services.pagination import decode_cursor, encode_cursor
 from planty.application.services.responses_converter import (
-    convert_to_response,
+    convert_archived_tasks_to_response,
+    convert_section_to_json_response,
+    convert_section_to_response,
+    convert_sections_to_response,
+    convert_task_to_response,
+    convert_tasks_by_dates_to_json_response,
+    convert_tasks_to_response,
 )
 from planty.application.uow import IUnitOfWork
-from planty.domain.calendar import divide_tasks_by_dates
+from planty.domain.calendar import count_tasks_by_periods, divide_tasks_by_dates
 from planty.domain.exceptions import (
     ChangingRootSectionError,
     MisplaceSectionHierarchyError,
 )
 from planty.domain.task import Attachment, Section, Task
+from planty.domain.types import CalendarPeriodType
+
+# (of archived tasks requested by `cursor` only)
+ARCHIVED_TASKS_PAGE_SIZE = 50
 
 
 class TaskService:
-    def __init__(self, uow: IUnitOfWork):
+    def __init__(self, uow: IUnitOfWork, s3_client: Optional[S3Client] = None):
         self._task_repo = uow.task_repo
         self._user_repo = uow.user_repo
-        self._s3_session = aiobotocore.session.get_session()
+        # (only needed for attachments, see `get_s3_client`)
+        self._s3_client = s3_client
 
     async def update_task(
         self, user_id: UUID, task_update_request: TaskUpdateRequest
@@ -67,7 +91,7 @@ class TaskService:
         task = Task.model_validate(task_data)
 
         await self._task_repo.update_or_create(task)
-        return convert_to_response(task)
+        return convert_task_to_response(task)
 
     async def get_tasks_by_date(
         self,
@@ -75,7 +99,7 @@ class TaskService:
         not_before: date,
         not_after: date,
         with_overdue: bool = False,
-    ) -> TasksByDatesResponse:
+    ) -> Response:
         if not_before > not_after:
             raise IncorrectDateInterval()
         tasks = await self._task_repo.get_tasks_by_due_to(
@@ -86,42 +110,226 @@ class TaskService:
         tasks_by_dates = divide_tasks_by_dates(tasks, not_before, not_after)
         if with_overdue:
             tasks_by_dates.overdue = await self._task_repo.get_overdue_tasks(user_id)
-        return convert_to_response(tasks_by_dates)
+        return convert_tasks_by_dates_to_json_response(tasks_by_dates)
 
-    async def get_archived_tasks(self, user_id: UUID) -> ArchivedTasksResponse:
-        tasks = await self._task_repo.get_archived_tasks(user_id)
-        tasks = ArchivedTasks(tasks=tasks)
-        return convert_to_response(tasks)
+    async def get_tasks_count_by_periods(
+        self,
+        user_id: UUID,
+        not_before: date,
+        not_after: date,
+        period: CalendarPeriodType,
+    ) -> TasksCountsResponse:
+        # (the interval is checked by the router before the database is used)
+        tasks_count_by_date = await self._task_repo.count_tasks_by_due_to(
+            not_before=not_before,
+            not_after=not_after,
+            user_id=user_id,
+        )
+        return count_tasks_by_periods(
+            tasks_count_by_date, not_before, not_after, period
+        )
+
+    async def get_archived_tasks(
+        self, user_id: UUID, limit: Optional[int], cursor: Optional[str] = None
+    ) -> ArchivedTasksResponse:
+        # Without both `limit` and `cursor` all the tasks are returned (for
+        # clients which don't page through them)
+        if limit is None and cursor is None:
+            tasks = await self._task_repo.get_archived_tasks(user_id)
+            return convert_archived_tasks_to_response(
+                ArchivedTasks(tasks=tasks, next_cursor=None)
+            )
+        if limit is None:
+            limit = ARCHIVED_TASKS_PAGE_SIZE
+        # (one more task is requested to know if there is the next page)
+        tasks = await self._task_repo.get_archived_tasks(
+            user_id,
+            limit=limit + 1,
+            after=decode_cursor(cursor) if cursor is not None else None,
+        )
+        next_cursor = None
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = encode_cursor(tasks[-1].added_at, tasks[-1].id)
+        return convert_archived_tasks_to_response(
+            ArchivedTasks(tasks=tasks, next_cursor=next_cursor)
+        )
 
     async def get_tasks_by_search_query(
-        self, user_id: UUID, query: str
+        self, user_id: UUID, query: str, limit: int, offset: int = 0
     ) -> TaskSearchResponse:
-        tasks = await self._task_repo.search(user_id, query)
-        return convert_to_response(tasks)
+        tasks = await self._task_repo.search(user_id, query, limit=limit, offset=offset)
+        return convert_tasks_to_response(tasks)
 
     async def add_attachment(
         self, user_id: UUID, request: RequestAttachmentUpload
     ) -> AttachmentUploadInfo:
-        task = await self._task_repo.get(request.task_id)
-        if task.user_id != user_id:
-            raise ForbiddenException()
-        post_url, post_fields, file_key = await generate_presigned_post_url(
-            self._s3_session
+        (upload_info,) = await self.add_attachments(user_id, [request])
+        return upload_info
+
+    async def add_attachments(
+        self, user_id: UUID, requests: list[RequestAttachmentUpload]
+    ) -> list[AttachmentUploadInfo]:
+        # All attachments (of any tasks) are presigned and added at once
+        assert self._s3_client is not None
+        tasks = await self._get_user_tasks(
+            user_id, [request.task_id for request in requests]
         )
-        task.add_attachment(
-            Attachment(
-                task_id=task.id,
+        upload_infos = []
+        for request in requests:
+            post_url, post_fields, file_key = await generate_presigned_post_url(
+                self._s3_client, request.size
+            )
+            attachment = Attachment(
+                task_id=request.task_id,
                 aes_key_b64=request.aes_key_b64,
                 aes_iv_b64=request.aes_iv_b64,
                 s3_file_key=file_key,
+                size=request.size,
             )
+            tasks[request.task_id].add_attachment(attachment)
+            upload_infos.append(
+                AttachmentUploadInfo(
+                    attachment_id=attachment.id,
+                    post_url=post_url,
+                    post_fields=post_fields,
+                )
+            )
+        await self._task_repo.add_attachments(list(tasks.values()))
+        return upload_infos
+
+    async def add_multipart_attachment(
+        self, user_id: UUID, request: RequestMultipartAttachmentUpload
+    ) -> MultipartUploadInfo:
+        assert self._s3_client is not None
+        tasks = await self._get_user_tasks(user_id, [request.task_id])
+        file_key, upload_id = await create_multipart_upload(
+            self._s3_client, request.content_disposition
+        )
+        attachment = Attachment(
+            task_id=request.task_id,
+            aes_key_b64=request.aes_key_b64,
+            aes_iv_b64=request.aes_iv_b64,
+            s3_file_key=file_key,
+            size=request.size,
+            is_pending=True,
+        )
+        tasks[request.task_id].add_attachment(attachment)
+        await self._task_repo.add_attachments(list(tasks.values()))
+        return MultipartUploadInfo(
+            attachment_id=attachment.id,
+            upload_id=upload_id,
+            part_size=MULTIPART_PART_SIZE,
+            part_urls=await generate_presigned_part_urls(
+                self._s3_client, file_key, upload_id, get_parts_count(request.size)
+            ),
+            uploaded_parts=[],
         )
-        await self._task_repo.update_or_create(task)
-        return AttachmentUploadInfo(post_url=post_url, post_fields=post_fields)
+
+    async def get_multipart_upload(
+        self, user_id: UUID, task_id: UUID, attachment_id: UUID, upload_id: str
+    ) -> MultipartUploadInfo:
+        # To resume an upload, only parts which are not uploaded yet (or were
+        # uploaded partially, i.e. have another size) are to be uploaded again.
+        # URLs are presigned again, since the previous ones may be expired.
+        assert self._s3_client is not None
+        attachment, size = await self._get_multipart_attachment(
+            user_id, task_id, attachment_id, upload_id
+        )
+        uploaded_parts = await get_uploaded_parts(
+            self._s3_client, attachment.s3_file_key, upload_id
+        )
+        return MultipartUploadInfo(
+            attachment_id=attachment.id,
+            upload_id=upload_id,
+            part_size=MULTIPART_PART_SIZE,
+            part_urls=await generate_presigned_part_urls(
+                self._s3_client,
+                attachment.s3_file_key,
+                upload_id,
+                get_parts_count(size),
+            ),
+            uploaded_parts=[
+                UploadedPart(part_number=part_number, size=part_size, etag=etag)
+                for part_number, part_size, etag in uploaded_parts
+            ],
+        )
+
+    async def complete_multipart_upload(
+        self, user_id: UUID, task_id: UUID, attachment_id: UUID, upload_id: str
+    ) -> None:
+        # Uploaded parts are taken from S3 rather than from the client, and
+        # they are checked to make up the whole file of the declared size
+        # (presigned part URLs can't limit the size of parts). Then the
+        # attachment stops being pending.
+        assert self._s3_client is not None
+        attachment, size = await self._get_multipart_attachment(
+            user_id, task_id, attachment_id, upload_id
+        )
+        uploaded_parts = await get_uploaded_parts(
+            self._s3_client, attachment.s3_file_key, upload_id
+        )
+        part_numbers = [part_number for part_number, _, _ in uploaded_parts]
+        if (
+            part_numbers != list(range(1, get_parts_count(size) + 1))
+            or sum(part_size for _, part_size, _ in uploaded_parts) != size
+        ):
+            raise IncompleteMultipartUpload()
+        await complete_multipart_upload(
+            self._s3_client,
+            attachment.s3_file_key,
+            upload_id,
+            [(part_number, etag) for part_number, _, etag in uploaded_parts],
+        )
+        await self._task_repo.mark_attachment_uploaded(attachment)
+
+    async def abort_multipart_upload(
+        self, user_id: UUID, task_id: UUID, attachment_id: UUID, upload_id: str
+    ) -> None:
+        # (uploaded parts are removed from S3, and the attachment is removed)
+        assert self._s3_client is not None
+        _, attachment = await self._get_user_attachment(user_id, task_id, attachment_id)
+        await abort_multipart_upload(self._s3_client, attachment.s3_file_key, upload_id)
+        await self._task_repo.delete_attachment(attachment)
 
     async def remove_attachment(
         self, user_id: UUID, task_id: UUID, attachment_id: UUID
     ) -> None:
+        task, attachment = await self._get_user_attachment(
+            user_id, task_id, attachment_id
+        )
+        # (the file is deleted from S3 later, see `AttachmentsGarbageCollector`)
+        task.remove_attachment(attachment)
+        await self._task_repo.update_or_create(task)
+        await self._task_repo.delete_attachment(attachment)
+
+    async def _get_multipart_attachment(
+        self, user_id: UUID, task_id: UUID, attachment_id: UUID, upload_id: str
+    ) -> tuple[Attachment, int]:
+        _, attachment = await self._get_user_attachment(user_id, task_id, attachment_id)
+        # (attachments uploaded in parts always have the size declared)
+        if attachment.size is None:
+            raise MultipartUploadNotFoundException(upload_id=upload_id)
+        return attachment, attachment.size
+
+    async def _get_user_tasks(
+        self, user_id: UUID, task_ids: list[UUID]
+    ) -> dict[UUID, Task]:
+        tasks = {
+            task.id: task
+            for task, _ in await self._task_repo.get_with_ordering_keys(task_ids)
+        }
+        for task_id in task_ids:
+            task = tasks.get(task_id)
+            if task is None:
+                raise TaskNotFoundException(task_id=task_id)
+            if task.user_id != user_id:
+                raise ForbiddenException()
+        return tasks
+
+    async def _get_user_attachment(
+        self, user_id: UUID, task_id: UUID, attachment_id: UUID
+    ) -> tuple[Task, Attachment]:
         task = await self._task_repo.get(task_id)
         if task.user_id != user_id:
             raise ForbiddenException()
@@ -131,11 +339,7 @@ class TaskService:
             )
         except StopIteration:
             raise AttachmentNotFoundException(id=attachment_id)
-        # remove from minio
-        await delete_attachment(self._s3_session, attachment.s3_file_key)
-        task.remove_attachment(attachment)
-        await self._task_repo.update_or_create(task)
-        await self._task_repo.delete_attachment(attachment)
+        return task, attachment
 
 
 class SectionService:
@@ -150,7 +354,8 @@ class SectionService:
         if parent_section.user_id != user_id:
             raise ForbiddenException()
         # add to the end of parent section:
-        index = await self._section_repo.count_subsections(parent_section.id)
+        index = len(parent_section.subsections)
+        key = await self._section_repo.get_ordering_key_after_last(parent_section.id)
 
         section = Section(
             user_id=user_id,
@@ -164,7 +369,7 @@ class SectionService:
         parent_section.insert_subsection(
             section, index
         )  # this line checks constraints of parent_section
-        await self._section_repo.add(section, index=index)
+        await self._section_repo.add(section, index=key)
         await self._section_repo.update(parent_section)
         return section
 
@@ -179,13 +384,19 @@ class SectionService:
         for key, value in section_data.items():
             setattr(section, key, value)
         await self._section_repo.update(section)
-        return convert_to_response(section)
+        return convert_section_to_response(section)
+
+    async def check_section_owner(self, user_id: UUID, section_id: UUID) -> None:
+        # Cheap check before the section itself is loaded (e.g. a cached
+        # response may be reused only by the owner of the section)
+        if await self._section_repo.get_owner_id(section_id) != user_id:
+            raise ForbiddenException()
 
-    async def get_section(self, user_id: UUID, section_id: UUID) -> SectionResponse:
+    async def get_section(self, user_id: UUID, section_id: UUID) -> Response:
         section: Section = await self._section_repo.get(section_id)
         if section.user_id != user_id:
             raise ForbiddenException()
-        return convert_to_response(section)
+        return convert_section_to_json_response(section)
 
     async def get_all_sections(
         self, user_id: UUID, leaves_only: bool, as_tree: bool
@@ -195,7 +406,7 @@ class SectionService:
         )
         # TODO: remove tasks=[] from this schema to avoid confusion! use new
         # schema, e.g. "SectionSummary"
-        return convert_to_response(sections)
+        return convert_sections_to_response(sections)
 
     async def create_task(self, user_id: UUID, task: TaskCreateRequest) -> UUID:
         task = Task(
@@ -291,7 +502,7 @@ class SectionService:
             )
 
         is_valid_moving = await self.is_hierarchically_valid_moving(
-            user_id, section.id, section_to.id
+            section.id, section_to.id
         )
         if not is_valid_moving:
             raise MisplaceSectionHierarchyError()
@@ -306,24 +517,10 @@ class SectionService:
             await self._section_repo.update(section_to)
 
     async def is_hierarchically_valid_moving(
-        self, user_id: UUID, section_id: UUID, section_to_id: UUID
+        self, section_id: UUID, section_to_id: UUID
     ) -> bool:
-        sections = await self._section_repo.get_all_without_tasks(
-            user_id=user_id, leaves_only=False, as_tree=False
-        )
-
-        def find_section_by_id(section_id: UUID) -> Section:
-            return next(s for s in sections if s.id == section_id)
-
-        section_to = find_section_by_id(section_to_id)
-        if section_to.id == section_id:
-            return False
-        s = section_to
-        while s.parent_id:
-            if s.id == section_id:
-                return False
-            s = find_section_by_id(s.parent_id)
-        return True
+        # the section can't be moved inside its own subtree
+        return not await self._section_repo.is_in_subtree(section_to_id, section_id)
 
     async def toggle_task_completed(
         self, user_id: UUID, task_id: UUID, auto_archive: bool
@@ -347,7 +544,7 @@ class SectionService:
                 section.insert_task(task)
             await self._section_repo.update(section)
         await self._task_repo.update_or_create(task)
-        return convert_to_response(section)
+        return convert_section_to_response(section)
 
     async def toggle_task_archived(
         self, user_id: UUID, task_id: UUID
@@ -370,7 +567,7 @@ class SectionService:
             section.insert_task(task)
         await self._section_repo.update(section)
         await self._task_repo.update_or_create(task)
-        return convert_to_response(section)
+        return convert_section_to_response(section)
 
     async def shuffle(
         self, user_id: UUID, request: ShuffleSectionRequest
@@ -380,7 +577,7 @@ class SectionService:
             raise ForbiddenException()
         section.shuffle_tasks()
         await self._section_repo.update(section)
-        return convert_to_response(section)
+        return convert_section_to_response(section)
 
     async def create_root_section(self, user_id: UUID) -> Section:
         section = Section.create_root_section(user_id)
@@ -1,5 +1,5 @@
 import uuid
-from typing import Optional
+from typing import Any, Optional
 from loguru import logger
 from fastapi import Request
 from planty.application.services.tasks import SectionService
@@ -7,6 +7,7 @@ from planty.application.uow import SqlAlchemyUnitOfWork
 from planty.config import settings
 from fastapi_users import BaseUserManager, UUIDIDMixin
 
+from planty.infrastructure.cache import access_token_cache
 from planty.infrastructure.models import UserModel
 
 
@@ -37,3 +38,29 @@ class UserManager(UUIDIDMixin, BaseUserManager[UserModel, uuid.UUID]):
         logger.info(
             f"Verification requested for user {user.id}. Verification token: {token}"
         )
+
+    # Users cached by access tokens are invalidated after every change of the
+    # user (password, email, verification, etc.) is committed
+
+    async def on_after_update(
+        self,
+        user: UserModel,
+        update_dict: dict[str, Any],
+        request: Optional[Request] = None,
+    ) -> None:
+        access_token_cache.invalidate_user(user.id)
+
+    async def on_after_verify(
+        self, user: UserModel, request: Optional[Request] = None
+    ) -> None:
+        access_token_cache.invalidate_user(user.id)
+
+    async def on_after_reset_password(
+        self, user: UserModel, request: Optional[Request] = None
+    ) -> None:
+        access_token_cache.invalidate_user(user.id)
+
+    async def on_after_delete(
+        self, user: UserModel, request: Optional[Request] = None
+    ) -> None:
+        access_token_cache.invalidate_user(user.id)
@@ -10,6 +10,7 @@ import subprocess
 import httpx
 import asyncio
 
+from planty.infrastructure.cache import access_token_cache, sections_tree_cache
 from planty.infrastructure.database import Base, engine, raw_async_session_maker
 from planty.infrastructure.models import (
     AttachmentModel,
@@ -17,6 +18,7 @@ from planty.infrastructure.models import (
     TaskModel,
     UserModel,
 )
+from planty.infrastructure.repositories import SQLAlchemyUserStatsRepository
 from planty.main import app as fastapi_app
 
 
@@ -26,6 +28,9 @@ async def prepare_database(test_data: dict[str, list[dict[str, Any]]]) -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    # (versions in the cache are from the previous database)
+    sections_tree_cache.clear()
+    access_token_cache.clear()
 
     async with raw_async_session_maker() as session:
         for Model, table_key in [
@@ -36,7 +41,11 @@ async def prepare_database(test_data: dict[str, list[dict[str, Any]]]) -> None:
         ]:
             for item in test_data[table_key]:
                 session.add(Model(**item))
+        await session.commit()
 
+    # (counters of the inserted data, as after the migration)
+    async with raw_async_session_maker() as session:
+        await SQLAlchemyUserStatsRepository(session).rebuild()
         await session.commit()
 
 
@@ -44,10 +53,14 @@ async def prepare_database(test_data: dict[str, list[dict[str, Any]]]) -> None:
 async def ac(test_user: User) -> AsyncGenerator[AsyncClient, None]:
     # Mock `current_user` with `test_user`:
     fastapi_app.dependency_overrides[current_user] = lambda: test_user
-    async with AsyncClient(
-        transport=ASGITransport(app=fastapi_app),
-        base_url="http://test",
-    ) as ac:
+    # (`ASGITransport` doesn't run the lifespan of the app)
+    async with (
+        fastapi_app.router.lifespan_context(fastapi_app),
+        AsyncClient(
+            transport=ASGITransport(app=fastapi_app),
+            base_url="http://test",
+        ) as ac,
+    ):
         yield ac
 
 
@@ -55,10 +68,13 @@ async def ac(test_user: User) -> AsyncGenerator[AsyncClient, None]:
 async def ac_another_user(another_test_user: User) -> AsyncGenerator[AsyncClient, None]:
     # Mock `current_user` with `another_test_user`:
     fastapi_app.dependency_overrides[current_user] = lambda: another_test_user
-    async with AsyncClient(
-        transport=ASGITransport(app=fastapi_app),
-        base_url="http://test",
-    ) as ac:
+    async with (
+        fastapi_app.router.lifespan_context(fastapi_app),
+        AsyncClient(
+            transport=ASGITransport(app=fastapi_app),
+            base_url="http://test",
+        ) as ac,
+    ):
         yield ac
 
 
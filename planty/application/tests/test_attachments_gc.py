@@ -0,0 +1,184 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator
+
+from botocore.exceptions import ClientError
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from sqlalchemy import insert, select
+
+from planty.application.auth import admin_user
+from planty.application.services.attachments import DELETE_OBJECTS_BATCH_SIZE
+from planty.application.services.attachments_gc import (
+    MULTIPART_UPLOAD_LIFETIME,
+    AttachmentsGarbageCollector,
+)
+from planty.domain.task import User
+from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.models import AttachmentModel, DeletedObjectModel
+from planty.main import app as fastapi_app
+from planty.utils import get_datetime_now
+
+TASK_ID = "de59bdb5-5f91-48dc-a034-246b8f86be25"
+ATTACHMENT_ID = "2bfa26ba-ed8c-4353-adb2-c451957fc3e1"
+S3_FILE_KEY = "1f393472-61ff-4d86-acc5-c225cd1b57da"
+
+
+async def get_queued_keys() -> list[str]:
+    async with raw_async_session_maker() as session:
+        result = await session.execute(
+            select(DeletedObjectModel.s3_file_key).order_by(DeletedObjectModel.id)
+        )
+        return list(result.scalars())
+
+
+def mock_delete_objects(mocker: MockerFixture, errors: list[str] = []) -> Any:
+    # (objects with keys from `errors` fail to be deleted)
+    def delete_objects(Delete: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        keys = [obj["Key"] for obj in Delete["Objects"]]
+        return {"Errors": [{"Key": key} for key in keys if key in errors]}
+
+    return mocker.patch.object(
+        fastapi_app.state.s3_client,
+        "delete_objects",
+        mocker.AsyncMock(side_effect=delete_objects),
+    )
+
+
+async def test_removed_attachment_is_queued(ac: AsyncClient) -> None:
+    response = await ac.delete(f"/api/task/{TASK_ID}/attachment/{ATTACHMENT_ID}")
+    assert response.status_code == 200
+    assert await get_queued_keys() == [S3_FILE_KEY]
+
+
+async def test_attachments_of_removed_task_are_queued(ac: AsyncClient) -> None:
+    response = await ac.request("DELETE", "/api/task", json={"task_id": TASK_ID})
+    assert response.status_code == 200, response.text
+    assert await get_queued_keys() == [S3_FILE_KEY]
+    # (the attachment is removed along with the task)
+    response = await ac.delete(f"/api/task/{TASK_ID}/attachment/{ATTACHMENT_ID}")
+    assert response.status_code == 404
+
+
+async def test_objects_are_deleted_in_batches(
+    ac: AsyncClient, test_user: User, mocker: MockerFixture
+) -> None:
+    keys = [f"key-{i}" for i in range(2 * DELETE_OBJECTS_BATCH_SIZE + 1)]
+    async with raw_async_session_maker() as session:
+        await session.execute(
+            insert(DeletedObjectModel),
+            [{"s3_file_key": key, "added_at": get_datetime_now()} for key in keys],
+        )
+        await session.commit()
+    delete_objects = mock_delete_objects(mocker, errors=[keys[-1]])
+
+    attachments_gc: AttachmentsGarbageCollector = fastapi_app.state.attachments_gc
+    assert await attachments_gc.collect() == len(keys) - 1
+    assert [
+        len(call.kwargs["Delete"]["Objects"]) for call in delete_objects.call_args_list
+    ] == [DELETE_OBJECTS_BATCH_SIZE, DELETE_OBJECTS_BATCH_SIZE, 1]
+    # failed objects are kept in the queue
+    assert await get_queued_keys() == [keys[-1]]
+
+    # (the test user is an admin)
+    mocker.patch.dict(fastapi_app.dependency_overrides, {admin_user: lambda: test_user})
+    response = await ac.get("/api/user/stats/attachments_gc")
+    assert response.json() == {
+        "backlog": 1,
+        "deleted_objects": len(keys) - 1,
+        "failed_objects": 1,
+        "reclaimed_orphans": 0,
+        "reclaimed_bytes": 0,
+        "aborted_uploads": 0,
+    }
+
+
+async def test_orphans_are_reclaimed(ac: AsyncClient, mocker: MockerFixture) -> None:
+    long_ago = datetime.now(timezone.utc) - timedelta(days=1)
+
+    async def list_objects(*args: Any) -> AsyncIterator[Any]:
+        yield [
+            (S3_FILE_KEY, 10, long_ago),  # of an existing attachment
+            ("orphan", 20, long_ago),
+            ("just uploaded", 30, datetime.now(timezone.utc)),
+        ]
+        yield [("another orphan", 40, long_ago)]
+
+    mocker.patch(
+        "planty.application.services.attachments_gc.list_objects", list_objects
+    )
+    delete_objects = mock_delete_objects(mocker)
+
+    attachments_gc = AttachmentsGarbageCollector(fastapi_app.state.s3_client)
+    assert await attachments_gc.reconcile() == 2
+    assert [
+        call.kwargs["Delete"]["Objects"] for call in delete_objects.call_args_list
+    ] == [[{"Key": "orphan"}], [{"Key": "another orphan"}]]
+    assert attachments_gc.reclaimed_bytes == 60
+
+
+async def test_stale_multipart_uploads_are_aborted(
+    ac: AsyncClient, mocker: MockerFixture
+) -> None:
+    s3_client = fastapi_app.state.s3_client
+    mocker.patch.object(
+        s3_client,
+        "create_multipart_upload",
+        mocker.AsyncMock(return_value={"UploadId": "stale"}),
+    )
+    response = await ac.post(
+        "/api/task/attachment/multipart",
+        json={
+            "task_id": TASK_ID,
+            "aes_key_b64": "someBase64EncodedAESKey==",
+            "aes_iv_b64": "someBase64EncodedIV==",
+            "size": 1,
+        },
+    )
+    assert response.status_code == 200, response.text
+    async with raw_async_session_maker() as session:
+        stale_key = await session.scalar(
+            select(AttachmentModel.s3_file_key).where(
+                AttachmentModel.id == response.json()["attachment_id"]
+            )
+        )
+
+    long_ago = datetime.now(timezone.utc) - timedelta(days=30)
+
+    async def list_multipart_uploads(*args: Any) -> AsyncIterator[Any]:
+        yield [
+            (stale_key, "stale", long_ago),
+            ("key", "recent", datetime.now(timezone.utc)),
+            ("another key", "already aborted", long_ago),
+        ]
+
+    mocker.patch(
+        "planty.application.services.attachments_gc.list_multipart_uploads",
+        list_multipart_uploads,
+    )
+
+    async def abort_multipart_upload(UploadId: str, **kwargs: Any) -> None:
+        if UploadId == "already aborted":
+            error = {"Error": {"Code": "NoSuchUpload"}}
+            raise ClientError(error, "AbortMultipartUpload")  # type: ignore[arg-type]
+
+    abort = mocker.patch.object(
+        s3_client,
+        "abort_multipart_upload",
+        mocker.AsyncMock(side_effect=abort_multipart_upload),
+    )
+    # (the pending attachment is kept till it's stale too)
+    mocker.patch(
+        "planty.application.services.attachments_gc.get_datetime_now",
+        return_value=get_datetime_now() + MULTIPART_UPLOAD_LIFETIME,
+    )
+
+    attachments_gc = AttachmentsGarbageCollector(s3_client)
+    assert await attachments_gc.abort_stale_uploads() == 1
+    assert [call.kwargs["UploadId"] for call in abort.call_args_list] == [
+        "stale",
+        "already aborted",
+    ]
+    assert await get_queued_keys() == [stale_key]
+    # (the attachment which was added before is kept)
+    response = await ac.delete(f"/api/task/{TASK_ID}/attachment/{ATTACHMENT_ID}")
+    assert response.status_code == 200
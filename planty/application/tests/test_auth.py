@@ -0,0 +1,177 @@
+import asyncio
+from datetime import timedelta
+from typing import Any, AsyncGenerator
+from uuid import UUID
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, update
+
+from planty.application.auth import TOKEN_LIFETIME, current_user
+from planty.application.services.admin import AdminService
+from planty.application.tests.utils import capture_statements
+from planty.application.uow import SqlAlchemyUnitOfWork
+from planty.domain.task import User
+from planty.infrastructure.cache import access_token_cache
+from planty.infrastructure.database import engine, raw_async_session_maker
+from planty.infrastructure.models import AccessTokenModel, UserModel
+from planty.main import app as fastapi_app
+from planty.utils import get_datetime_now
+
+TOKEN = "test-token"
+
+
+async def create_access_token(user_id: UUID) -> None:
+    async with raw_async_session_maker() as session:
+        session.add(
+            AccessTokenModel(
+                token=TOKEN, user_id=user_id, created_at=get_datetime_now()
+            )
+        )
+        await session.commit()
+
+
+@pytest.fixture
+async def auth_client(test_user: User) -> AsyncGenerator[AsyncClient, None]:
+    # (unlike `ac`, requests are authenticated by the access token cookie)
+    fastapi_app.dependency_overrides.pop(current_user, None)
+    await create_access_token(test_user.id)
+    async with (
+        fastapi_app.router.lifespan_context(fastapi_app),
+        AsyncClient(
+            transport=ASGITransport(app=fastapi_app),
+            base_url="http://test",
+            cookies={"fastapiusersauth": TOKEN},
+        ) as ac,
+    ):
+        yield ac
+
+
+async def test_authenticated_user_is_cached(
+    auth_client: AsyncClient, test_user: User
+) -> None:
+    response = await auth_client.get("/api/auth/me")
+    assert response.status_code == 200
+    assert response.json()["id"] == str(test_user.id)
+    assert (access_token_cache.hits, access_token_cache.misses) == (0, 1)
+
+    with capture_statements() as statements:
+        cached_response = await auth_client.get("/api/auth/me")
+    assert cached_response.json() == response.json()
+    assert access_token_cache.hits == 1
+    assert statements == []
+
+
+async def test_cached_user_can_be_updated(auth_client: AsyncClient) -> None:
+    await auth_client.get("/api/auth/me")
+    response = await auth_client.patch(
+        "/api/auth/me", json={"email": "new@example.com"}
+    )
+    assert response.status_code == 200, response.text
+    # the user is cached again, with the new email
+    assert (await auth_client.get("/api/auth/me")).json()["email"] == (
+        "new@example.com"
+    )
+    assert access_token_cache.misses == 2
+
+
+async def test_logout_invalidates_cached_token(auth_client: AsyncClient) -> None:
+    assert (await auth_client.get("/api/auth/me")).status_code == 200
+    assert (await auth_client.post("/api/auth/logout")).status_code == 204
+    auth_client.cookies.set("fastapiusersauth", TOKEN)
+    assert (await auth_client.get("/api/auth/me")).status_code == 401
+
+
+async def test_token_is_cached_no_longer_than_it_lives(
+    auth_client: AsyncClient,
+) -> None:
+    async with raw_async_session_maker() as session:
+        await session.execute(
+            update(AccessTokenModel)
+            .where(AccessTokenModel.token == TOKEN)  # type: ignore
+            .values(
+                created_at=get_datetime_now() - timedelta(seconds=TOKEN_LIFETIME - 1)
+            )
+        )
+        await session.commit()
+    assert (await auth_client.get("/api/auth/me")).status_code == 200
+    assert len(access_token_cache) == 1
+    await asyncio.sleep(1)
+    assert (await auth_client.get("/api/auth/me")).status_code == 401
+
+
+async def test_password_change_invalidates_cached_user(
+    auth_client: AsyncClient, test_user: User
+) -> None:
+    await auth_client.get("/api/auth/me")
+    response = await auth_client.patch(
+        "/api/auth/me", json={"password": "new password"}
+    )
+    assert response.status_code == 200, response.text
+    assert len(access_token_cache) == 0
+
+
+async def test_verify_user_invalidates_cached_user(
+    auth_client: AsyncClient, test_user: User
+) -> None:
+    async with raw_async_session_maker() as session:
+        await session.execute(
+            update(UserModel)
+            .where(UserModel.id == test_user.id)  # type: ignore
+            .values(is_verified=False)
+        )
+        await session.commit()
+    assert (await auth_client.get("/api/sections")).status_code == 403
+
+    async with SqlAlchemyUnitOfWork() as uow:
+        await AdminService(uow).verify_user(test_user.id)
+        # (the cached user is kept until the change is committed)
+        assert len(access_token_cache) == 1
+        await uow.commit()
+
+    assert (await auth_client.get("/api/sections")).status_code == 200
+
+
+async def test_get_caches_stats(auth_client: AsyncClient) -> None:
+    # (the test user is an admin)
+    await auth_client.get("/api/auth/me")
+    response = await auth_client.get("/api/user/stats/caches")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["access_token"] == {
+        "size": 1,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "hit_ratio": 0.5,
+    }
+    assert set(stats) == {"access_token", "sections_tree"}
+
+
+async def test_request_holds_one_connection(
+    auth_client: AsyncClient, tasks_data: list[dict[str, Any]]
+) -> None:
+    checked_out = peak = 0
+
+    def on_checkout(*args: Any) -> None:
+        nonlocal checked_out, peak
+        checked_out += 1
+        peak = max(peak, checked_out)
+
+    def on_checkin(*args: Any) -> None:
+        nonlocal checked_out
+        checked_out -= 1
+
+    pool = engine.sync_engine.pool
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+    try:
+        # (authentication and the unit of work share the session of the request)
+        response = await auth_client.patch(
+            "/api/task", json={"id": tasks_data[0]["id"], "title": "new"}
+        )
+    finally:
+        event.remove(pool, "checkout", on_checkout)
+        event.remove(pool, "checkin", on_checkin)
+    assert response.status_code == 200, response.text
+    assert peak == 1
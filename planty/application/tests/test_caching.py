@@ -0,0 +1,76 @@
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+
+from planty.application.tests.utils import capture_statements
+from planty.infrastructure.cache import sections_tree_cache
+
+
+async def test_sections_tree_is_cached(ac: AsyncClient) -> None:
+    response = await ac.get("/api/sections", params={"as_tree": False})
+    assert response.is_success
+    hits_before = sections_tree_cache.hits
+    with capture_statements() as statements:
+        cached_response = await ac.get("/api/sections", params={"as_tree": False})
+    assert cached_response.json() == response.json()
+    assert sections_tree_cache.hits == hits_before + 1
+    # only the versions of user data (for the ETag) and of user sections are
+    # checked
+    assert len(statements) == 2
+
+
+@pytest.mark.parametrize(
+    "method, url, json",
+    [
+        (
+            "POST",
+            "/api/section",
+            {"title": "New", "parent_id": "0d966845-254b-4b5c-b8a7-8d34dcd3d527"},
+        ),
+        (
+            "PATCH",
+            "/api/section",
+            {"id": "090eda97-dd2d-45bb-baa0-7814313e5a38", "title": "new title"},
+        ),
+        (
+            "POST",
+            "/api/section/move",
+            {
+                "section_id": "090eda97-dd2d-45bb-baa0-7814313e5a38",
+                "to_parent_id": "36ea0a4f-0334-464d-8066-aa359ecfdcba",
+                "index": 0,
+            },
+        ),
+    ],
+)
+@pytest.mark.parametrize("as_tree", [True, False])
+async def test_sections_tree_cache_is_invalidated(
+    method: str, url: str, json: dict[str, Any], as_tree: bool, ac: AsyncClient
+) -> None:
+    params = {"as_tree": as_tree}
+    sections_before = (await ac.get("/api/sections", params=params)).json()
+
+    response = await ac.request(method, url, json=json)
+    assert response.is_success, response.text
+
+    sections_after = (await ac.get("/api/sections", params=params)).json()
+    assert sections_after != sections_before
+    sections_tree_cache.clear()
+    assert (await ac.get("/api/sections", params=params)).json() == sections_after
+
+
+async def test_failed_move_does_not_poison_sections_tree_cache(
+    ac: AsyncClient,
+) -> None:
+    sections_before = (await ac.get("/api/sections")).json()
+    response = await ac.post(
+        "/api/section/move",
+        json={
+            "section_id": "36ea0a4f-0334-464d-8066-aa359ecfdcba",
+            "to_parent_id": "5fa09005-4ba9-417b-a9cb-82f182cd1f26",
+            "index": 0,
+        },
+    )
+    assert response.status_code == 422
+    assert (await ac.get("/api/sections")).json() == sections_before
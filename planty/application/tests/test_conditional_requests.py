@@ -0,0 +1,108 @@
+import re
+from datetime import date, timedelta
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from planty.application.tests.utils import capture_statements
+from planty.application.uow import SqlAlchemyUnitOfWork
+from planty.utils import get_datetime_now
+
+SECTION_ID = "090eda97-dd2d-45bb-baa0-7814313e5a38"
+
+URLS = [
+    f"/api/section/{SECTION_ID}",
+    "/api/sections",
+    "/api/task/by_date?not_before=2024-12-01&not_after=2024-12-31&with_overdue=true",
+    "/api/tasks/archived",
+]
+
+
+@pytest.mark.parametrize("url", URLS)
+async def test_not_modified_without_task_queries(url: str, ac: AsyncClient) -> None:
+    response = await ac.get(url)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    with capture_statements() as statements:
+        response = await ac.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    # only the version of user data (and the owner of the section) is read
+    assert len(statements) == (2 if url == URLS[0] else 1)
+    assert not any(re.search(r"\btask\b", statement) for statement, _ in statements)
+
+
+@pytest.mark.parametrize("url", URLS)
+async def test_etag_changes_after_mutation(url: str, ac: AsyncClient) -> None:
+    etag = (await ac.get(url)).headers["etag"]
+    response = await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "A"})
+    assert response.is_success
+
+    response = await ac.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.parametrize(
+    "if_none_match, status_code",
+    [
+        ("{etag}", 304),
+        ("W/{etag}", 304),
+        ('"outdated", {etag}', 304),
+        ("*", 304),
+        ('"outdated"', 200),
+    ],
+)
+async def test_if_none_match_forms(
+    if_none_match: str, status_code: int, ac: AsyncClient
+) -> None:
+    etag = (await ac.get("/api/sections")).headers["etag"]
+    response = await ac.get(
+        "/api/sections", headers={"If-None-Match": if_none_match.format(etag=etag)}
+    )
+    assert response.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "section_id, status_code",
+    [(SECTION_ID, 403), ("00000000-0000-0000-0000-000000000000", 404)],
+)
+async def test_not_modified_only_for_own_section(
+    section_id: str, status_code: int, ac_another_user: AsyncClient
+) -> None:
+    # (the ETag of another user's data matches the current version of it)
+    etag = (await ac_another_user.get("/api/sections")).headers["etag"]
+    response = await ac_another_user.get(
+        f"/api/section/{section_id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == status_code
+
+
+async def test_tasks_by_date_etag_changes_every_day(
+    ac: AsyncClient, mocker: MockerFixture
+) -> None:
+    mocker.patch("planty.application.router.get_today", return_value=date(2024, 12, 1))
+    etag = (await ac.get(URLS[2])).headers["etag"]
+    mocker.patch("planty.application.router.get_today", return_value=date(2024, 12, 2))
+    response = await ac.get(URLS[2], headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+async def test_etag_doesnt_depend_on_change_log(ac: AsyncClient) -> None:
+    # (pruned changes mustn't bring an outdated version back)
+    first_etag = (await ac.get("/api/sections")).headers["etag"]
+    await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "A"})
+    etag = (await ac.get("/api/sections")).headers["etag"]
+    async with SqlAlchemyUnitOfWork() as uow:
+        await uow.change_log_repo.prune(
+            added_before=get_datetime_now() + timedelta(minutes=1), batch_size=100
+        )
+        await uow.commit()
+
+    response = await ac.get("/api/sections", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = await ac.get("/api/sections", headers={"If-None-Match": first_etag})
+    assert response.status_code == 200
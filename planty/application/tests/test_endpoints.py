@@ -1,9 +1,20 @@
-from datetime import date
+from datetime import date, datetime
 from typing import Any, Optional
+from uuid import UUID
 import httpx
 import pytest
 from httpx import AsyncClient
 from pytest_mock import MockerFixture
+from sqlalchemy import select, update
+
+from planty.application.services.attachments import (
+    MULTIPART_PART_SIZE,
+    get_attachment_url,
+)
+from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.models import SectionModel, TaskModel
+from planty.infrastructure.ordering import ORDERING_STEP
+from planty.main import app as fastapi_app
 
 
 # TODO: test task creation with `recurrence`
@@ -114,6 +125,78 @@ async def test_get_archived_tasks(
     assert len(tasks) == expected_tasks_n
 
 
+@pytest.mark.parametrize("limit", [1, 2, 3])
+@pytest.mark.parametrize("same_added_at", [False, True])
+async def test_get_archived_tasks_by_pages(
+    ac: AsyncClient,
+    tasks_data: list[dict[str, Any]],
+    limit: int,
+    same_added_at: bool,
+) -> None:
+    if same_added_at:
+        # (ties are broken by ids)
+        async with raw_async_session_maker() as session:
+            await session.execute(
+                update(TaskModel).values(added_at=datetime(2024, 1, 1))
+            )
+            await session.commit()
+    all_tasks = (await ac.get("/api/tasks/archived")).json()["tasks"]
+
+    tasks, cursor, n_pages = [], None, 0
+    while True:
+        params = (
+            {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        )
+        response = await ac.get("/api/tasks/archived", params=params)
+        assert response.is_success
+        page = response.json()
+        tasks.extend(page["tasks"])
+        n_pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert tasks == all_tasks
+    assert len(tasks) == sum(task["is_archived"] for task in tasks_data)
+    # (there is no empty last page)
+    assert n_pages == max(1, -(-len(tasks) // limit))
+
+
+async def test_get_archived_tasks_without_limit(
+    ac: AsyncClient, mocker: MockerFixture
+) -> None:
+    mocker.patch("planty.application.services.tasks.ARCHIVED_TASKS_PAGE_SIZE", 1)
+    # (all tasks at once for clients which don't page through them)
+    data = (await ac.get("/api/tasks/archived")).json()
+    assert len(data["tasks"]) > 2
+    assert data["next_cursor"] is None
+
+    first_page = (await ac.get("/api/tasks/archived", params={"limit": 1})).json()
+    assert first_page["tasks"] == data["tasks"][:1]
+    # (the next pages are of the default size)
+    response = await ac.get(
+        "/api/tasks/archived", params={"cursor": first_page["next_cursor"]}
+    )
+    assert response.json()["tasks"] == data["tasks"][1:2]
+
+
+# (the last ones are base64-encoded "[1, 2]" and a cursor with an aware datetime)
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not a cursor",
+        "WzEsIDJd",
+        "WyIyMDI0LTEyLTAxVDAwOjAwOjAwKzAwOjAwIiwgIjAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwIl0=",
+    ],
+)
+async def test_get_archived_tasks_incorrect_cursor(
+    ac: AsyncClient, cursor: str
+) -> None:
+    response = await ac.get("/api/tasks/archived", params={"cursor": cursor})
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Incorrect pagination cursor"
+
+
 @pytest.mark.parametrize(
     "parent_id, status_code, error_detail",
     [
@@ -150,6 +233,27 @@ async def test_create_section(
         assert "id" in data
 
 
+async def test_created_sections_get_sparse_ordering_keys(ac: AsyncClient) -> None:
+    parent_id = "0d966845-254b-4b5c-b8a7-8d34dcd3d527"
+    for title in ["first", "second"]:
+        response = await ac.post(
+            "/api/section", json={"title": title, "parent_id": parent_id}
+        )
+        assert response.status_code == 201
+
+    async with raw_async_session_maker() as session:
+        result = await session.execute(
+            select(SectionModel.title, SectionModel.index)
+            .where(SectionModel.parent_id == UUID(parent_id))
+            .order_by(SectionModel.index)
+        )
+        titles, keys = zip(*result)
+    # (the fixture has subsections there already, new ones go after them)
+    assert len(keys) > 2
+    assert titles[-2:] == ("first", "second")
+    assert keys[-1] - keys[-2] == keys[-2] - keys[-3] == ORDERING_STEP
+
+
 @pytest.mark.parametrize(
     "id_,status_code,error_detail",
     [
@@ -179,6 +283,60 @@ async def test_get_section(
     assert expected_tasks_n == len(response.json()["tasks"])
 
 
+async def test_get_section_serialized_as_response_schema(ac: AsyncClient) -> None:
+    # section with a task with an attachment
+    id_ = "a5b2010d-c27c-4f22-be47-828e065f9607"
+    response = await ac.get(f"/api/section/{id_}")
+    assert response.is_success
+    assert response.headers["content-type"] == "application/json"
+
+    data = response.json()
+    assert {key: value for key, value in data.items() if key != "tasks"} == {
+        "id": id_,
+        "title": "🧹  Chores",
+        "parent_id": "36ea0a4f-0334-464d-8066-aa359ecfdcba",
+        "added_at": "2024-09-28T04:11:17.677000",
+        "subsections": [],
+    }
+    # (archived tasks aren't returned)
+    assert [task["title"] for task in data["tasks"]] == [
+        "Clean the house",
+        "Wash the dishes",
+        "Take out the trash",
+        "Laundry",
+        "Task for testing recurrence in 2001",
+        "Non-recurrent task with due_to",
+        "Task for testing monthly recurrence",
+    ]
+    task = data["tasks"][1]
+    assert task == {
+        "id": "f15c4c32-3d85-4a64-a216-75bdf6f2d8c5",
+        "section_id": id_,
+        "title": "Wash the dishes",
+        "description": "🧼🧴",
+        "content": None,
+        "is_completed": False,
+        "is_archived": False,
+        "added_at": "2024-03-28T04:11:17.677000",
+        "due_to": "2024-12-21",
+        "recurrence": {"period": 1, "type": "days", "flexible_mode": False},
+        "attachments": [],
+    }
+    s3_file_key = "1f393472-61ff-4d86-acc5-c225cd1b57da"
+    assert data["tasks"][3]["attachments"] == [
+        {
+            "id": "2bfa26ba-ed8c-4353-adb2-c451957fc3e1",
+            "aes_key_b64": "someBase64EncodedAESKey==",
+            "aes_iv_b64": "someBase64EncodedIV==",
+            "s3_file_key": s3_file_key,
+            "task_id": "de59bdb5-5f91-48dc-a034-246b8f86be25",
+            "size": None,
+            "added_at": "2024-03-28T04:11:17.677000",
+            "url": get_attachment_url(s3_file_key),
+        }
+    ]
+
+
 async def test_get_another_user_section(
     ac_another_user: AsyncClient,
 ) -> None:
@@ -556,6 +714,247 @@ async def test_get_tasks_by_date(
     assert len(overdue_tasks) == n_overdue_tasks_expected
 
 
+async def test_get_tasks_count_by_period(
+    ac: AsyncClient, mocker: MockerFixture
+) -> None:
+    # (tasks by date are never shown before today)
+    mocker.patch("planty.domain.calendar.get_today", return_value=date(2024, 12, 1))
+    params = {"not_before": "2024-12-01", "not_after": "2024-12-31"}
+    response = await ac.get("/api/task/count_by_period", params=params)
+    assert response.is_success
+    counts = response.json()
+    assert [count["period_start"] for count in counts] == [
+        "2024-11-25",
+        "2024-12-02",
+        "2024-12-09",
+        "2024-12-16",
+        "2024-12-23",
+        "2024-12-30",
+    ]
+
+    n_tasks = sum(count["count"] for count in counts)
+    assert n_tasks > 0
+    by_date_response = await ac.get("/api/task/by_date", params=params)
+    tasks_by_dates = by_date_response.json()["by_dates"]
+    assert n_tasks == sum(
+        len(tasks_by_date["tasks"]) for tasks_by_date in tasks_by_dates
+    )
+
+    response = await ac.get(
+        "/api/task/count_by_period", params={**params, "period": "months"}
+    )
+    assert response.json() == [{"period_start": "2024-12-01", "count": n_tasks}]
+
+
+async def test_get_tasks_count_by_period_incorrect_interval(ac: AsyncClient) -> None:
+    response = await ac.get(
+        "/api/task/count_by_period",
+        params={"not_before": "2024-12-31", "not_after": "2024-12-01"},
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Incorrect date interval"
+
+
+@pytest.mark.parametrize(
+    "not_after, period, status_code",
+    [
+        ("2026-01-01", "days", 200),
+        ("2026-01-02", "days", 422),
+        ("2032-01-04", "weeks", 200),
+        ("2032-01-05", "weeks", 422),
+        ("2055-06-30", "months", 200),
+        ("2055-07-01", "months", 422),
+    ],
+)
+async def test_get_tasks_count_by_period_too_many_periods(
+    not_after: str, period: str, status_code: int, ac: AsyncClient
+) -> None:
+    # (at most 366 periods)
+    response = await ac.get(
+        "/api/task/count_by_period",
+        params={"not_before": "2025-01-01", "not_after": not_after, "period": period},
+    )
+    assert response.status_code == status_code
+    if response.is_success:
+        assert len(response.json()) == 366
+
+
+async def test_attachments_use_shared_s3_client(
+    ac: AsyncClient, tasks_data: list[dict[str, Any]], mocker: MockerFixture
+) -> None:
+    # (presigning doesn't send requests to S3, so it works without MinIO)
+    generate_presigned_post = mocker.spy(
+        fastapi_app.state.s3_client, "generate_presigned_post"
+    )
+    for _ in range(2):
+        response = await ac.post(
+            "/api/task/attachment",
+            json={
+                "task_id": tasks_data[2]["id"],
+                "aes_key_b64": "someBase64EncodedAESKey==",
+                "aes_iv_b64": "someBase64EncodedIV==",
+                "size": 1000,
+            },
+        )
+        assert response.status_code == 200
+    assert generate_presigned_post.call_count == 2
+
+
+def _attachment_request(task_id: str) -> dict[str, Any]:
+    return {
+        "task_id": task_id,
+        "aes_key_b64": "someBase64EncodedAESKey==",
+        "aes_iv_b64": "someBase64EncodedIV==",
+        "size": 1000,
+    }
+
+
+async def test_add_attachments(
+    ac: AsyncClient, tasks_data: list[dict[str, Any]]
+) -> None:
+    task_ids = [tasks_data[0]["id"], tasks_data[2]["id"], tasks_data[0]["id"]]
+    response = await ac.post(
+        "/api/task/attachments",
+        json={"attachments": [_attachment_request(task_id) for task_id in task_ids]},
+    )
+    assert response.status_code == 200, response.text
+    upload_infos = response.json()
+    assert len(upload_infos) == 3
+
+    section_id = tasks_data[0]["section_id"]
+    for task_id, attachments_count in [(task_ids[0], 2), (task_ids[1], 1)]:
+        task_got, _ = await _request_task_data(task_id, ac, section_id)
+        assert len(task_got["attachments"]) == attachments_count
+    task_got, _ = await _request_task_data(task_ids[0], ac, section_id)
+    assert [a["id"] for a in task_got["attachments"]] == [
+        upload_infos[0]["attachment_id"],
+        upload_infos[2]["attachment_id"],
+    ]
+
+
+async def test_add_attachments_of_missing_task(
+    ac: AsyncClient, tasks_data: list[dict[str, Any]]
+) -> None:
+    response = await ac.post(
+        "/api/task/attachments",
+        json={
+            "attachments": [
+                _attachment_request(tasks_data[0]["id"]),
+                _attachment_request("f8b057ea-8c3c-4d14-9b95-ef9acbccffa6"),
+            ]
+        },
+    )
+    assert response.status_code == 404
+    # (nothing is added)
+    task_got, _ = await _request_task_data(
+        tasks_data[0]["id"], ac, tasks_data[0]["section_id"]
+    )
+    assert task_got["attachments"] == []
+
+
+async def test_add_attachments_of_another_user(
+    ac_another_user: AsyncClient, tasks_data: list[dict[str, Any]]
+) -> None:
+    response = await ac_another_user.post(
+        "/api/task/attachments",
+        json={"attachments": [_attachment_request(tasks_data[0]["id"])]},
+    )
+    assert response.status_code == 403
+
+
+async def test_multipart_attachment_upload(
+    ac: AsyncClient, tasks_data: list[dict[str, Any]], mocker: MockerFixture
+) -> None:
+    s3_client = fastapi_app.state.s3_client
+    mocker.patch.object(
+        s3_client,
+        "create_multipart_upload",
+        mocker.AsyncMock(return_value={"UploadId": "upload"}),
+    )
+    size = 2 * MULTIPART_PART_SIZE + 1
+    task_id, section_id = tasks_data[0]["id"], tasks_data[0]["section_id"]
+    response = await ac.post(
+        "/api/task/attachment/multipart",
+        json={**_attachment_request(task_id), "size": size},
+    )
+    assert response.status_code == 200, response.text
+    upload_info = response.json()
+    assert upload_info["upload_id"] == "upload"
+    assert upload_info["part_size"] == MULTIPART_PART_SIZE
+    assert len(upload_info["part_urls"]) == 3
+    assert "partNumber=3" in upload_info["part_urls"][2]
+    assert upload_info["uploaded_parts"] == []
+    # (the attachment isn't shown till the upload is completed)
+    task_got, _ = await _request_task_data(task_id, ac, section_id)
+    assert task_got["attachments"] == []
+    upload_url = (
+        f"/api/task/{task_id}/attachment/{upload_info['attachment_id']}"
+        "/multipart/upload"
+    )
+
+    # the upload is resumed after the first part is uploaded
+    uploaded_parts = [(1, MULTIPART_PART_SIZE, '"etag1"')]
+    mocker.patch(
+        "planty.application.services.tasks.get_uploaded_parts",
+        side_effect=lambda *args: uploaded_parts,
+    )
+    response = await ac.get(upload_url)
+    assert response.status_code == 200, response.text
+    assert response.json()["uploaded_parts"] == [
+        {"part_number": 1, "size": MULTIPART_PART_SIZE, "etag": '"etag1"'}
+    ]
+    assert len(response.json()["part_urls"]) == 3
+
+    complete_multipart_upload = mocker.patch(
+        "planty.application.services.tasks.complete_multipart_upload"
+    )
+    response = await ac.post(f"{upload_url}/complete")
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Not all parts of the attachment are uploaded"
+
+    uploaded_parts += [
+        (2, MULTIPART_PART_SIZE, '"etag2"'),
+        (3, 1, '"etag3"'),
+    ]
+    response = await ac.post(f"{upload_url}/complete")
+    assert response.status_code == 200, response.text
+    assert complete_multipart_upload.call_args.args[2:] == (
+        "upload",
+        [(1, '"etag1"'), (2, '"etag2"'), (3, '"etag3"')],
+    )
+    task_got, _ = await _request_task_data(task_id, ac, section_id)
+    assert [a["id"] for a in task_got["attachments"]] == [upload_info["attachment_id"]]
+    assert "is_pending" not in task_got["attachments"][0]
+
+
+async def test_abort_multipart_attachment_upload(
+    ac: AsyncClient, tasks_data: list[dict[str, Any]], mocker: MockerFixture
+) -> None:
+    s3_client = fastapi_app.state.s3_client
+    mocker.patch.object(
+        s3_client,
+        "create_multipart_upload",
+        mocker.AsyncMock(return_value={"UploadId": "upload"}),
+    )
+    abort_multipart_upload = mocker.patch.object(
+        s3_client, "abort_multipart_upload", mocker.AsyncMock()
+    )
+    task_id, section_id = tasks_data[0]["id"], tasks_data[0]["section_id"]
+    response = await ac.post(
+        "/api/task/attachment/multipart",
+        json={**_attachment_request(task_id), "size": MULTIPART_PART_SIZE},
+    )
+    attachment_id = response.json()["attachment_id"]
+
+    response = await ac.delete(
+        f"/api/task/{task_id}/attachment/{attachment_id}/multipart/upload"
+    )
+    assert response.status_code == 200, response.text
+    assert abort_multipart_upload.call_args.kwargs["UploadId"] == "upload"
+    task_got, _ = await _request_task_data(task_id, ac, section_id)
+    assert task_got["attachments"] == []
+
+
 @pytest.mark.parametrize(
     "task_id, status_code,error_detail",
     [
@@ -577,11 +976,13 @@ async def test_add_attachment(
 ) -> None:
     existing_task_data = tasks_data[2]
     task_id = existing_task_data["id"] if task_id == "existing" else task_id
+    file_content = b"some content"
 
     request_data = {
         "task_id": task_id,
         "aes_key_b64": "someBase64EncodedAESKey==",
         "aes_iv_b64": "someBase64EncodedIV==",
+        "size": len(file_content),
     }
 
     response = await ac.post("/api/task/attachment", json=request_data)
@@ -616,7 +1017,7 @@ async def test_add_attachment(
             **post_fields,
             "Content-Disposition": 'attachment; filename="test_file.txt"',
         },
-        files={"file": ("filename", b"some content")},
+        files={"file": ("filename", file_content)},
     )
     assert response.is_success
 
@@ -627,6 +1028,7 @@ async def test_add_attachment(
     # Remove it
     response = await ac.delete(f"/api/task/{task_id}/attachment/{attachment_id}")
     assert response.is_success
+    await fastapi_app.state.attachments_gc.collect()
 
     # Verify that it's removed
     response = httpx.get(get_url)
@@ -660,6 +1062,7 @@ async def test_add_attachment_to_another_user_task(
         "task_id": task_id,
         "aes_key_b64": "someBase64EncodedAESKey==",
         "aes_iv_b64": "someBase64EncodedIV==",
+        "size": 1000,
     }
 
     response = await ac_another_user.post("/api/task/attachment", json=request_data)
@@ -695,7 +1098,6 @@ async def test_remove_attachment(
     status_code: int,
     error_detail: Optional[str],
     ac: AsyncClient,
-    minio_container: None,
 ) -> None:
     response = await ac.delete(f"/api/task/{task_id}/attachment/{attachment_id}")
     if error_detail:
@@ -741,3 +1143,91 @@ async def test_root_section_is_created(ac: AsyncClient) -> None:
     }
     response = await ac.post("/api/auth/register", json=user_data)
     assert response.is_success
+
+
+async def test_search_pagination(ac: AsyncClient) -> None:
+    response = await ac.get("/api/task/search", params={"query": "watch"})
+    all_ids = [task["id"] for task in response.json()]
+
+    pages_ids: list[str] = []
+    for offset in range(len(all_ids) + 1):
+        response = await ac.get(
+            "/api/task/search",
+            params={"query": "watch", "limit": 1, "offset": offset},
+        )
+        assert response.status_code == 200
+        pages_ids.extend(task["id"] for task in response.json())
+    assert pages_ids == all_ids
+
+
+async def test_search_is_prefix_based_and_ranked(ac: AsyncClient) -> None:
+    response = await ac.get("/api/task/search", params={"query": "bett cal"})
+    tasks = response.json()
+    assert len(tasks) == 1
+    assert tasks[0]["title"] == 'Watch "Better Call Saul"'
+
+
+async def test_search_index_follows_task_updates(
+    ac: AsyncClient,
+    tasks_data: list[dict[str, Any]],
+) -> None:
+    task_id = tasks_data[2]["id"]
+    response = await ac.get("/api/task/search", params={"query": "vince"})
+    assert response.json() == []
+
+    await ac.patch("/api/task", json={"id": task_id, "description": "Bravo, Vince"})
+
+    response = await ac.get("/api/task/search", params={"query": "vince"})
+    assert [task["id"] for task in response.json()] == [task_id]
+
+    await ac.request("DELETE", "/api/task", json={"task_id": task_id})
+
+    response = await ac.get("/api/task/search", params={"query": "vince"})
+    assert response.json() == []
+
+
+@pytest.mark.parametrize(
+    "method, url, json",
+    [
+        (
+            "POST",
+            "/api/section",
+            {"title": "New", "parent_id": "5fa09005-4ba9-417b-a9cb-82f182cd1f26"},
+        ),
+        (
+            # move the section with subsections
+            "POST",
+            "/api/section/move",
+            {
+                "section_id": "36ea0a4f-0334-464d-8066-aa359ecfdcba",
+                "to_parent_id": "f28a4518-eac3-4d60-86a7-f279801c2a3f",
+                "index": 0,
+            },
+        ),
+        (
+            "POST",
+            "/api/section/move",
+            {
+                "section_id": "5fa09005-4ba9-417b-a9cb-82f182cd1f26",
+                "to_parent_id": "0d966845-254b-4b5c-b8a7-8d34dcd3d527",
+                "index": 1,
+            },
+        ),
+    ],
+)
+async def test_section_paths_follow_changes(
+    method: str, url: str, json: dict[str, Any], ac: AsyncClient
+) -> None:
+    response = await ac.request(method, url, json=json)
+    assert response.is_success, response.text
+
+    async with raw_async_session_maker() as session:
+        result = await session.execute(select(SectionModel))
+        section_models = {sm.id: sm for sm in result.scalars()}
+    for section_model in section_models.values():
+        parent_path = (
+            section_models[section_model.parent_id].path
+            if section_model.parent_id
+            else "/"
+        )
+        assert section_model.path == f"{parent_path}{section_model.id.hex}/"
@@ -0,0 +1,38 @@
+from typing import Any
+
+from httpx import AsyncClient
+
+from planty.application.metrics import UNMATCHED_ROUTE
+from planty.application.tests.utils import capture_route_metrics, capture_statements
+
+
+async def test_route_metrics(ac: AsyncClient, tasks_data: list[dict[str, Any]]) -> None:
+    section_id = tasks_data[0]["section_id"]
+    with capture_route_metrics() as routes, capture_statements() as statements:
+        for _ in range(2):
+            response = await ac.get(f"/api/section/{section_id}")
+            assert response.status_code == 200
+        assert (await ac.get("/api/unknown")).status_code == 404
+
+    # (requests are grouped by routes, not by paths)
+    metrics = routes[("GET", "/api/section/{section_id}")]
+    assert metrics.requests == 2
+    assert metrics.statements == len(statements) > 0
+    assert metrics.max_statements == len(statements) // 2
+    assert 0 < metrics.db_time < metrics.time
+    assert routes[("GET", UNMATCHED_ROUTE)].statements == 0
+
+
+async def test_metrics_endpoint(
+    ac: AsyncClient, tasks_data: list[dict[str, Any]]
+) -> None:
+    with capture_route_metrics():
+        await ac.get("/api/sections")
+        response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert "# TYPE planty_db_statements_total counter" in lines
+    assert 'planty_http_requests_total{method="GET",route="/api/sections"} 1' in lines
+    # (the request to `/metrics` is recorded when it's finished)
+    assert not any('route="/metrics"' in line for line in lines)
@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+from typing import AsyncGenerator, Callable
+
+import pytest
+from fastapi import Request
+from httpx import ASGITransport, AsyncClient
+from pytest_mock import MockerFixture
+
+from planty.application.auth import current_user
+from planty.application.profiling import ProfilingMiddleware
+from planty.domain.task import User
+from planty.main import app as fastapi_app
+
+
+@pytest.fixture
+async def make_client(
+    test_user: User, tmp_path: Path
+) -> AsyncGenerator[Callable[..., AsyncClient], None]:
+    def make(is_superuser: bool, sample_rate: float = 0.0) -> AsyncClient:
+        # (like `current_user`, which marks superusers for the middleware)
+        def override(request: Request) -> User:
+            request.state.is_superuser = is_superuser
+            return test_user
+
+        fastapi_app.dependency_overrides[current_user] = override
+        middleware = ProfilingMiddleware(
+            fastapi_app, sample_rate=sample_rate, directory=str(tmp_path)
+        )
+        return AsyncClient(
+            transport=ASGITransport(app=middleware),
+            base_url="http://test",
+            cookies={"fastapiusersauth": "token"},
+        )
+
+    async with fastapi_app.router.lifespan_context(fastapi_app):
+        yield make
+
+
+async def test_superuser_gets_profile(make_client: Callable[..., AsyncClient]) -> None:
+    async with make_client(is_superuser=True) as ac:
+        response = await ac.get("/api/sections", params={"profile": "html"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/html")
+        assert "pyinstrument" in response.text
+        assert "get_sections" in response.text
+
+        response = await ac.get("/api/sections", headers={"X-Profile": "speedscope"})
+        assert response.status_code == 200
+        assert "speedscope" in json.loads(response.content)["$schema"]
+
+
+async def test_other_users_get_response(
+    make_client: Callable[..., AsyncClient],
+) -> None:
+    async with make_client(is_superuser=False) as ac:
+        response = await ac.get("/api/sections", params={"profile": "html"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json()
+
+
+async def test_anonymous_requests_are_not_profiled(
+    make_client: Callable[..., AsyncClient], mocker: MockerFixture
+) -> None:
+    profiler = mocker.patch("planty.application.profiling.Profiler")
+    async with make_client(is_superuser=True) as ac:
+        ac.cookies.clear()
+        response = await ac.get("/api/sections", params={"profile": "html"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+    profiler.assert_not_called()
+
+
+async def test_sampled_requests_are_saved(
+    make_client: Callable[..., AsyncClient], tmp_path: Path
+) -> None:
+    async with make_client(is_superuser=False, sample_rate=1.0) as ac:
+        response = await ac.get("/api/sections")
+        assert response.status_code == 200
+        assert response.json()
+    [profile_path] = tmp_path.iterdir()
+    assert profile_path.name.endswith("-GET-api_sections.html")
+    assert "pyinstrument" in profile_path.read_text()
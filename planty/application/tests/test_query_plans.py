@@ -0,0 +1,95 @@
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+import pytest
+
+from planty.application.tests.utils import capture_statements
+from planty.infrastructure.database import engine, raw_async_session_maker
+from planty.infrastructure.repositories import (
+    SQLAlchemySectionRepository,
+    SQLAlchemyTaskRepository,
+)
+
+USER_ID = UUID("38df4136-36b2-4171-8459-27f411af8323")
+SECTION_ID = UUID("090eda97-dd2d-45bb-baa0-7814313e5a38")
+
+HotQuery = Callable[
+    [SQLAlchemyTaskRepository, SQLAlchemySectionRepository], Awaitable[Any]
+]
+
+HOT_QUERIES: dict[str, HotQuery] = {
+    "get_tasks_by_due_to": lambda task_repo, _: task_repo.get_tasks_by_due_to(
+        date(2024, 1, 1), date(2024, 12, 31), USER_ID
+    ),
+    "count_tasks_by_due_to": lambda task_repo, _: task_repo.count_tasks_by_due_to(
+        date(2024, 1, 1), date(2024, 12, 31), USER_ID
+    ),
+    "get_overdue_tasks": lambda task_repo, _: task_repo.get_overdue_tasks(USER_ID),
+    "get_archived_tasks": lambda task_repo, _: task_repo.get_archived_tasks(
+        USER_ID, limit=50
+    ),
+    "get_archived_tasks_next_page": lambda task_repo, _: task_repo.get_archived_tasks(
+        USER_ID, limit=50, after=(datetime(2024, 3, 28), UUID(int=0))
+    ),
+    "search": lambda task_repo, _: task_repo.search(USER_ID, "watch", limit=50),
+    "section_get": lambda _, section_repo: section_repo.get(
+        SECTION_ID, with_direct_subsections=True
+    ),
+    "get_all_without_tasks": lambda _, section_repo: section_repo.get_all_without_tasks(
+        USER_ID, leaves_only=False, as_tree=True
+    ),
+    "get_subtree_without_tasks": lambda _, section_repo: (
+        section_repo.get_subtree_without_tasks(SECTION_ID)
+    ),
+    "is_in_subtree": lambda _, section_repo: section_repo.is_in_subtree(
+        SECTION_ID, SECTION_ID
+    ),
+    "count_subsections": lambda _, section_repo: section_repo.count_subsections(
+        SECTION_ID
+    ),
+    "get_ordering_key_after_last": lambda _, section_repo: (
+        section_repo.get_ordering_key_after_last(SECTION_ID)
+    ),
+}
+
+
+def _is_sequential_scan(dialect: str, plan_line: str) -> bool:
+    if dialect == "sqlite":
+        # e.g. "SCAN task" (vs "SEARCH task USING INDEX ..." or
+        # "SCAN task_fts VIRTUAL TABLE INDEX ...")
+        return (
+            plan_line.startswith("SCAN ")
+            and "USING" not in plan_line
+            and "VIRTUAL TABLE" not in plan_line
+        )
+    else:
+        return "Seq Scan" in plan_line
+
+
+@pytest.mark.parametrize("query_name", HOT_QUERIES)
+async def test_hot_query_uses_indexes(query_name: str) -> None:
+    async with raw_async_session_maker() as session:
+        task_repo = SQLAlchemyTaskRepository(session)
+        section_repo = SQLAlchemySectionRepository(session, task_repo)
+        with capture_statements() as statements:
+            await HOT_QUERIES[query_name](task_repo, section_repo)
+        assert statements
+
+        dialect = engine.dialect.name
+        connection = await session.connection()
+        if dialect == "sqlite":
+            explain_prefix = "EXPLAIN QUERY PLAN "
+        else:
+            # (tables are tiny in tests, so planner would prefer seq scans)
+            await connection.exec_driver_sql("SET enable_seqscan = off")
+            explain_prefix = "EXPLAIN "
+
+        for statement, parameters in statements:
+            result = await connection.exec_driver_sql(
+                explain_prefix + statement, parameters
+            )
+            plan = [str(row[-1]) for row in result]
+            assert not any(
+                _is_sequential_scan(dialect, plan_line) for plan_line in plan
+            ), f"Sequential scan in {query_name}:\n{statement}\n" + "\n".join(plan)
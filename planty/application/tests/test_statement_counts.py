@@ -0,0 +1,238 @@
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+import httpx
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from sqlalchemy import event, func, select, update
+
+from planty.application.tests.utils import capture_statements, query_budget
+from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.models import AttachmentModel, SectionModel, TaskModel
+from planty.utils import generate_uuid, get_datetime_now
+
+USER_ID = UUID("38df4136-36b2-4171-8459-27f411af8323")
+# Initially empty section, which is filled with tasks in these tests
+TASKS_SECTION_ID = "b9547aee-cba5-418e-b450-7914e44c9231"
+# Section with subsections only, which is filled with subsections in these tests
+SUBSECTIONS_SECTION_ID = "36ea0a4f-0334-464d-8066-aa359ecfdcba"
+
+EndpointCall = Callable[[AsyncClient, list[str], list[str]], Awaitable[httpx.Response]]
+
+# (task_ids, section_ids) are ids of just created tasks and subsections
+ENDPOINT_CALLS: dict[str, EndpointCall] = {
+    "create_task": lambda ac, task_ids, section_ids: ac.post(
+        "/api/task", json={"section_id": TASKS_SECTION_ID, "title": "New task"}
+    ),
+    "remove_task": lambda ac, task_ids, section_ids: ac.request(
+        "DELETE", "/api/task", json={"task_id": task_ids[0]}
+    ),
+    "move_task": lambda ac, task_ids, section_ids: ac.post(
+        "/api/task/move",
+        json={
+            "task_id": task_ids[-1],
+            "section_to_id": TASKS_SECTION_ID,
+            "index": 0,
+        },
+    ),
+    "toggle_task_completed": lambda ac, task_ids, section_ids: ac.post(
+        "/api/task/toggle_completed", json={"task_id": task_ids[1]}
+    ),
+    "toggle_task_archived": lambda ac, task_ids, section_ids: ac.post(
+        "/api/task/toggle_archived", json={"task_id": task_ids[1]}
+    ),
+    "shuffle_section": lambda ac, task_ids, section_ids: ac.post(
+        "/api/section/shuffle", json={"section_id": TASKS_SECTION_ID}
+    ),
+    "get_section": lambda ac, task_ids, section_ids: ac.get(
+        f"/api/section/{TASKS_SECTION_ID}"
+    ),
+    "create_section": lambda ac, task_ids, section_ids: ac.post(
+        "/api/section", json={"title": "New", "parent_id": SUBSECTIONS_SECTION_ID}
+    ),
+    "move_section": lambda ac, task_ids, section_ids: ac.post(
+        "/api/section/move",
+        json={
+            "section_id": section_ids[-1],
+            "to_parent_id": SUBSECTIONS_SECTION_ID,
+            "index": 0,
+        },
+    ),
+}
+
+# Max number of statements sent by a request to the endpoint (authentication
+# isn't included). Raise a budget only together with the change which needs
+# more statements.
+QUERY_BUDGETS: dict[str, int] = {
+    "create_task": 10,
+    "remove_task": 14,
+    "move_task": 11,
+    "toggle_task_completed": 14,
+    "toggle_task_archived": 14,
+    "shuffle_section": 9,
+    "get_section": 5,
+    "create_section": 11,
+    "move_section": 13,
+}
+
+
+async def _add_tasks_and_subsections(n: int) -> tuple[list[str], list[str]]:
+    # Tasks and subsections are added to the end of the sections. Every task
+    # except the first one gets an attachment to catch per-attachment queries
+    # (the first one is the one to be removed).
+    task_ids, section_ids = [], []
+    async with raw_async_session_maker() as session:
+        tasks_section = await session.get(SectionModel, UUID(TASKS_SECTION_ID))
+        assert tasks_section
+        tasks_section.has_tasks = True
+        subsections_section = await session.get(
+            SectionModel, UUID(SUBSECTIONS_SECTION_ID)
+        )
+        assert subsections_section
+        start_index = await session.scalar(
+            select(func.coalesce(func.max(TaskModel.index) + 1, 0)).where(
+                (TaskModel.section_id == UUID(TASKS_SECTION_ID))
+                & TaskModel.is_archived.is_(False)
+            )
+        )
+        start_subsection_index = await session.scalar(
+            select(func.coalesce(func.max(SectionModel.index) + 1, 0)).where(
+                SectionModel.parent_id == UUID(SUBSECTIONS_SECTION_ID)
+            )
+        )
+        assert start_index is not None and start_subsection_index is not None
+        for i in range(n):
+            task_id, section_id = generate_uuid(), generate_uuid()
+            session.add(
+                TaskModel(
+                    id=task_id,
+                    user_id=USER_ID,
+                    section_id=UUID(TASKS_SECTION_ID),
+                    title=f"Task {i}",
+                    description=None,
+                    is_completed=False,
+                    is_archived=False,
+                    added_at=get_datetime_now(),
+                    index=start_index + i,
+                )
+            )
+            if i != 0:
+                session.add(
+                    AttachmentModel(
+                        id=generate_uuid(),
+                        added_at=get_datetime_now(),
+                        index=0,
+                        task_id=task_id,
+                        aes_key_b64="",
+                        aes_iv_b64="",
+                        s3_file_key=str(generate_uuid()),
+                    )
+                )
+            session.add(
+                SectionModel(
+                    id=section_id,
+                    title=f"Section {i}",
+                    user_id=USER_ID,
+                    parent_id=UUID(SUBSECTIONS_SECTION_ID),
+                    path=f"{subsections_section.path}{section_id.hex}/",
+                    added_at=get_datetime_now(),
+                    index=start_subsection_index + i,
+                    has_tasks=False,
+                    has_subsections=False,
+                )
+            )
+            task_ids.append(str(task_id))
+            section_ids.append(str(section_id))
+        await session.commit()
+    return task_ids, section_ids
+
+
+async def _count_statements(
+    endpoint: str, ac: AsyncClient, n_tasks_and_subsections: int
+) -> int:
+    task_ids, section_ids = await _add_tasks_and_subsections(n_tasks_and_subsections)
+    with capture_statements() as statements:
+        response = await ENDPOINT_CALLS[endpoint](ac, task_ids, section_ids)
+    assert response.is_success, response.text
+    return len(statements)
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINT_CALLS)
+async def test_statement_count_does_not_depend_on_section_size(
+    endpoint: str, ac: AsyncClient, mocker: MockerFixture
+) -> None:
+    # (random shuffle may keep the order and skip updates)
+    mocker.patch("planty.domain.task.random.shuffle", side_effect=list.reverse)
+    n_statements_small = await _count_statements(endpoint, ac, 3)
+    # now the sections contain ~100 tasks and subsections
+    n_statements_large = await _count_statements(endpoint, ac, 100)
+    print(f"{endpoint}: {n_statements_small} -> {n_statements_large} statements")
+    assert n_statements_large == n_statements_small
+
+
+@pytest.mark.parametrize(
+    "endpoint, n_rows_written",
+    [
+        ("create_task", 1),
+        ("remove_task", 1),
+        ("move_task", 1),
+        ("toggle_task_archived", 1),
+        ("get_section", 0),
+    ],
+)
+async def test_reordering_writes_only_changed_tasks(
+    endpoint: str, n_rows_written: int, ac: AsyncClient
+) -> None:
+    # Ordering keys are sparse (see `planty.infrastructure.ordering`), so
+    # siblings of the changed task are not renumbered
+    task_ids, section_ids = await _add_tasks_and_subsections(100)
+    with capture_statements() as statements:
+        response = await ENDPOINT_CALLS[endpoint](ac, task_ids, section_ids)
+    assert response.is_success, response.text
+    n_task_rows_written = sum(
+        # (executemany gets a list of parameters)
+        len(parameters) if isinstance(parameters, list) else 1
+        for statement, parameters in statements
+        if statement.startswith(
+            ("INSERT INTO task ", "UPDATE task ", "DELETE FROM task ")
+        )
+    )
+    assert n_task_rows_written == n_rows_written
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINT_CALLS)
+async def test_query_budget(
+    endpoint: str, ac: AsyncClient, mocker: MockerFixture
+) -> None:
+    mocker.patch("planty.domain.task.random.shuffle", side_effect=list.reverse)
+    task_ids, section_ids = await _add_tasks_and_subsections(100)
+    with query_budget(QUERY_BUDGETS[endpoint]) as routes:
+        response = await ENDPOINT_CALLS[endpoint](ac, task_ids, section_ids)
+    assert response.is_success, response.text
+    assert len(routes) == 1
+
+
+async def test_archived_tasks_are_not_loaded(ac: AsyncClient) -> None:
+    task_ids, section_ids = await _add_tasks_and_subsections(10)
+    async with raw_async_session_maker() as session:
+        await session.execute(
+            update(TaskModel)
+            .where(TaskModel.id.in_([UUID(task_id) for task_id in task_ids[2:]]))
+            .values(is_archived=True)
+        )
+        await session.commit()
+
+    loaded_task_ids = []
+
+    def on_load(task_model: TaskModel, *args: Any) -> None:
+        loaded_task_ids.append(str(task_model.id))
+
+    event.listen(TaskModel, "load", on_load)
+    try:
+        response = await ENDPOINT_CALLS["get_section"](ac, task_ids, section_ids)
+    finally:
+        event.remove(TaskModel, "load", on_load)
+    assert response.is_success, response.text
+    assert [task["id"] for task in response.json()["tasks"]] == task_ids[:2]
+    assert loaded_task_ids == task_ids[:2]
@@ -0,0 +1,199 @@
+from datetime import timedelta
+from typing import Any
+from uuid import UUID
+
+import pytest
+from httpx import AsyncClient
+
+from planty.application.schemas import TaskCreateRequest
+from planty.application.services.sync import SyncService
+from planty.application.services.tasks import SectionService
+from planty.application.uow import SqlAlchemyUnitOfWork
+from planty.domain.task import Attachment, User
+from planty.utils import get_datetime_now
+
+SECTION_ID = "090eda97-dd2d-45bb-baa0-7814313e5a38"
+TASK_ID = UUID("de59bdb5-5f91-48dc-a034-246b8f86be25")  # (it has an attachment)
+ATTACHMENT_ID = UUID("2bfa26ba-ed8c-4353-adb2-c451957fc3e1")
+
+
+async def _sync(ac: AsyncClient, since: int) -> dict[str, Any]:
+    response = await ac.get("/api/sync", params={"since": since})
+    assert response.is_success, response.text
+    sync_data: dict[str, Any] = response.json()
+    return sync_data
+
+
+async def _get_cursor(ac: AsyncClient) -> int:
+    response = await ac.get("/api/sync")
+    assert response.is_success
+    assert response.json()["tasks"] == []
+    cursor: int = response.json()["cursor"]
+    return cursor
+
+
+async def test_sync_returns_changed_entities(ac: AsyncClient) -> None:
+    cursor = await _get_cursor(ac)
+    assert await _sync(ac, cursor) == {
+        "tasks": [],
+        "sections": [],
+        "attachments": [],
+        "removed": {"tasks": [], "sections": [], "attachments": []},
+        "cursor": cursor,
+        "has_more": False,
+    }
+
+    response = await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "A"})
+    task_id = response.json()["id"]
+    response = await ac.patch("/api/section", json={"id": SECTION_ID, "title": "B"})
+    assert response.is_success
+
+    sync_data = await _sync(ac, cursor)
+    assert [task["id"] for task in sync_data["tasks"]] == [task_id]
+    assert sync_data["tasks"][0]["title"] == "A"
+    assert isinstance(sync_data["tasks"][0]["index"], int)
+    assert [(s["id"], s["title"]) for s in sync_data["sections"]] == [(SECTION_ID, "B")]
+    assert sync_data["cursor"] > cursor
+    assert not sync_data["has_more"]
+
+    # nothing has changed since then
+    cursor = sync_data["cursor"]
+    assert (await _sync(ac, cursor))["tasks"] == []
+    assert await _get_cursor(ac) == cursor
+
+    response = await ac.request("DELETE", "/api/task", json={"task_id": task_id})
+    assert response.is_success
+    sync_data = await _sync(ac, cursor)
+    assert sync_data["tasks"] == []
+    assert sync_data["removed"]["tasks"] == [task_id]
+
+
+async def test_sync_reports_entities_removed_later_as_removed(ac: AsyncClient) -> None:
+    cursor = await _get_cursor(ac)
+    response = await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "A"})
+    task_id = response.json()["id"]
+    await ac.request("DELETE", "/api/task", json={"task_id": task_id})
+
+    sync_data = await _sync(ac, cursor)
+    assert sync_data["tasks"] == []
+    assert sync_data["removed"]["tasks"] == [task_id]
+
+
+async def test_sync_attachments(ac: AsyncClient, test_user: User) -> None:
+    cursor = await _get_cursor(ac)
+    async with SqlAlchemyUnitOfWork() as uow:
+        task = await uow.task_repo.get(TASK_ID)
+        attachment = Attachment(
+            task_id=task.id, aes_key_b64="", aes_iv_b64="", s3_file_key="key"
+        )
+        task.add_attachment(attachment)
+        await uow.task_repo.update_or_create(task)
+        await uow.commit()
+    async with SqlAlchemyUnitOfWork() as uow:
+        # (the task of the attachment isn't loaded here)
+        [existing_attachment] = await uow.task_repo.get_attachments([ATTACHMENT_ID])
+        await uow.task_repo.delete_attachment(existing_attachment)
+        await uow.commit()
+
+    sync_data = await _sync(ac, cursor)
+    assert [a["id"] for a in sync_data["attachments"]] == [str(attachment.id)]
+    assert sync_data["attachments"][0]["url"].endswith("/key")
+    assert sync_data["removed"]["attachments"] == [str(ATTACHMENT_ID)]
+
+
+@pytest.mark.parametrize("changes_limit", [1, 2, 1000])
+async def test_sync_by_parts(
+    ac: AsyncClient, monkeypatch: pytest.MonkeyPatch, changes_limit: int
+) -> None:
+    monkeypatch.setattr(
+        "planty.application.services.sync.SYNC_CHANGES_LIMIT", changes_limit
+    )
+    cursor = await _get_cursor(ac)
+    task_ids = []
+    for title in ("A", "B", "C"):
+        response = await ac.post(
+            "/api/task", json={"section_id": SECTION_ID, "title": title}
+        )
+        task_ids.append(response.json()["id"])
+
+    synced_task_ids: list[str] = []
+    while True:
+        sync_data = await _sync(ac, cursor)
+        synced_task_ids.extend(task["id"] for task in sync_data["tasks"])
+        cursor = sync_data["cursor"]
+        if not sync_data["has_more"]:
+            break
+    assert sorted(set(synced_task_ids)) == sorted(task_ids)
+
+
+async def test_sync_changes_of_another_user_are_not_visible(
+    ac: AsyncClient, another_test_user: User
+) -> None:
+    async with SqlAlchemyUnitOfWork() as uow:
+        cursor = (await SyncService(uow).get_changes(another_test_user.id, None)).cursor
+    await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "A"})
+    async with SqlAlchemyUnitOfWork() as uow:
+        sync_data = await SyncService(uow).get_changes(another_test_user.id, cursor)
+    assert sync_data.tasks == []
+
+
+async def test_sync_doesnt_split_changes_of_one_version(
+    ac: AsyncClient, monkeypatch: pytest.MonkeyPatch, test_user: User
+) -> None:
+    monkeypatch.setattr("planty.application.services.sync.SYNC_CHANGES_LIMIT", 1)
+    cursor = await _get_cursor(ac)
+    async with SqlAlchemyUnitOfWork() as uow:
+        task_ids = await SectionService(uow).create_tasks_bulk(
+            test_user.id,
+            [
+                TaskCreateRequest(section_id=UUID(SECTION_ID), title=title)
+                for title in ("A", "B")
+            ],
+        )
+        await uow.commit()
+
+    # (both tasks are added by one flush, so they have the same version)
+    sync_data = await _sync(ac, cursor)
+    assert sorted(task["id"] for task in sync_data["tasks"]) == sorted(
+        str(task_id) for task_id in task_ids
+    )
+    while sync_data["has_more"]:
+        sync_data = await _sync(ac, sync_data["cursor"])
+        assert not {task["id"] for task in sync_data["tasks"]} & {
+            str(task_id) for task_id in task_ids
+        }
+
+
+async def test_sync_with_expired_cursor(ac: AsyncClient) -> None:
+    cursor = await _get_cursor(ac)
+    await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "A"})
+    # (unknown cursor)
+    response = await ac.get("/api/sync", params={"since": cursor + 100})
+    assert response.status_code == 410
+
+    # the oldest change is pruned
+    async with SqlAlchemyUnitOfWork() as uow:
+        assert await uow.change_log_repo.prune(
+            added_before=get_datetime_now() + timedelta(minutes=1), batch_size=1
+        )
+        await uow.commit()
+    response = await ac.get("/api/sync", params={"since": cursor})
+    assert response.status_code == 410
+
+    # (clients load all the data again and sync from the current cursor)
+    cursor = await _get_cursor(ac)
+    await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "B"})
+    sync_data = await _sync(ac, cursor)
+    assert [task["title"] for task in sync_data["tasks"]] == ["B"]
+
+
+async def test_prune_change_log_keeps_recent_changes(ac: AsyncClient) -> None:
+    cursor = await _get_cursor(ac)
+    await ac.post("/api/task", json={"section_id": SECTION_ID, "title": "A"})
+    async with SqlAlchemyUnitOfWork() as uow:
+        assert not await uow.change_log_repo.prune(
+            added_before=get_datetime_now() - timedelta(minutes=1), batch_size=100
+        )
+        await uow.commit()
+    sync_data = await _sync(ac, cursor)
+    assert [task["title"] for task in sync_data["tasks"]] == ["A"]
@@ -0,0 +1,87 @@
+from typing import Any
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+
+from planty.application.auth import admin_user
+from planty.application.uow import ReadOnlyUnitOfWork, routing_stats
+from planty.domain.task import Task, User
+from planty.infrastructure.database import (
+    primary_read_only_session_maker,
+    read_only_session_maker,
+)
+from planty.infrastructure.repositories import SQLAlchemyChangeLogRepository
+from planty.main import app as fastapi_app
+
+
+async def test_read_only_unit_of_work_does_not_write(
+    tasks_data: list[dict[str, Any]],
+) -> None:
+    async with ReadOnlyUnitOfWork() as uow:
+        task = await uow.task_repo.get(tasks_data[0]["id"])
+        await uow.task_repo.update_or_create(
+            Task.model_validate({**task.model_dump(), "title": "changed"})
+        )
+        with pytest.raises(RuntimeError):
+            await uow.commit()
+        with pytest.raises(RuntimeError):
+            await uow.session.flush()
+
+    async with ReadOnlyUnitOfWork() as uow:
+        assert (await uow.task_repo.get(tasks_data[0]["id"])).title == task.title
+
+
+async def test_requests_are_routed_by_unit_of_work(
+    ac: AsyncClient,
+    test_user: User,
+    tasks_data: list[dict[str, Any]],
+    mocker: MockerFixture,
+) -> None:
+    read_write, read_only = routing_stats.read_write, routing_stats.read_only
+    response = await ac.get("/api/sections")
+    assert response.status_code == 200
+    response = await ac.patch(
+        "/api/task", json={"id": tasks_data[0]["id"], "title": "new"}
+    )
+    assert response.status_code == 200
+    assert routing_stats.read_write == read_write + 1
+    assert routing_stats.read_only == read_only + 1
+
+    # (the test user is an admin)
+    mocker.patch.dict(fastapi_app.dependency_overrides, {admin_user: lambda: test_user})
+    response = await ac.get("/api/user/stats/database")
+    assert response.json() == {
+        "read_write_units": read_write + 1,
+        "read_only_units": read_only + 1,
+        "primary_fallbacks": routing_stats.primary_fallbacks,
+        "read_only_target": "primary",
+    }
+
+
+@pytest.mark.parametrize(
+    "primary_version, replica_version, expected_session_maker",
+    [
+        (5, 5, read_only_session_maker),
+        (5, 4, primary_read_only_session_maker),
+    ],
+)
+async def test_read_only_unit_of_work_reads_own_writes_from_primary(
+    test_user: User,
+    mocker: MockerFixture,
+    primary_version: int,
+    replica_version: int,
+    expected_session_maker: Any,
+) -> None:
+    mocker.patch("planty.application.uow.read_only_target", "replica")
+    mocker.patch.object(
+        SQLAlchemyChangeLogRepository,
+        "get_data_version",
+        side_effect=[primary_version, replica_version],
+    )
+    primary_fallbacks = routing_stats.primary_fallbacks
+    async with ReadOnlyUnitOfWork(test_user.id) as uow:
+        assert uow.session_factory is expected_session_maker
+    assert routing_stats.primary_fallbacks == primary_fallbacks + (
+        expected_session_maker is primary_read_only_session_maker
+    )
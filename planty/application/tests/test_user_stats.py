@@ -0,0 +1,156 @@
+from typing import Any
+from uuid import UUID
+
+import pytest
+from httpx import AsyncClient
+from pytest_mock import MockerFixture
+from sqlalchemy import delete
+
+from planty.application.auth import admin_user
+from planty.domain.task import User
+from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.models import UserStatsModel
+from planty.infrastructure.repositories import SQLAlchemyUserStatsRepository
+from planty.main import app as fastapi_app
+
+ANOTHER_USER_ID = "73ca2340-76bd-4abe-b872-7e82a9528c45"
+
+
+@pytest.fixture(autouse=True)
+def as_admin(mocker: MockerFixture, test_user: User) -> None:
+    # (the test user is an admin)
+    mocker.patch.dict(fastapi_app.dependency_overrides, {admin_user: lambda: test_user})
+
+
+async def get_stats(ac: AsyncClient, **params: Any) -> list[dict[str, Any]]:
+    response = await ac.get("/api/user/stats", params=params)
+    assert response.status_code == 200, response.text
+    stats: list[dict[str, Any]] = response.json()
+    return stats
+
+
+async def test_user_stats(ac: AsyncClient, test_user: User) -> None:
+    stats = {user["id"]: user for user in await get_stats(ac)}
+    # (counts aren't multiplied by each other)
+    assert stats[str(test_user.id)] == {
+        "id": str(test_user.id),
+        "email": test_user.email,
+        "added_at": test_user.added_at.isoformat(),
+        "is_superuser": True,
+        "is_verified": True,
+        "tasks_count": 18,
+        "archived_tasks_count": 3,
+        "sections_count": 13,
+        "attachments_count": 1,
+        "storage_bytes": 0,
+    }
+    assert stats[ANOTHER_USER_ID]["tasks_count"] == 0
+    assert stats[ANOTHER_USER_ID]["sections_count"] == 1
+
+
+async def test_user_stats_are_updated(
+    ac: AsyncClient, test_user: User, tasks_data: list[dict[str, Any]]
+) -> None:
+    section_id = tasks_data[0]["section_id"]
+    response = await ac.post("/api/task", json={"section_id": section_id, "title": "A"})
+    assert response.status_code == 201, response.text
+    new_task_id = response.json()["id"]
+    response = await ac.post(
+        "/api/section",
+        json={"title": "New", "parent_id": "0d966845-254b-4b5c-b8a7-8d34dcd3d527"},
+    )
+    assert response.status_code == 201, response.text
+    response = await ac.post(
+        "/api/task/toggle_archived", json={"task_id": tasks_data[0]["id"]}
+    )
+    assert response.status_code == 200, response.text
+    response = await ac.post(
+        "/api/task/attachments",
+        json={
+            "attachments": [
+                {
+                    "task_id": task_id,
+                    "aes_key_b64": "someBase64EncodedAESKey==",
+                    "aes_iv_b64": "someBase64EncodedIV==",
+                    "size": 1000,
+                }
+                for task_id in [new_task_id, new_task_id, tasks_data[2]["id"]]
+            ]
+        },
+    )
+    assert response.status_code == 200, response.text
+    # (the task with an attachment of unknown size)
+    response = await ac.request(
+        "DELETE", "/api/task", json={"task_id": "de59bdb5-5f91-48dc-a034-246b8f86be25"}
+    )
+    assert response.status_code == 200, response.text
+    response = await ac.request("DELETE", "/api/task", json={"task_id": new_task_id})
+    assert response.status_code == 200, response.text
+
+    stats = await get_stats(ac)
+    [user_stats] = [user for user in stats if user["id"] == str(test_user.id)]
+    assert {key: value for key, value in user_stats.items() if "count" in key} == {
+        "tasks_count": 17,
+        "archived_tasks_count": 4,
+        "sections_count": 14,
+        "attachments_count": 1,
+    }
+    assert user_stats["storage_bytes"] == 1000
+
+    # counters are the same as rebuilt from scratch
+    async with raw_async_session_maker() as session:
+        await SQLAlchemyUserStatsRepository(session).rebuild()
+        await session.commit()
+    assert await get_stats(ac) == stats
+
+
+@pytest.mark.parametrize(
+    "params, expected_ids",
+    [
+        ({}, [ANOTHER_USER_ID, "38df4136-36b2-4171-8459-27f411af8323"]),
+        (
+            {"sort_by": "tasks_count"},
+            ["38df4136-36b2-4171-8459-27f411af8323", ANOTHER_USER_ID],
+        ),
+        (
+            {"sort_by": "tasks_count", "descending": False},
+            [ANOTHER_USER_ID, "38df4136-36b2-4171-8459-27f411af8323"],
+        ),
+        (
+            {"sort_by": "tasks_count", "limit": 1},
+            ["38df4136-36b2-4171-8459-27f411af8323"],
+        ),
+        ({"sort_by": "tasks_count", "offset": 1}, [ANOTHER_USER_ID]),
+        ({"sort_by": "storage_bytes", "offset": 2}, []),
+    ],
+)
+async def test_user_stats_pages(
+    ac: AsyncClient, params: dict[str, Any], expected_ids: list[str]
+) -> None:
+    # (both users are added at the same time, so they are ordered by ids)
+    assert [user["id"] for user in await get_stats(ac, **params)] == expected_ids
+
+
+async def test_user_stats_of_user_without_counters(ac: AsyncClient) -> None:
+    async with raw_async_session_maker() as session:
+        await session.execute(
+            delete(UserStatsModel).where(
+                UserStatsModel.user_id == UUID(ANOTHER_USER_ID)
+            )
+        )
+        await session.commit()
+
+    stats = await get_stats(ac, sort_by="tasks_count", descending=False)
+    assert stats[0]["id"] == ANOTHER_USER_ID
+    assert {key: value for key, value in stats[0].items() if "count" in key} == {
+        "tasks_count": 0,
+        "archived_tasks_count": 0,
+        "sections_count": 0,
+        "attachments_count": 0,
+    }
+    assert stats[0]["storage_bytes"] == 0
+
+
+async def test_user_stats_unknown_sorting(ac: AsyncClient) -> None:
+    response = await ac.get("/api/user/stats", params={"sort_by": "email"})
+    assert response.status_code == 422
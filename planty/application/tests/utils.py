@@ -0,0 +1,55 @@
+import contextlib
+from typing import Any, Iterator
+
+from sqlalchemy import event
+
+from planty.application.metrics import RouteMetrics, request_metrics
+from planty.infrastructure.database import engine
+
+
+@contextlib.contextmanager
+def capture_statements() -> Iterator[list[tuple[str, Any]]]:
+    # Collects (statement, parameters) of every query sent to the database
+    statements: list[tuple[str, Any]] = []
+
+    def before_cursor_execute(
+        conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextlib.contextmanager
+def capture_route_metrics() -> Iterator[dict[tuple[str, str], RouteMetrics]]:
+    # Collects metrics of requests (see `RequestMetricsMiddleware`) handled
+    # inside the block only
+    routes = request_metrics.routes
+    request_metrics.routes = {}
+    try:
+        yield request_metrics.routes
+    finally:
+        request_metrics.routes = routes
+
+
+@contextlib.contextmanager
+def query_budget(max_statements: int) -> Iterator[dict[tuple[str, str], RouteMetrics]]:
+    # Fails if a request handled inside the block sends more SQL statements
+    # than `max_statements`
+    with capture_route_metrics() as routes:
+        yield routes
+    exceeded = {
+        f"{method} {route}": metrics.max_statements
+        for (method, route), metrics in routes.items()
+        if metrics.max_statements > max_statements
+    }
+    assert not exceeded, f"More than {max_statements} statements: {exceeded}"
@@ -1,18 +1,30 @@
 from __future__ import annotations
 
 import abc
-from typing import Any
+from typing import Any, Optional
+from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.database import (
+    primary_read_only_session_maker,
+    raw_async_session_maker,
+    read_only_session_maker,
+    read_only_target,
+)
 from planty.infrastructure.repositories import (
+    IChangeLogRepository,
+    IDeletedObjectRepository,
     ISectionRepository,
     ITaskRepository,
     IUserRepository,
+    IUserStatsRepository,
+    SQLAlchemyChangeLogRepository,
+    SQLAlchemyDeletedObjectRepository,
     SQLAlchemySectionRepository,
     SQLAlchemyTaskRepository,
     SQLAlchemyUserRepository,
+    SQLAlchemyUserStatsRepository,
 )
 
 
@@ -20,6 +32,9 @@ class IUnitOfWork(abc.ABC):
     user_repo: IUserRepository
     task_repo: ITaskRepository
     section_repo: ISectionRepository
+    change_log_repo: IChangeLogRepository
+    deleted_object_repo: IDeletedObjectRepository
+    user_stats_repo: IUserStatsRepository
 
     async def __aenter__(self) -> IUnitOfWork:
         return self
@@ -36,23 +51,93 @@ class IUnitOfWork(abc.ABC):
         raise NotImplementedError
 
 
-class SqlAlchemyUnitOfWork(IUnitOfWork):
+class UnitOfWorkRoutingStats:
+    # Numbers of units of work by databases they read from (per process, like
+    # stats of caches)
+
     def __init__(self) -> None:
+        self.read_write = 0
+        self.read_only = 0
+        # read-only ones which read from the primary, as the replica was behind
+        self.primary_fallbacks = 0
+
+
+routing_stats = UnitOfWorkRoutingStats()
+
+
+class SqlAlchemyUnitOfWork(IUnitOfWork):
+    def __init__(self, session: Optional[AsyncSession] = None) -> None:
+        # Requests pass their own session (see `get_async_session`), which is
+        # shared with authentication, so that a request takes one connection
+        # at a time. Such a session is closed at the end of the request.
+        self._request_session = session
         self.session_factory = raw_async_session_maker
 
-    async def __aenter__(self) -> IUnitOfWork:
-        self.session: AsyncSession = self.session_factory()
+    async def __aenter__(self) -> SqlAlchemyUnitOfWork:
+        routing_stats.read_write += 1
+        return await self._enter()
+
+    async def _enter(self) -> SqlAlchemyUnitOfWork:
+        self.session: AsyncSession = self._request_session or self.session_factory()
         self.user_repo = SQLAlchemyUserRepository(self.session)
         self.task_repo = SQLAlchemyTaskRepository(self.session)
         self.section_repo = SQLAlchemySectionRepository(self.session, self.task_repo)
-        return await super().__aenter__()
+        self.change_log_repo = SQLAlchemyChangeLogRepository(self.session)
+        self.deleted_object_repo = SQLAlchemyDeletedObjectRepository(self.session)
+        self.user_stats_repo = SQLAlchemyUserStatsRepository(self.session)
+        await super().__aenter__()
+        return self
 
     async def __aexit__(self, *args: Any) -> None:
         await super().__aexit__(*args)
-        await self.session.close()
+        if self._request_session is None:
+            await self.session.close()
 
     async def commit(self) -> None:
         await self.session.commit()
 
     async def rollback(self) -> None:
         await self.session.rollback()
+
+
+class ReadOnlyUnitOfWork(SqlAlchemyUnitOfWork):
+    # For requests which only read: uses the read-only engine (possibly of a
+    # replica, see `read_only_engine`) and read-only transactions, which are
+    # never flushed or committed, so there is nothing to roll back either.
+    #
+    # Requests for data of a user pass `user_id`: if the replica hasn't
+    # caught up with the last change of the user yet (compared by
+    # `user.data_version`), the primary is read instead, so that users always
+    # see their own writes (and ETags never go back).
+
+    def __init__(self, user_id: Optional[UUID] = None) -> None:
+        # (requests' sessions belong to the primary engine, so they aren't used)
+        self._request_session = None
+        self.session_factory = read_only_session_maker
+        self._user_id = user_id
+
+    async def __aenter__(self) -> SqlAlchemyUnitOfWork:
+        routing_stats.read_only += 1
+        await self._enter()
+        if self._user_id is not None and read_only_target == "replica":
+            if await self._is_replica_behind(self._user_id):
+                routing_stats.primary_fallbacks += 1
+                await self.session.close()
+                self.session_factory = primary_read_only_session_maker
+                await self._enter()
+        return self
+
+    async def _is_replica_behind(self, user_id: UUID) -> bool:
+        # (the primary is read first: the replica can only catch up meanwhile)
+        async with primary_read_only_session_maker() as session:
+            primary_version = await SQLAlchemyChangeLogRepository(
+                session
+            ).get_data_version(user_id)
+        replica_version = await self.change_log_repo.get_data_version(user_id)
+        return replica_version < primary_version
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.session.close()
+
+    async def commit(self) -> None:
+        raise RuntimeError("Read-only unit of work can't be committed")
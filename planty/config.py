@@ -1,5 +1,5 @@
 import os
-from typing import Literal
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -14,6 +14,22 @@ class Settings(BaseSettings):
     aws_access_key_id: str
     aws_attachments_bucket: str
 
+    # max number of connections kept by the S3 client of every process and for
+    # how long (in seconds) idle connections are kept alive
+    s3_max_pool_connections: int = 50
+    s3_keepalive_timeout: float = 30
+
+    # how often (in seconds) S3 objects of removed attachments are deleted and
+    # the bucket is reconciled with attachments, see
+    # `AttachmentsGarbageCollector` (0 disables the garbage collector)
+    attachments_gc_interval: float = 60
+    attachments_reconciliation_interval: float = 60 * 60 * 24
+
+    # changes are kept in the change log of /api/sync for this many days
+    # (pruned by `planty.scripts.prune_change_log`), clients which haven't
+    # synced for longer have to load all the data again
+    change_log_retention_days: int = 30
+
     db_type: Literal["sqlite", "postgresql"]
 
     # (if `DB_TYPE` is "sqlite", then only `DB_NAME` is used)
@@ -30,6 +46,26 @@ class Settings(BaseSettings):
     test_db_name: str  # isn't used for sqlite (hardcoded to :memory:)
     test_db_pass: str
 
+    # Read-only units of work (see `ReadOnlyUnitOfWork`) use a separate
+    # engine, which reads from this PostgreSQL replica if it's set (the user,
+    # password and database name are the same as of the primary). Replicas may
+    # lag behind: reads of a user's data go to the primary while the replica
+    # hasn't caught up with the user's last change, other reads (e.g. admin
+    # stats) may not see changes committed right before them.
+    db_replica_host: Optional[str] = None
+    db_replica_port: Optional[int] = None
+
+    # Runtime profile of SQLite (WAL journal, tuned pragmas and the queue of
+    # writers, see `planty.infrastructure.database`). If it's disabled, only
+    # foreign keys are enabled.
+    sqlite_runtime_profile: bool = True
+    # how long (in seconds) writers wait for the database lock
+    sqlite_busy_timeout: float = 30
+    # page cache of every connection
+    sqlite_cache_size_kib: int = 64 * 1024
+    # (0 disables memory-mapped I/O)
+    sqlite_mmap_size: int = 256 * 1048576
+
     def get_database_url(
         self, for_alembic: bool = False, for_tests: bool = False
     ) -> str:
@@ -63,8 +99,43 @@ class Settings(BaseSettings):
                     else f"sqlite+pysqlite:///{self.db_name}.db"
                 )
 
+    def get_replica_database_url(self) -> Optional[str]:
+        if self.db_type != "postgresql" or self.db_replica_host is None:
+            return None
+        return (
+            "postgresql+asyncpg://"
+            f"{self.db_user}:{self.db_pass}@{self.db_replica_host}:"
+            f"{self.db_replica_port or self.db_port}/{self.db_name}"
+        )
+
     auth_secret: str
 
+    # max number of users whose section trees are cached in every process
+    sections_tree_cache_size: int = 1000
+
+    # max number of access tokens whose users are cached in every process and
+    # for how long (in seconds) they are cached, see `access_token_cache`
+    # (0 disables the cache). The TTL is also the revocation window: a token
+    # removed by logout in another process, or changes of the user made there
+    # (e.g. deactivation), take effect in this process up to TTL seconds later.
+    access_token_cache_size: int = 10000
+    access_token_cache_ttl: float = 30
+
+    # Per-route metrics of requests and their SQL statements, which are
+    # exposed on `/metrics` in the Prometheus format, see
+    # `planty.application.metrics`
+    request_metrics_enabled: bool = True
+
+    # Profiling of requests with pyinstrument (a dev dependency, so it must be
+    # installed), see `ProfilingMiddleware`. Superusers get the profile of a
+    # request instead of its response by adding `?profile=html` (or
+    # `speedscope`) or the `X-Profile` header, and the given fraction of all
+    # requests is profiled to the directory.
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.0
+    profiling_dir: str = "profiles"
+    profiling_format: Literal["html", "speedscope"] = "html"
+
     # TODO: should the default value be `True`?
     shutdown_containers_after_test: bool = False
 
@@ -10,6 +10,8 @@ from typing import Any, Protocol, TypeVar
 
 # substitute the `PLANTY_MODE` _before_ the Settings object is created.
 os.environ["PLANTY_MODE"] = "TEST"
+# (tests run the garbage collector of attachments explicitly)
+os.environ["PLANTY_ATTACHMENTS_GC_INTERVAL"] = "0"
 
 from planty.domain.task import Attachment, Section, Task, User  # noqa: E402
 from planty.infrastructure.repositories import SQLAlchemySectionRepository  # noqa: E402
@@ -1,9 +1,9 @@
-from datetime import date
+from datetime import date, timedelta
+from typing import Iterator
 
-from dateutil.relativedelta import relativedelta
-
-from planty.application.schemas import TasksByDate, TasksByDates
+from planty.application.schemas import TasksByDate, TasksByDates, TasksCount
 from planty.domain.task import Task
+from planty.domain.types import CalendarPeriodType
 from planty.utils import get_today
 
 
@@ -12,16 +12,72 @@ def divide_tasks_by_dates(
     not_before: date,
     not_after: date,
 ) -> TasksByDates:
-    tasks_by_dates = []
     # Never show tasks before today
-    current_date = max(not_before, get_today())
-    while current_date <= not_after:
-        tasks_by_dates.append(TasksByDate(date=current_date, tasks=[]))
-        current_date += relativedelta(days=1)
-
+    tasks_by_date: dict[date, list[Task]] = {
+        date_: [] for date_ in iterate_dates(max(not_before, get_today()), not_after)
+    }
     for task in tasks:
-        for date_tasks_item in tasks_by_dates:
-            if date_tasks_item.date == task.due_to:
-                date_tasks_item.tasks.append(task)
-                break
-    return TasksByDates(overdue=[], by_dates=tasks_by_dates)
+        if task.due_to is None:
+            continue
+        date_tasks = tasks_by_date.get(task.due_to)
+        if date_tasks is not None:
+            date_tasks.append(task)
+    return TasksByDates(
+        overdue=[],
+        by_dates=[
+            TasksByDate(date=date_, tasks=date_tasks)
+            for date_, date_tasks in tasks_by_date.items()
+        ],
+    )
+
+
+def count_tasks_by_periods(
+    tasks_count_by_date: dict[date, int],
+    not_before: date,
+    not_after: date,
+    period: CalendarPeriodType,
+) -> list[TasksCount]:
+    # Every period is denoted by its first day (Monday for weeks), so the first
+    # one may start before `not_before`
+    counts: dict[date, int] = {
+        get_period_start(date_, period): 0
+        for date_ in iterate_dates(not_before, not_after)
+    }
+    for date_, tasks_count in tasks_count_by_date.items():
+        if not_before <= date_ <= not_after:
+            counts[get_period_start(date_, period)] += tasks_count
+    return [
+        TasksCount(period_start=period_start, count=count)
+        for period_start, count in counts.items()
+    ]
+
+
+def count_periods(not_before: date, not_after: date, period: CalendarPeriodType) -> int:
+    # Number of periods returned by `count_tasks_by_periods`
+    first_start = get_period_start(not_before, period)
+    last_start = get_period_start(not_after, period)
+    if period == "months":
+        return (
+            (last_start.year - first_start.year) * 12
+            + last_start.month
+            - first_start.month
+            + 1
+        )
+    period_days = 7 if period == "weeks" else 1
+    return (last_start - first_start).days // period_days + 1
+
+
+def get_period_start(date_: date, period: CalendarPeriodType) -> date:
+    if period == "days":
+        return date_
+    elif period == "weeks":
+        return date_ - timedelta(days=date_.weekday())
+    elif period == "months":
+        return date_.replace(day=1)
+    else:
+        raise NotImplementedError(f"Unexpected period: {period}")
+
+
+def iterate_dates(not_before: date, not_after: date) -> Iterator[date]:
+    for days in range((not_after - not_before).days + 1):
+        yield not_before + timedelta(days=days)
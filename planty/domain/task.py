@@ -253,6 +253,11 @@ class Attachment(Entity):
     aes_iv_b64: str
     s3_file_key: str
     task_id: UUID
+    # in bytes, if it's known
+    size: Optional[int] = None
+    # attachments uploaded in parts are pending till the upload is completed,
+    # they aren't shown to clients meanwhile
+    is_pending: bool = False
 
     added_at: datetime = Field(default_factory=get_datetime_now)
 
@@ -0,0 +1,112 @@
+import random
+from datetime import date, timedelta
+from typing import Optional
+from uuid import UUID
+
+import pytest
+from dateutil.relativedelta import relativedelta
+from pytest_mock import MockerFixture
+
+from planty.application.schemas import TasksByDate, TasksByDates
+from planty.domain.calendar import count_tasks_by_periods, divide_tasks_by_dates
+from planty.domain.task import Task
+from planty.domain.types import CalendarPeriodType
+
+TODAY = date(2024, 12, 10)
+
+
+def _divide_tasks_by_dates_reference(
+    tasks: list[Task], not_before: date, not_after: date
+) -> TasksByDates:
+    # the former straightforward implementation
+    tasks_by_dates = []
+    current_date = max(not_before, TODAY)
+    while current_date <= not_after:
+        tasks_by_dates.append(TasksByDate(date=current_date, tasks=[]))
+        current_date += relativedelta(days=1)
+
+    for task in tasks:
+        for date_tasks_item in tasks_by_dates:
+            if date_tasks_item.date == task.due_to:
+                date_tasks_item.tasks.append(task)
+                break
+    return TasksByDates(overdue=[], by_dates=tasks_by_dates)
+
+
+def _random_date(rng: random.Random, around: date, days: int) -> date:
+    return around + timedelta(days=rng.randint(-days, days))
+
+
+def _make_task(due_to: Optional[date]) -> Task:
+    return Task(
+        user_id=UUID(int=0),
+        section_id=UUID(int=0),
+        title="task",
+        due_to=due_to,
+    )
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_divide_tasks_by_dates_matches_reference(
+    seed: int, mocker: MockerFixture
+) -> None:
+    mocker.patch("planty.domain.calendar.get_today", return_value=TODAY)
+    rng = random.Random(seed)
+    not_before = _random_date(rng, TODAY, days=40)
+    # (including empty intervals and ones which are entirely in the past)
+    not_after = not_before + timedelta(days=rng.randint(-1, 400))
+    tasks = [
+        _make_task(
+            due_to=None if rng.random() < 0.1 else _random_date(rng, not_before, 420)
+        )
+        for _ in range(rng.randint(0, 300))
+    ]
+
+    tasks_by_dates = divide_tasks_by_dates(tasks, not_before, not_after)
+    expected = _divide_tasks_by_dates_reference(tasks, not_before, not_after)
+    assert tasks_by_dates == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("period", ["days", "weeks", "months"])
+def test_count_tasks_by_periods(seed: int, period: CalendarPeriodType) -> None:
+    rng = random.Random(seed)
+    not_before = _random_date(rng, TODAY, days=100)
+    not_after = not_before + timedelta(days=rng.randint(0, 400))
+    due_dates = [_random_date(rng, not_before, 450) for _ in range(300)]
+    tasks_count_by_date: dict[date, int] = {}
+    for due_to in due_dates:
+        tasks_count_by_date[due_to] = tasks_count_by_date.get(due_to, 0) + 1
+
+    counts = count_tasks_by_periods(tasks_count_by_date, not_before, not_after, period)
+
+    period_starts = [count.period_start for count in counts]
+    assert period_starts == sorted(set(period_starts))
+    assert period_starts[0] <= not_before
+    assert not_after < period_starts[-1] + relativedelta(**{period: 1})  # type: ignore
+    for count, next_period_start in zip(
+        counts, period_starts[1:] + [not_after + timedelta(days=1)]
+    ):
+        expected_count = sum(
+            max(count.period_start, not_before)
+            <= due_to
+            < min(next_period_start, not_after + timedelta(days=1))
+            for due_to in due_dates
+        )
+        assert count.count == expected_count
+
+
+def test_count_tasks_by_weeks() -> None:
+    counts = count_tasks_by_periods(
+        {date(2024, 12, 1): 1, date(2024, 12, 2): 2, date(2024, 12, 15): 3},
+        # Wednesday .. Monday
+        not_before=date(2024, 11, 27),
+        not_after=date(2024, 12, 16),
+        period="weeks",
+    )
+    assert [(count.period_start, count.count) for count in counts] == [
+        (date(2024, 11, 25), 1),
+        (date(2024, 12, 2), 2),
+        (date(2024, 12, 9), 3),
+        (date(2024, 12, 16), 0),
+    ]
@@ -2,3 +2,11 @@ from typing import Literal
 
 
 RecurrencePeriodType = Literal["days", "weeks", "months", "years"]
+
+# periods of calendar heatmaps
+CalendarPeriodType = Literal["days", "weeks", "months"]
+
+# orderings of admin stats of users
+UserStatsSortKey = Literal[
+    "added_at", "tasks_count", "attachments_count", "storage_bytes"
+]
@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, TypeVar
+from uuid import UUID
+
+from planty.config import settings
+from planty.domain.task import Section
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class VersionedLRUCache(Generic[K, V]):
+    # In-process LRU cache of values which are valid only for a certain
+    # version of the underlying data (e.g. a counter in the database, which is
+    # incremented on every change). Since versions are kept outside, caches of
+    # different processes stay consistent without any coordination.
+    #
+    # Only the latest stored version of a value is kept for every key.
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: OrderedDict[K, tuple[int, V]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def hit_ratio(self) -> float:
+        requests_count = self.hits + self.misses
+        return self.hits / requests_count if requests_count else 0.0
+
+    def get(self, key: K, version: int) -> Optional[V]:
+        item = self._items.get(key)
+        if item is None or item[0] != version:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: K, version: int, value: V) -> None:
+        item = self._items.get(key)
+        if item is not None and item[0] > version:
+            # (a newer value has already been stored by a concurrent request)
+            return
+        self._items[key] = (version, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        self._items.pop(key, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+class AccessTokenCache(Generic[V]):
+    # In-process LRU cache of values (i.e. users) found by access tokens.
+    #
+    # Unlike `VersionedLRUCache`, there is no cheap version to check (that
+    # would cost a database round trip, which is what the cache avoids), so
+    # values are kept for `ttl` seconds at most. Changes made by this process
+    # (logout, user updates) invalidate values explicitly, while changes made
+    # by other processes (or right in the database) are picked up after `ttl`.
+    # So `ttl` is the window in which a revoked token (or a deactivated user)
+    # can still be used in other processes, and it must be kept small.
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        # token -> (expiration time, user_id, value)
+        self._items: OrderedDict[str, tuple[float, UUID, V]] = OrderedDict()
+        # (to invalidate all tokens of a user)
+        self._tokens_by_user_id: dict[UUID, set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def hit_ratio(self) -> float:
+        requests_count = self.hits + self.misses
+        return self.hits / requests_count if requests_count else 0.0
+
+    def get(self, token: str) -> Optional[V]:
+        item = self._items.get(token)
+        if item is None:
+            self.misses += 1
+            return None
+        if item[0] <= time.monotonic():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._items.move_to_end(token)
+        self.hits += 1
+        return item[2]
+
+    def set(
+        self, token: str, user_id: UUID, value: V, ttl: Optional[float] = None
+    ) -> None:
+        # (`ttl` can only shorten the default one, e.g. for expiring tokens)
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._remove(token)
+        self._items[token] = (time.monotonic() + ttl, user_id, value)
+        self._tokens_by_user_id.setdefault(user_id, set()).add(token)
+        while len(self._items) > self.max_size:
+            self._remove(next(iter(self._items)))
+            self.evictions += 1
+
+    def invalidate(self, token: str) -> None:
+        self._remove(token)
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        for token in self._tokens_by_user_id.pop(user_id, set()):
+            self._items.pop(token, None)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._tokens_by_user_id.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def _remove(self, token: str) -> None:
+        item = self._items.pop(token, None)
+        if item is None:
+            return
+        user_tokens = self._tokens_by_user_id[item[1]]
+        user_tokens.discard(token)
+        if not user_tokens:
+            del self._tokens_by_user_id[item[1]]
+
+
+# user_id -> (flat) list of user sections with linked subsections, see
+# `SQLAlchemySectionRepository.get_all_without_tasks`
+sections_tree_cache: VersionedLRUCache[UUID, list[Section]] = VersionedLRUCache(
+    max_size=settings.sections_tree_cache_size
+)
+
+
+# access token -> column values of the user, see `CachedDatabaseStrategy`
+access_token_cache: AccessTokenCache[dict[str, Any]] = AccessTokenCache(
+    max_size=settings.access_token_cache_size,
+    ttl=settings.access_token_cache_ttl,
+)
@@ -1,8 +1,15 @@
-from typing import Any, AsyncGenerator
+import asyncio
+from typing import Any, AsyncGenerator, Literal, Optional
 
-from sqlalchemy import event
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import Connection, event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.util import await_only
 
 from planty.config import settings
 
@@ -17,25 +24,181 @@ engine = create_async_engine(
 )
 
 
-# Enable foreign key checks for SQLite
-if settings.db_type == "sqlite":
+class SQLiteWriteLane:
+    # SQLite allows only one write transaction at a time. Concurrent writers
+    # of the process wait for their turn in this queue (and writers of other
+    # processes - in SQLite's own busy handler), instead of competing for the
+    # database lock and failing with "database is locked".
+    #
+    # The lane is entered right before the first write of a transaction and
+    # left when its connection is returned to the pool, i.e. after the commit
+    # or rollback. Reads don't enter it at all (with WAL they aren't blocked
+    # by writes). It's entered from within statement execution, which is
+    # always run by SQLAlchemy in a greenlet, so it can be awaited there.
+
+    def __init__(self, timeout: float):
+        self._timeout = timeout
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # DBAPI connection of the current write transaction
+        self._holder: Any = None
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def attach(self, engine: AsyncEngine) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", self._enter)
+        event.listen(engine.sync_engine.pool, "checkin", self._leave)
+        # (invalidated connections aren't returned to the pool)
+        event.listen(engine.sync_engine.pool, "invalidate", self._leave)
+
+    def _enter(self, conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        dbapi_connection = conn.connection.dbapi_connection
+        if dbapi_connection is self._holder or not _is_write(statement):
+            return
+        await_only(self._acquire(dbapi_connection))
+
+    async def _acquire(self, dbapi_connection: Any) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # (a lock can be used only in one event loop, e.g. tests run every
+            # test in a new one)
+            self._lock = asyncio.Lock()
+            self._loop = loop
+            self._holder = None
+        assert self._lock is not None
+        if self._lock.locked():
+            self.waits += 1
+            start = loop.time()
+            try:
+                await asyncio.wait_for(self._lock.acquire(), self._timeout)
+            finally:
+                self.wait_time += loop.time() - start
+        else:
+            await self._lock.acquire()
+        self._holder = dbapi_connection
+
+    def _leave(self, dbapi_connection: Any, *args: Any) -> None:
+        if dbapi_connection is None or dbapi_connection is not self._holder:
+            return
+        assert self._lock is not None
+        self._holder = None
+        self._lock.release()
+
 
+def _is_write(statement: str) -> bool:
+    return statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE")
+
+
+def get_sqlite_pragmas() -> dict[str, Any]:
+    # Runtime profile of SQLite for production: with WAL journal reads don't
+    # block writes and vice versa, and commits don't wait for fsync (the
+    # database stays consistent, but the last commits may be lost if the
+    # machine, not only the process, crashes)
+    return {
+        "foreign_keys": "ON",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(settings.sqlite_busy_timeout * 1000),
+        # (negative values are in KiB)
+        "cache_size": -settings.sqlite_cache_size_kib,
+        "mmap_size": settings.sqlite_mmap_size,
+    }
+
+
+def set_sqlite_pragmas(engine: AsyncEngine, pragmas: dict[str, Any]) -> None:
     @event.listens_for(engine.sync_engine, "connect")
-    def set_sqlite_pragma(dbapi_connection: Any, connection_record: Any) -> None:
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON;")
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value};")
         cursor.close()
 
 
+sqlite_write_lane: Optional[SQLiteWriteLane] = None
+
+if settings.db_type == "sqlite":
+    if settings.sqlite_runtime_profile:
+        set_sqlite_pragmas(engine, get_sqlite_pragmas())
+        sqlite_write_lane = SQLiteWriteLane(timeout=settings.sqlite_busy_timeout)
+        sqlite_write_lane.attach(engine)
+    else:
+        # Enable foreign key checks for SQLite
+        set_sqlite_pragmas(engine, {"foreign_keys": "ON"})
+
+
+# Engine of read-only units of work. It has its own pool, so that reads don't
+# wait for connections taken by writes (and the other way round), and it can
+# point to a replica of PostgreSQL.
+replica_database_url = (
+    settings.get_replica_database_url() if settings.mode != "TEST" else None
+)
+read_only_target: Literal["primary", "replica"] = (
+    "replica" if replica_database_url is not None else "primary"
+)
+if settings.mode == "TEST" and settings.db_type == "sqlite":
+    # (the in-memory database exists only in connections of its engine)
+    read_only_engine = engine
+else:
+    read_only_engine = create_async_engine(replica_database_url or database_url)
+    if settings.db_type == "sqlite":
+        set_sqlite_pragmas(
+            read_only_engine,
+            {
+                **(
+                    get_sqlite_pragmas()
+                    if settings.sqlite_runtime_profile
+                    else {"foreign_keys": "ON"}
+                ),
+                "query_only": "ON",
+            },
+        )
+
+
+class ReadOnlySession(Session):
+    # Sessions of read-only units of work, which are never flushed (so
+    # nothing is written even if loaded models are changed by mistake)
+    pass
+
+
+@event.listens_for(ReadOnlySession, "after_begin")
+def set_transaction_read_only(
+    session: Session, transaction: Any, connection: Connection
+) -> None:
+    # (SQLite connections of the engine are read-only anyway, and tests read
+    # from the in-memory database of the primary engine)
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def forbid_flush(session: Session, *args: Any) -> None:
+    raise RuntimeError("Read-only sessions can't be flushed")
+
+
 # Ensure to close the session obtained from this sessionmaker
 # (or use it as a context manager to automatically handle closure)
 raw_async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+read_only_session_maker = async_sessionmaker(
+    read_only_engine,
+    expire_on_commit=False,
+    autoflush=False,
+    sync_session_class=ReadOnlySession,
+)
+# (read-only sessions of the primary, for reads which the replica is behind)
+primary_read_only_session_maker = async_sessionmaker(
+    engine,
+    expire_on_commit=False,
+    autoflush=False,
+    sync_session_class=ReadOnlySession,
+)
 
 
 class Base(DeclarativeBase):
     pass
 
 
+# Session of a request: FastAPI resolves the dependency once per request, so
+# authentication and the unit of work of the route share it
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with raw_async_session_maker() as session:
         yield session
@@ -1,17 +1,27 @@
 from datetime import date, datetime
-from typing import Optional
+from typing import Any, Optional
 from uuid import UUID
 
 
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTableUUID
 from pydantic import NonNegativeInt
-from sqlalchemy import Date, DateTime, ForeignKey
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    false,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from fastapi_users_db_sqlalchemy.access_token import (
     SQLAlchemyBaseAccessTokenTableUUID,
 )
 from planty.domain.task import Attachment, RecurrenceInfo, Section, Task, User
 from planty.infrastructure.database import Base
+from planty.infrastructure.search import register_search_ddl
 from planty.infrastructure.utils import GUID  # type: ignore
 from planty.utils import get_datetime_now
 
@@ -27,7 +37,9 @@ class TaskModel(Base):
     description: Mapped[Optional[str]]
     is_completed: Mapped[bool]
     is_archived: Mapped[bool]
-    index: Mapped[int]  # ignored if `is_archived`
+    # ordering key inside section, see `planty.infrastructure.ordering`
+    # (ignored if `is_archived`)
+    index: Mapped[int] = mapped_column(BigInteger)
 
     due_to: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
     recurrence_period: Mapped[Optional[int]]
@@ -40,10 +52,12 @@ class TaskModel(Base):
         "AttachmentModel",
         back_populates="task",
         order_by="AttachmentModel.index",
+        # (attachments are removed with the task, see also `DeletedObjectModel`)
+        cascade="all, delete-orphan",
     )
 
     @classmethod
-    def from_entity(cls, task: Task, index: NonNegativeInt) -> "TaskModel":
+    def from_entity(cls, task: Task, index: int) -> "TaskModel":
         return cls(
             id=task.id,
             user_id=task.user_id,
@@ -63,43 +77,118 @@ class TaskModel(Base):
         )
 
     def to_entity(self, attachments: list[Attachment]) -> Task:
-        recurrence = (
-            RecurrenceInfo(
-                period=self.recurrence_period,
-                type=self.recurrence_type,
-                flexible_mode=self.flexible_recurrence_mode,
+        values = _loaded_values(self, _TASK_COLUMNS)
+        recurrence_period = values.pop("recurrence_period")
+        recurrence_type = values.pop("recurrence_type")
+        flexible_recurrence_mode = values.pop("flexible_recurrence_mode")
+        values["recurrence"] = (
+            RecurrenceInfo.model_validate(
+                {
+                    "period": recurrence_period,
+                    "type": recurrence_type,
+                    "flexible_mode": flexible_recurrence_mode,
+                }
             )
-            if self.recurrence_period is not None
+            if recurrence_period is not None
             else None
         )
-        return Task(
-            id=self.id,
-            user_id=self.user_id,
-            section_id=self.section_id,
-            title=self.title,
-            description=self.description,
-            is_completed=self.is_completed,
-            is_archived=self.is_archived,
-            added_at=self.added_at,
-            due_to=self.due_to,
-            recurrence=recurrence,
-            attachments=attachments,
-        )
+        values["attachments"] = attachments
+        return Task.model_validate(values)
+
+
+_TASK_COLUMNS = (
+    "id",
+    "user_id",
+    "section_id",
+    "title",
+    "description",
+    "is_completed",
+    "is_archived",
+    "added_at",
+    "due_to",
+    "recurrence_period",
+    "recurrence_type",
+    "flexible_recurrence_mode",
+)
+
+
+# Indexes for the hot queries of the repositories. Partial indexes use exactly
+# the same predicates as queries do, so that both SQLite and PostgreSQL could
+# match them.
+Index(
+    "ix_task_user_id_due_to_not_archived",
+    TaskModel.user_id,
+    TaskModel.due_to,
+    sqlite_where=TaskModel.is_archived.is_(False),
+    postgresql_where=TaskModel.is_archived.is_(False),
+)
+Index(
+    "ix_task_user_id_added_at_id_archived",
+    TaskModel.user_id,
+    TaskModel.added_at,
+    TaskModel.id,
+    sqlite_where=TaskModel.is_archived.is_(True),
+    postgresql_where=TaskModel.is_archived.is_(True),
+)
+Index("ix_task_section_id_index", TaskModel.section_id, TaskModel.index)
+# (tasks of a section are loaded without archived ones, which may pile up)
+Index(
+    "ix_task_section_id_index_not_archived",
+    TaskModel.section_id,
+    TaskModel.index,
+    sqlite_where=TaskModel.is_archived.is_(False),
+    postgresql_where=TaskModel.is_archived.is_(False),
+)
+
+register_search_ddl(TaskModel.__table__)
 
 
 class UserModel(SQLAlchemyBaseUserTableUUID, Base):
     __tablename__ = "user"
     added_at: Mapped[datetime] = mapped_column(DateTime, default=get_datetime_now)
+    # incremented on every change of user sections (see `sections_tree_cache`)
+    sections_version: Mapped[int] = mapped_column(default=0, server_default="0")
+    # incremented by every flush which changes user tasks, sections or
+    # attachments, i.e. the version of the latest change in the change log
+    # (see `SQLAlchemyChangeLogRepository`)
+    data_version: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
 
     sections = relationship("SectionModel", back_populates="user")
     tasks = relationship("TaskModel", back_populates="user")
 
     def to_entity(self) -> User:
-        return User(
-            id=self.id,
-            email=self.email,
-            added_at=self.added_at,
-        )
+        return User.model_validate(_loaded_values(self, ("id", "email", "added_at")))
+
+
+class UserStatsModel(Base):
+    # Counters of user data for admin stats, kept up to date by
+    # `SQLAlchemyUserStatsRepository` (and rebuilt by
+    # `planty.scripts.rebuild_user_stats`)
+    __tablename__ = "user_stats"
+    user_id: Mapped[UUID] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    tasks_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    archived_tasks_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    sections_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    attachments_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    # total size of attachments with known sizes
+    storage_bytes: Mapped[int] = mapped_column(
+        BigInteger, default=0, server_default="0"
+    )
+
+
+# (for sorting of admin stats, user ids make the order stable for pagination)
+Index("ix_user_added_at", UserModel.added_at, UserModel.id)  # type: ignore
+Index("ix_user_stats_tasks_count", UserStatsModel.tasks_count, UserStatsModel.user_id)
+Index(
+    "ix_user_stats_attachments_count",
+    UserStatsModel.attachments_count,
+    UserStatsModel.user_id,
+)
+Index(
+    "ix_user_stats_storage_bytes", UserStatsModel.storage_bytes, UserStatsModel.user_id
+)
 
 
 class AccessTokenModel(SQLAlchemyBaseAccessTokenTableUUID, Base):
@@ -115,8 +204,14 @@ class SectionModel(Base):
     )
     user_id: Mapped[UUID] = mapped_column(ForeignKey("user.id"))
     added_at: Mapped[datetime] = mapped_column(DateTime)
+    # Materialized path: ids of all ancestors and the section itself, e.g.
+    # "/<root id>/<parent id>/<id>/" (compared bytewise, hence "C" collation)
+    path: Mapped[str] = mapped_column(
+        String().with_variant(String(collation="C"), "postgresql")
+    )
 
-    index: Mapped[int]  # ordering inside parent
+    # ordering key inside parent, see `planty.infrastructure.ordering`
+    index: Mapped[int] = mapped_column(BigInteger)
 
     tasks: Mapped[list[TaskModel]] = relationship(
         "TaskModel",
@@ -129,12 +224,13 @@ class SectionModel(Base):
     has_subsections: Mapped[bool]
 
     @classmethod
-    def from_entity(cls, section: Section, index: NonNegativeInt) -> "SectionModel":
+    def from_entity(cls, section: Section, index: int, path: str) -> "SectionModel":
         return cls(
             id=section.id,
             title=section.title,
             user_id=section.user_id,
             parent_id=section.parent_id,
+            path=path,
             added_at=section.added_at,
             index=index,
             has_tasks=section.has_tasks,
@@ -142,16 +238,26 @@ class SectionModel(Base):
         )
 
     def to_entity(self, tasks: list[Task], subsections: list[Section]) -> Section:
-        return Section(
-            id=self.id,
-            title=self.title,
-            user_id=self.user_id,
-            parent_id=self.parent_id,
-            tasks=tasks,
-            subsections=subsections,
-            has_tasks=self.has_tasks,
-            has_subsections=self.has_subsections,
-        )
+        values = _loaded_values(self, _SECTION_COLUMNS)
+        values["tasks"] = tasks
+        values["subsections"] = subsections
+        return Section.model_validate(values)
+
+
+_SECTION_COLUMNS = (
+    "id",
+    "title",
+    "user_id",
+    "parent_id",
+    "added_at",
+    "has_tasks",
+    "has_subsections",
+)
+
+
+Index("ix_section_user_id", SectionModel.user_id)
+Index("ix_section_path", SectionModel.path)
+Index("ix_section_parent_id_index", SectionModel.parent_id, SectionModel.index)
 
 
 class AttachmentModel(Base):
@@ -164,6 +270,8 @@ class AttachmentModel(Base):
     aes_key_b64: Mapped[str]
     aes_iv_b64: Mapped[str]
     s3_file_key: Mapped[str]
+    size: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    is_pending: Mapped[bool] = mapped_column(default=False, server_default=false())
 
     task = relationship("TaskModel", back_populates="attachments")
 
@@ -179,14 +287,70 @@ class AttachmentModel(Base):
             aes_key_b64=attachment.aes_key_b64,
             aes_iv_b64=attachment.aes_iv_b64,
             s3_file_key=attachment.s3_file_key,
+            size=attachment.size,
+            is_pending=attachment.is_pending,
         )
 
     def to_entity(self) -> Attachment:
-        return Attachment(
-            id=self.id,
-            added_at=self.added_at,
-            task_id=self.task_id,
-            aes_key_b64=self.aes_key_b64,
-            aes_iv_b64=self.aes_iv_b64,
-            s3_file_key=self.s3_file_key,
-        )
+        return Attachment.model_validate(_loaded_values(self, _ATTACHMENT_COLUMNS))
+
+
+_ATTACHMENT_COLUMNS = (
+    "id",
+    "added_at",
+    "task_id",
+    "aes_key_b64",
+    "aes_iv_b64",
+    "s3_file_key",
+    "size",
+    "is_pending",
+)
+
+
+Index("ix_attachment_task_id_index", AttachmentModel.task_id, AttachmentModel.index)
+# (for reconciliation of stored objects with attachments)
+Index("ix_attachment_s3_file_key", AttachmentModel.s3_file_key)
+
+
+class DeletedObjectModel(Base):
+    # Outbox of S3 objects of removed attachments, which are still to be
+    # deleted from the storage, see `SQLAlchemyDeletedObjectRepository`
+    __tablename__ = "deleted_object"
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    s3_file_key: Mapped[str]
+    added_at: Mapped[datetime] = mapped_column(DateTime, default=get_datetime_now)
+
+
+class ChangeModel(Base):
+    # Append-only log of changes of user tasks, sections and attachments, see
+    # `SQLAlchemyChangeLogRepository`
+    __tablename__ = "change"
+    # (SQLite autoincrements only INTEGER primary keys)
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    user_id: Mapped[UUID] = mapped_column(ForeignKey("user.id"))
+    # "task", "section" or "attachment"
+    entity_type: Mapped[str]
+    entity_id: Mapped[UUID] = mapped_column(GUID)
+    is_removed: Mapped[bool]
+    # `data_version` of the user with this change
+    version: Mapped[int] = mapped_column(BigInteger)
+    added_at: Mapped[datetime] = mapped_column(DateTime, default=get_datetime_now)
+
+
+Index("ix_change_user_id_version", ChangeModel.user_id, ChangeModel.version)
+
+
+def _loaded_values(model: Base, columns: tuple[str, ...]) -> dict[str, Any]:
+    # Entities are created for every loaded row, and reading instrumented
+    # attributes one by one turns out to cost more than validating the
+    # entity itself. So loaded values are taken right from the instance state
+    # (unloaded ones are still read via attributes).
+    state = model.__dict__
+    return {
+        column: state[column] if column in state else getattr(model, column)
+        for column in columns
+    }
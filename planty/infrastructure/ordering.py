@@ -0,0 +1,91 @@
+from bisect import bisect_left
+from typing import Optional, Sequence
+
+# Sparse ordering keys of tasks and sections.
+#
+# `index` columns don't store positions 0..N-1 of items, but just sortable keys
+# with gaps between them (`ORDERING_STEP` for freshly numbered items). So
+# inserting or moving an item only takes a key from the gap between its new
+# neighbours, and removing an item doesn't change others at all: reordering
+# touches a single row instead of all the siblings.
+#
+# When there is no gap left, all the siblings are renumbered ("rebalanced").
+# `planty.scripts.rebalance_ordering` does it in advance for crowded sections,
+# so that it rarely happens during requests.
+
+ORDERING_STEP = 2**20
+
+
+def assign_ordering_keys(current_keys: Sequence[Optional[int]]) -> list[int]:
+    # `current_keys` are keys of items in their new order (`None` for new
+    # items). Returns keys to be stored, keeping as many current keys as
+    # possible: only items out of the longest increasing subsequence get new
+    # ones.
+    kept_positions = _longest_increasing_subsequence(current_keys)
+    new_keys: list[int] = []
+    n_items = len(current_keys)
+    position = 0
+    while position < n_items:
+        if position in kept_positions:
+            key = current_keys[position]
+            assert key is not None  # (only existing keys are kept)
+            new_keys.append(key)
+            position += 1
+            continue
+        # assign keys to the whole run of items between kept neighbours
+        run_end = position
+        while run_end < n_items and run_end not in kept_positions:
+            run_end += 1
+        run_length = run_end - position
+        lower = new_keys[-1] if new_keys else None
+        upper = current_keys[run_end] if run_end < n_items else None
+        if lower is None and upper is None:
+            lower, upper = -ORDERING_STEP, run_length * ORDERING_STEP
+        elif lower is None:
+            assert upper is not None  # (for type checking)
+            lower = upper - (run_length + 1) * ORDERING_STEP
+        elif upper is None:
+            upper = lower + (run_length + 1) * ORDERING_STEP
+        step = (upper - lower) // (run_length + 1)
+        if step == 0:
+            return rebalanced_ordering_keys(n_items)
+        new_keys.extend(lower + step * (i + 1) for i in range(run_length))
+        position = run_end
+    return new_keys
+
+
+def rebalanced_ordering_keys(n_items: int) -> list[int]:
+    return [i * ORDERING_STEP for i in range(n_items)]
+
+
+def min_ordering_gap(keys: Sequence[int]) -> Optional[int]:
+    # (keys must be sorted)
+    if len(keys) < 2:
+        return None
+    return min(upper - lower for lower, upper in zip(keys, keys[1:]))
+
+
+def _longest_increasing_subsequence(keys: Sequence[Optional[int]]) -> set[int]:
+    # Positions of items forming the longest strictly increasing subsequence
+    # of keys (`None`s are skipped), O(N log N)
+    tail_keys: list[int] = []  # smallest tail key of subsequences of each length
+    tail_positions: list[int] = []
+    previous_positions: dict[int, Optional[int]] = {}
+    for position, key in enumerate(keys):
+        if key is None:
+            continue
+        length = bisect_left(tail_keys, key)
+        previous_positions[position] = tail_positions[length - 1] if length else None
+        if length == len(tail_keys):
+            tail_keys.append(key)
+            tail_positions.append(position)
+        else:
+            tail_keys[length] = key
+            tail_positions[length] = position
+
+    subsequence: set[int] = set()
+    last_position = tail_positions[-1] if tail_positions else None
+    while last_position is not None:
+        subsequence.add(last_position)
+        last_position = previous_positions[last_position]
+    return subsequence
@@ -1,11 +1,28 @@
-from datetime import date
-from typing import Optional, Sequence
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Optional, Sequence, Union
 from uuid import UUID
 
-from pydantic import NonNegativeInt
-from sqlalchemy import asc, desc, func, select
+from pydantic import NonNegativeInt, PositiveInt
+from sqlalchemy import (
+    ColumnElement,
+    String,
+    asc,
+    delete,
+    desc,
+    event,
+    func,
+    insert,
+    literal,
+    inspect,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import Session, selectinload
 
 from planty.application.exceptions import (
     SectionNotFoundException,
@@ -14,54 +31,61 @@ from planty.application.exceptions import (
 )
 from planty.application.schemas import UserStats
 from planty.domain.task import Attachment, Section, Task
+from planty.domain.types import UserStatsSortKey
+from planty.infrastructure.cache import access_token_cache, sections_tree_cache
 from planty.infrastructure.models import (
     AttachmentModel,
+    ChangeModel,
+    DeletedObjectModel,
     SectionModel,
     TaskModel,
     UserModel,
+    UserStatsModel,
 )
-from planty.utils import get_today
+from planty.infrastructure.ordering import assign_ordering_keys
+from planty.infrastructure.search import get_search_backend, parse_query_terms
+from planty.utils import get_datetime_now, get_today
 
 
 class SQLAlchemyUserRepository:
     def __init__(self, db_session: AsyncSession):
         self._db_session = db_session
 
-    async def get_all_users(self) -> list[UserStats]:
+    async def get_all_users(
+        self,
+        sort_by: UserStatsSortKey,
+        descending: bool,
+        limit: PositiveInt,
+        offset: NonNegativeInt,
+    ) -> list[UserStats]:
+        # Counters are kept in `UserStatsModel` (see
+        # `SQLAlchemyUserStatsRepository`), so a page is read without counting
+        # all user data. Users who have no counters yet (e.g. just registered
+        # ones) are listed with zeros.
+        counters = {
+            name: func.coalesce(getattr(UserStatsModel, name), 0).label(name)
+            for name in _USER_STATS_COUNTERS
+        }
+        sort_column = UserModel.added_at if sort_by == "added_at" else counters[sort_by]
+        order = desc if descending else asc
         result = await self._db_session.execute(
-            select(
-                UserModel,
-                func.count(TaskModel.id).label("tasks_count"),
-                func.count(SectionModel.id).label("sections_count"),
-                func.count(AttachmentModel.id).label("attachments_count"),
-                UserModel.is_superuser.label("is_superuser"),  # type: ignore
-                UserModel.is_verified.label("is_verified"),  # type: ignore
+            select(UserModel, *counters.values())
+            .outerjoin(UserStatsModel, UserStatsModel.user_id == UserModel.id)
+            .order_by(order(sort_column), order(UserModel.id))  # type: ignore
+            .limit(limit)
+            .offset(offset)
+        )
+        return [
+            UserStats(
+                id=user_model.id,
+                email=user_model.email,
+                added_at=user_model.added_at,
+                is_superuser=user_model.is_superuser,
+                is_verified=user_model.is_verified,
+                **dict(zip(counters, values)),
             )
-            .outerjoin(TaskModel, UserModel.id == TaskModel.user_id)  # type: ignore
-            .outerjoin(SectionModel, UserModel.id == SectionModel.user_id)  # type: ignore
-            .outerjoin(AttachmentModel, TaskModel.attachments)
-            .group_by(UserModel)  # type: ignore
-            .order_by(desc(UserModel.added_at))
-        )
-
-        users = []
-        for (
-            user_model,
-            tasks_count,
-            sections_count,
-            attachments_count,
-            is_superuser,
-            is_verified,
-        ) in result:
-            user = user_model.to_entity().model_dump()
-            user["tasks_count"] = tasks_count
-            user["sections_count"] = sections_count
-            user["attachments_count"] = attachments_count
-            user["is_superuser"] = is_superuser
-            user["is_verified"] = is_verified
-            users.append(UserStats.model_validate(user))
-
-        return users
+            for user_model, *values in result.tuples()
+        ]
 
     async def verify_user(self, user_id: UUID) -> None:
         result = await self._db_session.execute(
@@ -72,13 +96,21 @@ class SQLAlchemyUserRepository:
             raise UserNotFoundException(user_id=user_id)
         user_model.is_verified = True
         self._db_session.add(user_model)
+        # (users cached by their access tokens are still unverified, and they
+        # must not be cached again before the change is committed)
+        event.listen(
+            self._db_session.sync_session,
+            "after_commit",
+            lambda session: access_token_cache.invalidate_user(user_id),
+            once=True,
+        )
 
 
 class SQLAlchemyTaskRepository:
     def __init__(self, db_session: AsyncSession):
         self._db_session = db_session
 
-    async def add(self, task: Task, index: NonNegativeInt) -> None:
+    async def add(self, task: Task, index: int) -> None:
         # assuming that task can't have attachments when created
         # (according to `TaskCreateRequest`)
         task_model = TaskModel.from_entity(task, index=index)
@@ -112,10 +144,28 @@ class SQLAlchemyTaskRepository:
             for task_model in task_models
         ]
 
+    async def get_with_ordering_keys(
+        self, task_ids: Sequence[UUID]
+    ) -> list[tuple[Task, int]]:
+        result = await self._db_session.execute(
+            select(TaskModel)
+            .where(TaskModel.id.in_(task_ids))
+            .options(selectinload(TaskModel.attachments))
+        )
+        task_models = result.scalars().all()
+        tasks = await self.get_entities(task_models)
+        return [(task, tm.index) for task, tm in zip(tasks, task_models)]
+
+    async def get_attachments(self, attachment_ids: Sequence[UUID]) -> list[Attachment]:
+        result = await self._db_session.execute(
+            select(AttachmentModel).where(AttachmentModel.id.in_(attachment_ids))
+        )
+        return [attachment.to_entity() for attachment in result.scalars()]
+
     async def update_or_create(
         self,
         task: Task,
-        index: Optional[NonNegativeInt] = None,
+        index: Optional[int] = None,
         must_exist: bool = False,
     ) -> None:
         result = await self._db_session.execute(
@@ -135,41 +185,43 @@ class SQLAlchemyTaskRepository:
         if index is not None:
             task_model.index = index
 
-        for i, attachment in enumerate(task.attachments):
-            await self._persist_attachment(attachment, index=i)
-
-        self._db_session.add(task_model)
+        await self._persist_attachments([task])
 
     async def update_or_create_bulk(
         self,
         section_tasks: list[Task],
     ) -> None:
-        # NOTE: it is assumed that indexes are 0..N-1 for given tasks
+        # NOTE: it is assumed that tasks of every section are given in their
+        # order (and all non-archived tasks of the section are given)
         tasks = section_tasks
-
-        existing_ids = [t.id for t in tasks if t.id is not None]
+        if not tasks:
+            return
 
         existing_tasks_result = await self._db_session.execute(
-            select(TaskModel).where(TaskModel.id.in_(existing_ids))
+            select(TaskModel).where(TaskModel.id.in_([t.id for t in tasks]))
         )
+        existing_tasks_map = {tm.id: tm for tm in existing_tasks_result.scalars()}
+
+        tasks_by_section: defaultdict[UUID, list[Task]] = defaultdict(list)
+        for task in tasks:
+            tasks_by_section[task.section_id].append(task)
+
+        # Models are only filled in here: on flush, the ORM compares them with
+        # the loaded state and writes only actually changed rows. Ordering keys
+        # are sparse, so usually only moved or inserted tasks get new ones.
+        for tasks_of_section in tasks_by_section.values():
+            task_models = [existing_tasks_map.get(task.id) for task in tasks_of_section]
+            keys = assign_ordering_keys(
+                [None if tm is None else tm.index for tm in task_models]
+            )
+            for task, task_model, key in zip(tasks_of_section, task_models, keys):
+                if task_model is None:
+                    await self.add(task, index=key)
+                    continue
+                self._fill_in_model_except_index(task, task_model)
+                task_model.index = key
 
-        existing_task_models = existing_tasks_result.scalars().all()
-        existing_tasks_map = {tm.id: tm for tm in existing_task_models}
-
-        for i, task in enumerate(tasks):
-            if task.id in existing_tasks_map:
-                task_model = existing_tasks_map[task.id]
-            else:
-                await self.add(task, index=i)
-                continue
-
-            self._fill_in_model_except_index(task, task_model)
-            task_model.index = i
-
-            for i, attachment in enumerate(task.attachments):
-                await self._persist_attachment(attachment, index=i)
-
-            self._db_session.add(task_model)
+        await self._persist_attachments(tasks)
 
     def _fill_in_model_except_index(self, task: Task, task_model: TaskModel) -> None:
         task_model.user_id = task.user_id
@@ -190,39 +242,64 @@ class SQLAlchemyTaskRepository:
             task_model.recurrence_type = task.recurrence.type
             task_model.flexible_recurrence_mode = task.recurrence.flexible_mode
 
-    async def search(self, user_id: UUID, query: str) -> list[Task]:
-        # TODO: Reimplement search to improve performance. Possible options:
-        # 1) Use PostgreSQL Full-text search ( => deal with SQLite separately.. )
-        # 2) Use Whoosh (add volume for index persistence)
-        # 3) Explore other options..
-
-        query = f"%{query}%"
-
-        query = (
-            select(TaskModel)
-            .where(
-                (TaskModel.user_id == user_id)
-                & (TaskModel.is_archived.is_(False))
-                & (TaskModel.title.ilike(query) | TaskModel.description.ilike(query))
-            )
+    async def search(
+        self,
+        user_id: UUID,
+        query: str,
+        limit: PositiveInt,
+        offset: NonNegativeInt = 0,
+    ) -> list[Task]:
+        # See `planty.infrastructure.search` for the details
+        terms = parse_query_terms(query)
+        if not terms:
+            return []
+        search_backend = get_search_backend(self._db_session.get_bind().dialect.name)
+        stmt = search_backend.apply(
+            select(TaskModel).where(
+                (TaskModel.user_id == user_id) & (TaskModel.is_archived.is_(False))
+            ),
+            terms,
+        )
+        stmt = (
+            stmt.order_by(desc(TaskModel.added_at), TaskModel.id)
+            .limit(limit)
+            .offset(offset)
             .options(selectinload(TaskModel.attachments))
         )
-        result = await self._db_session.execute(query)
+        result = await self._db_session.execute(stmt)
         task_models = result.scalars().all()
         return await self.get_entities(task_models)
 
-    async def _persist_attachment(
-        self, attachment: Attachment, index: NonNegativeInt
-    ) -> None:
+    async def _persist_attachments(self, tasks: list[Task]) -> None:
+        # (attachments can't be updated, so only new ones are inserted)
+        attachments = [
+            (i, attachment)
+            for task in tasks
+            for i, attachment in enumerate(task.attachments)
+        ]
+        if not attachments:
+            return
         result = await self._db_session.execute(
-            select(AttachmentModel).where(AttachmentModel.id == attachment.id)
+            select(AttachmentModel.id).where(
+                AttachmentModel.id.in_([a.id for _, a in attachments])
+            )
         )
-        attachment_model: Optional[AttachmentModel] = result.scalar_one_or_none()
-        if attachment_model is not None:
-            # attachment exists -> ok (attachments can't be updated)
-            return
-        attachment_model = AttachmentModel.from_entity(attachment, index=index)
-        self._db_session.add(attachment_model)
+        existing_ids = set(result.scalars())
+        for i, attachment in attachments:
+            if attachment.id not in existing_ids:
+                self._db_session.add(AttachmentModel.from_entity(attachment, index=i))
+
+    async def add_attachments(self, tasks: list[Task]) -> None:
+        # (new attachments of the tasks are inserted, tasks aren't updated)
+        await self._persist_attachments(tasks)
+
+    async def get_existing_s3_file_keys(self, s3_file_keys: Sequence[str]) -> set[str]:
+        result = await self._db_session.execute(
+            select(AttachmentModel.s3_file_key).where(
+                AttachmentModel.s3_file_key.in_(s3_file_keys)
+            )
+        )
+        return set(result.scalars())
 
     async def delete_attachment(self, attachment: Attachment) -> None:
         result = await self._db_session.execute(
@@ -231,6 +308,26 @@ class SQLAlchemyTaskRepository:
         attachment_model: Optional[AttachmentModel] = result.scalar_one_or_none()
         await self._db_session.delete(attachment_model)
 
+    async def mark_attachment_uploaded(self, attachment: Attachment) -> None:
+        result = await self._db_session.execute(
+            select(AttachmentModel).where(AttachmentModel.id == attachment.id)
+        )
+        result.scalar_one().is_pending = False
+
+    async def delete_pending_attachments(self, added_before: datetime) -> int:
+        # -> number of removed attachments (they are removed one by one, so
+        # that their removal is tracked like any other)
+        result = await self._db_session.execute(
+            select(AttachmentModel).where(
+                AttachmentModel.is_pending.is_(True),
+                AttachmentModel.added_at < added_before,
+            )
+        )
+        attachment_models = result.scalars().all()
+        for attachment_model in attachment_models:
+            await self._db_session.delete(attachment_model)
+        return len(attachment_models)
+
     async def get_tasks_by_due_to(
         self, not_before: date, not_after: date, user_id: UUID
     ) -> list[Task]:
@@ -247,6 +344,24 @@ class SQLAlchemyTaskRepository:
         task_models = result.scalars().all()
         return await self.get_entities(task_models)
 
+    async def count_tasks_by_due_to(
+        self, not_before: date, not_after: date, user_id: UUID
+    ) -> dict[date, int]:
+        result = await self._db_session.execute(
+            select(TaskModel.due_to, func.count())
+            .where(
+                (TaskModel.user_id == user_id)
+                & (TaskModel.due_to >= not_before)
+                & (TaskModel.due_to <= not_after)
+                & (TaskModel.is_archived.is_(False))
+            )
+            .group_by(TaskModel.due_to)
+        )
+        # (`due_to` is never NULL here, the check is for mypy)
+        return {
+            due_to: count for due_to, count in result.tuples() if due_to is not None
+        }
+
     async def get_overdue_tasks(self, user_id: UUID) -> list[Task]:
         result = await self._db_session.execute(
             select(TaskModel)
@@ -261,12 +376,25 @@ class SQLAlchemyTaskRepository:
         task_models = result.scalars().all()
         return await self.get_entities(task_models)
 
-    async def get_archived_tasks(self, user_id: UUID) -> list[Task]:
+    async def get_archived_tasks(
+        self,
+        user_id: UUID,
+        limit: Optional[PositiveInt] = None,
+        after: Optional[tuple[datetime, UUID]] = None,
+    ) -> list[Task]:
+        # Keyset pagination: tasks go from the most recently added ones and
+        # `after` is the (added_at, id) of the last task of the previous page,
+        # so every page is just a range of the (user_id, added_at, id) index.
+        query = select(TaskModel).where(
+            (TaskModel.user_id == user_id) & (TaskModel.is_archived.is_(True))
+        )
+        if after is not None:
+            query = query.where(tuple_(TaskModel.added_at, TaskModel.id) < after)
+        query = query.order_by(desc(TaskModel.added_at), desc(TaskModel.id))
+        if limit is not None:
+            query = query.limit(limit)
         result = await self._db_session.execute(
-            select(TaskModel)
-            .where((TaskModel.user_id == user_id) & (TaskModel.is_archived.is_(True)))
-            .order_by(desc(TaskModel.added_at))
-            .options(selectinload(TaskModel.attachments))
+            query.options(selectinload(TaskModel.attachments))
         )
         task_models = result.scalars().all()
         return await self.get_entities(task_models)
@@ -285,27 +413,43 @@ class SQLAlchemySectionRepository:
     def __init__(self, db_session: AsyncSession, task_repo: "ITaskRepository"):
         self._db_session = db_session
         self._task_repo = task_repo
-
-    async def add(self, section: Section, index: NonNegativeInt) -> None:
-        section_model = SectionModel.from_entity(section, index=index)
+        # (sections changed in this session mustn't get into the cache until
+        # the changes are committed)
+        self._sections_version_bumped = False
+
+    async def add(self, section: Section, index: int) -> None:
+        parent_path = (
+            await self._get_path(section.parent_id)
+            if section.parent_id is not None
+            else None
+        )
+        section_model = SectionModel.from_entity(
+            section, index=index, path=_make_section_path(parent_path, section.id)
+        )
         self._db_session.add(section_model)
+        await self._bump_sections_version(section.user_id)
 
     async def get(
         self,
         section_id: UUID,
         with_direct_subsections: bool = False,
     ) -> Section:
+        # Archived tasks (and their attachments) aren't loaded at all: sections
+        # with piles of them would pay for them on every change otherwise
         result = await self._db_session.execute(
             select(SectionModel)
             .where(SectionModel.id == section_id)
             .options(
-                selectinload(SectionModel.tasks).selectinload(TaskModel.attachments)
+                selectinload(
+                    SectionModel.tasks.and_(TaskModel.is_archived.is_(False))
+                ).selectinload(TaskModel.attachments)
             )
         )
         section_model: Optional[SectionModel] = result.scalar_one_or_none()
         if section_model is None:
             raise SectionNotFoundException(section_id=section_id)
-        # filter out archived tasks from section tasks
+        # (tasks may be archived after the section was loaded in this session,
+        # and loaded collections aren't loaded again)
         task_models = [tm for tm in section_model.tasks if not tm.is_archived]
         tasks = await self._task_repo.get_entities(task_models)
         subsections = []
@@ -325,21 +469,107 @@ class SQLAlchemySectionRepository:
             subsections = direct_subsections
         return section_model.to_entity(tasks=tasks, subsections=subsections)
 
+    async def get_without_tasks_with_ordering_keys(
+        self, section_ids: Sequence[UUID]
+    ) -> list[tuple[Section, int]]:
+        result = await self._db_session.execute(
+            select(SectionModel).where(SectionModel.id.in_(section_ids))
+        )
+        return [
+            (sm.to_entity(tasks=[], subsections=[]), sm.index)
+            for sm in result.scalars()
+        ]
+
     async def get_all_without_tasks(
         self, user_id: UUID, leaves_only: bool, as_tree: bool
     ) -> list[Section]:
+        # NOTE: returned sections are shared via cache, don't change them
+        sections = await self._get_sections_tree(user_id)
+        if leaves_only:
+            return [section for section in sections if not section.has_subsections]
+        elif as_tree:
+            return [section for section in sections if section.parent_id is None]
+        else:
+            return list(sections)
+
+    async def _get_sections_tree(self, user_id: UUID) -> list[Section]:
+        # All user sections (as a flat list, but with linked subsections),
+        # which are cached until the user's `sections_version` is bumped
+        sections_version = await self._db_session.scalar(
+            select(UserModel.sections_version).where(UserModel.id == user_id)  # type: ignore
+        )
+        # (`None` if the cache can't be used)
+        cache_version = None if self._sections_version_bumped else sections_version
+        if cache_version is not None:
+            cached_sections = sections_tree_cache.get(user_id, cache_version)
+            if cached_sections is not None:
+                return cached_sections
+
         result = await self._db_session.execute(
             select(SectionModel).where(SectionModel.user_id == user_id)
         )
-        section_models = list(result.scalars().all())
-        if leaves_only:
-            return [
-                model.to_entity(tasks=[], subsections=[])
-                for model in section_models
-                if not model.has_subsections
-            ]
-        else:
-            return self.construct_sections_tree(section_models, return_flat=not as_tree)
+        sections = self.construct_sections_tree(
+            list(result.scalars().all()), return_flat=True
+        )
+        if cache_version is not None:
+            sections_tree_cache.set(user_id, cache_version, sections)
+        return sections
+
+    async def _update_subtree_paths(self, section_model: SectionModel) -> None:
+        # Replace the old path prefix of the moved section and all its
+        # descendants with a single statement
+        assert section_model.parent_id is not None  # (root can't be moved)
+        old_path = section_model.path
+        new_path = _make_section_path(
+            await self._get_path(section_model.parent_id), section_model.id
+        )
+        await self._db_session.execute(
+            update(SectionModel)
+            .where(_subtree_condition(old_path))
+            .values(
+                path=literal(new_path, String)
+                + func.substr(SectionModel.path, len(old_path) + 1, type_=String)
+            ),
+            execution_options={"synchronize_session": "fetch"},
+        )
+
+    async def _bump_sections_version(self, user_id: UUID) -> None:
+        await self._db_session.execute(
+            update(UserModel)
+            .where(UserModel.id == user_id)  # type: ignore
+            .values(sections_version=UserModel.sections_version + 1)
+        )
+        self._sections_version_bumped = True
+
+    async def get_subtree_without_tasks(self, section_id: UUID) -> Section:
+        # The section with (recursively) loaded subsections
+        path = await self._get_path(section_id)
+        result = await self._db_session.execute(
+            select(SectionModel).where(_subtree_condition(path))
+        )
+        (section,) = self.construct_sections_tree(list(result.scalars().all()))
+        return section
+
+    async def is_in_subtree(self, section_id: UUID, subtree_root_id: UUID) -> bool:
+        # (the section is in its own subtree)
+        path = await self._get_path(section_id)
+        return f"/{subtree_root_id.hex}/" in path
+
+    async def get_owner_id(self, section_id: UUID) -> UUID:
+        result = await self._db_session.execute(
+            select(SectionModel.user_id).where(SectionModel.id == section_id)
+        )
+        user_id: Optional[UUID] = result.scalar_one_or_none()
+        if user_id is None:
+            raise SectionNotFoundException(section_id=section_id)
+        return user_id
+
+    async def _get_path(self, section_id: UUID) -> str:
+        # (usually the section is already loaded in the session)
+        section_model = await self._db_session.get(SectionModel, section_id)
+        if section_model is None:
+            raise SectionNotFoundException(section_id=section_id)
+        return section_model.path
 
     @staticmethod
     def construct_sections_tree(
@@ -356,7 +586,8 @@ class SQLAlchemySectionRepository:
         top_level_sections = []
         all_sections = []
         for section in id_to_section.values():
-            if (parent_id := section.parent_id) is None:
+            if (parent_id := section.parent_id) not in id_to_section:
+                # root section (or the root of the loaded subtree)
                 top_level_sections.append(section)
             else:
                 parent_section = id_to_section[parent_id]
@@ -373,37 +604,393 @@ class SQLAlchemySectionRepository:
         )
         return len(result.all())
 
-    async def update(
-        self, section: Section, index: Optional[NonNegativeInt] = None
-    ) -> None:
+    async def get_ordering_key_after_last(self, section_id: UUID) -> int:
+        # Ordering key for a new subsection at the end of the section (see
+        # `planty.infrastructure.ordering`)
+        last_key = await self._db_session.scalar(
+            select(func.max(SectionModel.index)).where(
+                SectionModel.parent_id == section_id
+            )
+        )
+        return assign_ordering_keys([last_key, None])[-1]
+
+    async def update(self, section: Section, index: Optional[int] = None) -> None:
+        # Persist the section with its loaded tasks and (recursively) loaded
+        # subsections. The number of statements doesn't depend on the number
+        # of tasks and subsections.
+        sections_to_update = [section]
+        i = 0
+        while i < len(sections_to_update):
+            sections_to_update.extend(sections_to_update[i].subsections)
+            i += 1
+
         result = await self._db_session.execute(
-            select(SectionModel)
-            .where(SectionModel.id == section.id)
-            .options(selectinload(SectionModel.tasks))
+            select(SectionModel).where(
+                SectionModel.id.in_([s.id for s in sections_to_update])
+            )
         )
-        section_model: Optional[SectionModel] = result.scalar_one_or_none()
-        if section_model is None:
-            raise SectionNotFoundException(section_id=section.id)
+        section_models = {sm.id: sm for sm in result.scalars()}
+
+        moved_section_models = []
+        for section_to_update in sections_to_update:
+            section_model = section_models.get(section_to_update.id)
+            if section_model is None:
+                raise SectionNotFoundException(section_id=section_to_update.id)
+
+            section_model.title = section_to_update.title
+            if section_model.parent_id != section_to_update.parent_id:
+                moved_section_models.append(section_model)
+            section_model.parent_id = section_to_update.parent_id
 
-        section_model.title = section.title
-        section_model.parent_id = section.parent_id
+            section_model.has_tasks = section_to_update.has_tasks
+            section_model.has_subsections = section_to_update.has_subsections
 
-        section_model.has_tasks = section.has_tasks
-        section_model.has_subsections = section.has_subsections
+        for section_model in moved_section_models:
+            await self._update_subtree_paths(section_model)
 
         # update index if it's meant to be updated
         if index is not None:
-            section_model.index = index
+            section_models[section.id].index = index
+
+        # order loaded subsections (see `planty.infrastructure.ordering`)
+        for parent_section in sections_to_update:
+            subsection_models = [
+                section_models[subsection.id]
+                for subsection in parent_section.subsections
+            ]
+            keys = assign_ordering_keys([sm.index for sm in subsection_models])
+            for subsection_model, key in zip(subsection_models, keys):
+                subsection_model.index = key
+
+        if any(self._db_session.is_modified(sm) for sm in section_models.values()):
+            await self._bump_sections_version(section.user_id)
 
         # Tasks can be loaded or not, it doesn't matter
         # Warning: does not update any excluded tasks from section.tasks
+        await self._task_repo.update_or_create_bulk(
+            [task for s in sections_to_update for task in s.tasks]
+        )
 
-        await self._task_repo.update_or_create_bulk(section.tasks)
 
-        for i, subsection in enumerate(section.subsections):
-            await self.update(subsection, index=i)
+class SQLAlchemyChangeLogRepository:
+    # Append-only log of changes of user tasks, sections and attachments, which
+    # lets clients fetch only what has changed since their last sync.
+    #
+    # Changes are recorded right before every flush of the session, so
+    # everything changed by services through repositories gets into the log
+    # within the same transaction, including rows changed as a side effect
+    # (e.g. tasks with reassigned ordering keys).
+    #
+    # Changes are ordered by versions, not by ids: ids are assigned on insert
+    # but become visible on commit, so concurrent transactions could make a
+    # change with a lower id visible after a client has synced past a higher
+    # one. Every flush with changes of a user increments `user.data_version`
+    # (and all its changes get the new version), and the row lock taken by
+    # that update is held until the end of the transaction. So transactions
+    # changing data of the same user are serialized from their first flush
+    # with changes, and versions of a user become visible in their order.
+    # Versions of a user are also contiguous, so a gap means that changes have
+    # been pruned (see `prune`).
 
-        self._db_session.add(section_model)
+    def __init__(self, db_session: AsyncSession):
+        self._db_session = db_session
+        event.listen(db_session.sync_session, "before_flush", self._record_changes)
+
+    async def get_changes(
+        self,
+        user_id: UUID,
+        since: int,
+        limit: Optional[PositiveInt] = None,
+        until: Optional[int] = None,
+    ) -> list[tuple[int, str, UUID, bool]]:
+        # (version, entity type, entity id, is removed) in order of changes
+        query = select(
+            ChangeModel.version,
+            ChangeModel.entity_type,
+            ChangeModel.entity_id,
+            ChangeModel.is_removed,
+        ).where((ChangeModel.user_id == user_id) & (ChangeModel.version > since))
+        if until is not None:
+            query = query.where(ChangeModel.version <= until)
+        query = query.order_by(ChangeModel.version, ChangeModel.id)
+        if limit is not None:
+            query = query.limit(limit)
+        result = await self._db_session.execute(query)
+        return list(result.tuples())
+
+    async def get_data_version(self, user_id: UUID) -> int:
+        data_version = await self._db_session.scalar(
+            select(UserModel.data_version).where(UserModel.id == user_id)  # type: ignore
+        )
+        return data_version or 0
+
+    async def prune(self, added_before: datetime, batch_size: PositiveInt) -> int:
+        # Removes a batch of the oldest changes, if they were added before the
+        # given time -> the number of removed changes. Changes of a version
+        # are removed together.
+        result = await self._db_session.execute(
+            select(ChangeModel.user_id, ChangeModel.version, ChangeModel.added_at)
+            .order_by(ChangeModel.id)
+            .limit(batch_size)
+        )
+        last_versions: dict[UUID, int] = {}
+        for user_id, version, added_at in result:
+            if added_at >= added_before:
+                break
+            last_versions[user_id] = max(version, last_versions.get(user_id, 0))
+        n_removed = 0
+        for user_id, version in last_versions.items():
+            deleted = await self._db_session.execute(
+                delete(ChangeModel).where(
+                    (ChangeModel.user_id == user_id) & (ChangeModel.version <= version)
+                )
+            )
+            n_removed += deleted.rowcount  # type: ignore[attr-defined]
+        return n_removed
+
+    def _record_changes(self, session: Session, *args: Any) -> None:
+        changes = [
+            (model, False)
+            for model in session.new
+            if isinstance(model, _CHANGE_LOGGED_MODELS)
+        ]
+        changes.extend(
+            (model, False)
+            for model in session.dirty
+            if isinstance(model, _CHANGE_LOGGED_MODELS)
+            and session.is_modified(model, include_collections=False)
+        )
+        changes.extend(
+            (model, True)
+            for model in session.deleted
+            if isinstance(model, _CHANGE_LOGGED_MODELS)
+        )
+        if not changes:
+            return
+        # (executed on the connection as is, bypassing the ORM, so that all
+        # rows are inserted by one statement)
+        connection = session.connection()
+        user_ids = [_get_user_id(session, model) for model, _ in changes]
+        versions = {
+            user_id: connection.execute(
+                update(UserModel)
+                .where(UserModel.id == user_id)  # type: ignore
+                .values(data_version=UserModel.data_version + 1)
+                .returning(UserModel.data_version)
+            ).scalar_one()
+            # (in the same order everywhere, so that transactions changing data
+            # of several users don't deadlock)
+            for user_id in sorted(set(user_ids))
+        }
+        connection.execute(
+            insert(ChangeModel),
+            [
+                {
+                    "user_id": user_id,
+                    "entity_type": model.__tablename__,
+                    "entity_id": model.id,
+                    "is_removed": is_removed,
+                    "version": versions[user_id],
+                }
+                for (model, is_removed), user_id in zip(changes, user_ids)
+            ],
+        )
+
+
+_CHANGE_LOGGED_MODELS = (TaskModel, SectionModel, AttachmentModel)
+
+
+class SQLAlchemyDeletedObjectRepository:
+    # Outbox of S3 objects to delete. Objects of attachments removed in the
+    # session (including attachments of removed tasks) are queued right before
+    # every flush, so they are queued if and only if the removal is committed.
+    # The storage itself is cleaned up later, in background (see
+    # `AttachmentsGarbageCollector`).
+
+    def __init__(self, db_session: AsyncSession):
+        self._db_session = db_session
+        event.listen(db_session.sync_session, "before_flush", self._queue_objects)
+
+    async def get_batch(self, limit: PositiveInt) -> list[tuple[int, str]]:
+        # (id, S3 file key) of the oldest queued objects. Rows are locked till
+        # the end of the transaction and skipped by concurrent transactions
+        # (on PostgreSQL), so every process deletes its own batches.
+        result = await self._db_session.execute(
+            select(DeletedObjectModel.id, DeletedObjectModel.s3_file_key)
+            .order_by(DeletedObjectModel.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(result.tuples())
+
+    async def remove(self, ids: Sequence[int]) -> None:
+        await self._db_session.execute(
+            delete(DeletedObjectModel).where(DeletedObjectModel.id.in_(ids))
+        )
+
+    async def count(self) -> int:
+        return (
+            await self._db_session.scalar(
+                select(func.count()).select_from(DeletedObjectModel)
+            )
+            or 0
+        )
+
+    def _queue_objects(self, session: Session, *args: Any) -> None:
+        s3_file_keys = [
+            model.s3_file_key
+            for model in session.deleted
+            if isinstance(model, AttachmentModel)
+        ]
+        if not s3_file_keys:
+            return
+        # (inserted by one statement, like changes in the change log)
+        session.connection().execute(
+            insert(DeletedObjectModel),
+            [
+                {"s3_file_key": s3_file_key, "added_at": get_datetime_now()}
+                for s3_file_key in s3_file_keys
+            ],
+        )
+
+
+class SQLAlchemyUserStatsRepository:
+    # Counters of user data, which are updated incrementally right before
+    # every flush of the session (like the change log), so they are always
+    # consistent with the data committed along with them. They can be rebuilt
+    # from scratch by `planty.scripts.rebuild_user_stats` if they ever drift.
+
+    def __init__(self, db_session: AsyncSession):
+        self._db_session = db_session
+        event.listen(db_session.sync_session, "before_flush", self._update_counters)
+
+    async def rebuild(self) -> int:
+        # -> number of users. Counters are counted separately for every user,
+        # without joining all user data together.
+        def count(model: Any, *where: ColumnElement[bool]) -> Any:
+            return (
+                select(func.count()).select_from(model).where(*where).scalar_subquery()
+            )
+
+        attachments_of_user = (
+            AttachmentModel.task_id == TaskModel.id,
+            TaskModel.user_id == UserModel.id,
+        )
+        await self._db_session.execute(delete(UserStatsModel))
+        result = await self._db_session.execute(
+            insert(UserStatsModel).from_select(
+                [
+                    "user_id",
+                    "tasks_count",
+                    "archived_tasks_count",
+                    "sections_count",
+                    "attachments_count",
+                    "storage_bytes",
+                ],
+                select(
+                    UserModel.id,  # type: ignore
+                    count(TaskModel, TaskModel.user_id == UserModel.id),
+                    count(
+                        TaskModel,
+                        TaskModel.user_id == UserModel.id,
+                        TaskModel.is_archived.is_(True),
+                    ),
+                    count(SectionModel, SectionModel.user_id == UserModel.id),
+                    count(AttachmentModel, *attachments_of_user),
+                    select(func.coalesce(func.sum(AttachmentModel.size), 0))
+                    .select_from(AttachmentModel)
+                    .where(*attachments_of_user)
+                    .scalar_subquery(),
+                ),
+            )
+        )
+        n_users: int = result.rowcount  # type: ignore[attr-defined]
+        return n_users
+
+    def _update_counters(self, session: Session, *args: Any) -> None:
+        deltas: dict[UUID, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for models, sign in ((session.new, 1), (session.deleted, -1)):
+            for model in models:
+                if isinstance(model, TaskModel):
+                    user_deltas = deltas[model.user_id]
+                    user_deltas["tasks_count"] += sign
+                    if model.is_archived:
+                        user_deltas["archived_tasks_count"] += sign
+                elif isinstance(model, SectionModel):
+                    deltas[model.user_id]["sections_count"] += sign
+                elif isinstance(model, AttachmentModel):
+                    user_deltas = deltas[_get_user_id(session, model)]
+                    user_deltas["attachments_count"] += sign
+                    user_deltas["storage_bytes"] += sign * (model.size or 0)
+        for model in session.dirty:
+            if not isinstance(model, TaskModel):
+                continue
+            # (tasks are archived and unarchived in place)
+            history = inspect(model).attrs.is_archived.history
+            if history.added and history.deleted:
+                is_archived, was_archived = history.added[0], history.deleted[0]
+                if is_archived != was_archived:
+                    deltas[model.user_id]["archived_tasks_count"] += (
+                        1 if is_archived else -1
+                    )
+
+        insert_ = (
+            postgresql_insert
+            if session.get_bind().dialect.name == "postgresql"
+            else sqlite_insert
+        )
+        for user_id, user_deltas in deltas.items():
+            user_deltas = {name: delta for name, delta in user_deltas.items() if delta}
+            if not user_deltas:
+                continue
+            # (users without counters yet get them created)
+            stmt = insert_(UserStatsModel).values(user_id=user_id, **user_deltas)
+            session.connection().execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[UserStatsModel.user_id],
+                    set_={
+                        name: getattr(UserStatsModel, name) + stmt.excluded[name]
+                        for name in user_deltas
+                    },
+                )
+            )
+
+
+_USER_STATS_COUNTERS = (
+    "tasks_count",
+    "archived_tasks_count",
+    "sections_count",
+    "attachments_count",
+    "storage_bytes",
+)
+
+
+def _get_user_id(
+    session: Session, model: Union[TaskModel, SectionModel, AttachmentModel]
+) -> UUID:
+    if not isinstance(model, AttachmentModel):
+        return model.user_id
+    # (the task is almost always loaded in the session already)
+    task_model: Optional[TaskModel] = session.identity_map.get(
+        session.identity_key(TaskModel, model.task_id)
+    )
+    if task_model is not None:
+        return task_model.user_id
+    with session.no_autoflush:
+        return session.execute(
+            select(TaskModel.user_id).where(TaskModel.id == model.task_id)
+        ).scalar_one()
+
+
+def _make_section_path(parent_path: Optional[str], section_id: UUID) -> str:
+    return f"{parent_path or '/'}{section_id.hex}/"
+
+
+def _subtree_condition(path: str) -> ColumnElement[bool]:
+    # Paths of the section and all its descendants start with its path, e.g.
+    # "/a/b/", so they are in ["/a/b/", "/a/b0") range ("0" goes right after
+    # "/"), which can be found by an index
+    return (SectionModel.path >= path) & (SectionModel.path < path[:-1] + "0")
 
 
 # NOTE: Replace with real interfaces if it becomes clear that other
@@ -412,3 +999,6 @@ class SQLAlchemySectionRepository:
 IUserRepository = SQLAlchemyUserRepository
 ITaskRepository = SQLAlchemyTaskRepository
 ISectionRepository = SQLAlchemySectionRepository
+IChangeLogRepository = SQLAlchemyChangeLogRepository
+IDeletedObjectRepository = SQLAlchemyDeletedObjectRepository
+IUserStatsRepository = SQLAlchemyUserStatsRepository
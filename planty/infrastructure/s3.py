@@ -0,0 +1,40 @@
+import contextlib
+from typing import AsyncIterator, Optional
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from fastapi import Request
+from types_aiobotocore_s3 import S3Client
+
+from planty.config import settings
+
+# (loaded service models are cached by the session, so clients created later,
+# e.g. for every test, are cheaper)
+_session = get_session()
+
+
+@contextlib.asynccontextmanager
+async def create_s3_client(
+    endpoint_url: Optional[str] = None,
+) -> AsyncIterator[S3Client]:
+    # Creating a client resolves credentials, loads the service model and sets
+    # up the endpoint, which costs more than most requests themselves. So one
+    # client is created for the whole lifetime of the app (see `lifespan`),
+    # and its pool keeps connections to S3 alive between requests.
+    config = AioConfig(
+        max_pool_connections=settings.s3_max_pool_connections,
+        connector_args={"keepalive_timeout": settings.s3_keepalive_timeout},
+    )
+    async with _session.create_client(
+        "s3",
+        endpoint_url=endpoint_url or settings.aws_url,
+        aws_secret_access_key=settings.aws_secret_access_key,
+        aws_access_key_id=settings.aws_access_key_id,
+        config=config,
+    ) as client:
+        yield client
+
+
+def get_s3_client(request: Request) -> S3Client:
+    s3_client: S3Client = request.app.state.s3_client
+    return s3_client
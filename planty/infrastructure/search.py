@@ -0,0 +1,138 @@
+import re
+from typing import Any, Protocol
+
+from sqlalchemy import (
+    DDL,
+    ColumnClause,
+    FromClause,
+    Select,
+    event,
+    func,
+    literal_column,
+    table,
+)
+
+# Full-text search over tasks' titles and descriptions.
+#
+# PostgreSQL: a generated `tsvector` column on `task` with a GIN index.
+# SQLite: an external-content FTS5 table `task_fts` which is kept in sync with
+# `task` by triggers. It's keyed by `task.search_rowid`, an integer column
+# which isn't in the model (like `search_vector`) and is assigned by the
+# insert trigger: implicit rowids can't be used, because VACUUM may renumber
+# them in tables without an INTEGER PRIMARY KEY.
+#
+# Both backends use prefix matching of every word in the query, so the
+# search works "as you type".
+
+MAX_QUERY_TERMS = 16
+
+POSTGRESQL_DDL = [
+    "ALTER TABLE task ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', "
+    "coalesce(title, '') || ' ' || coalesce(description, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_task_search_vector "
+    "ON task USING GIN (search_vector)",
+]
+
+POSTGRESQL_DROP_DDL = [
+    "DROP INDEX IF EXISTS ix_task_search_vector",
+    "ALTER TABLE task DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_DDL = [
+    "ALTER TABLE task ADD COLUMN search_rowid INTEGER",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_task_search_rowid ON task (search_rowid)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5("
+    "title, description, content='task', content_rowid='search_rowid', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_after_insert AFTER INSERT ON task BEGIN "
+    "UPDATE task SET search_rowid = "
+    "(SELECT coalesce(max(search_rowid), 0) + 1 FROM task) "
+    "WHERE rowid = new.rowid; "
+    "INSERT INTO task_fts(rowid, title, description) "
+    "SELECT search_rowid, title, coalesce(description, '') FROM task "
+    "WHERE rowid = new.rowid; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_after_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) "
+    "VALUES ('delete', old.search_rowid, old.title, coalesce(old.description, '')); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_after_update "
+    "AFTER UPDATE OF title, description ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) "
+    "VALUES ('delete', old.search_rowid, old.title, coalesce(old.description, '')); "
+    "INSERT INTO task_fts(rowid, title, description) "
+    "VALUES (new.search_rowid, new.title, coalesce(new.description, '')); "
+    "END",
+]
+
+SQLITE_DROP_DDL = [
+    "DROP TRIGGER IF EXISTS task_fts_after_update",
+    "DROP TRIGGER IF EXISTS task_fts_after_delete",
+    "DROP TRIGGER IF EXISTS task_fts_after_insert",
+    "DROP TABLE IF EXISTS task_fts",
+]
+
+
+def register_search_ddl(task_table: FromClause) -> None:
+    # Make `metadata.create_all` / `drop_all` manage search structures too
+    for statement in POSTGRESQL_DDL:
+        ddl = DDL(statement).execute_if(dialect="postgresql")  # type: ignore[no-untyped-call]
+        event.listen(task_table, "after_create", ddl)
+    for statement in SQLITE_DDL:
+        ddl = DDL(statement).execute_if(dialect="sqlite")  # type: ignore[no-untyped-call]
+        event.listen(task_table, "after_create", ddl)
+    # (the column and the index are dropped with the table in PostgreSQL)
+    for statement in SQLITE_DROP_DDL:
+        ddl = DDL(statement).execute_if(dialect="sqlite")  # type: ignore[no-untyped-call]
+        event.listen(task_table, "before_drop", ddl)
+
+
+def parse_query_terms(query: str) -> list[str]:
+    # Only letters and digits are kept, so the terms are safe to be embedded
+    # into both FTS5 and tsquery syntax
+    return re.findall(r"[^\W_]+", query.lower())[:MAX_QUERY_TERMS]
+
+
+class TaskSearchBackend(Protocol):
+    # Filters `select(TaskModel)` statement by terms and orders it by rank
+    def apply(self, stmt: Select[Any], terms: list[str]) -> Select[Any]: ...
+
+
+class PostgreSQLTaskSearchBackend:
+    def apply(self, stmt: Select[Any], terms: list[str]) -> Select[Any]:
+        ts_query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        search_vector: ColumnClause[Any] = literal_column("task.search_vector")
+        return stmt.where(search_vector.op("@@")(ts_query)).order_by(
+            func.ts_rank(search_vector, ts_query).desc()
+        )
+
+
+class SQLiteTaskSearchBackend:
+    _fts_table = table("task_fts")
+
+    def apply(self, stmt: Select[Any], terms: list[str]) -> Select[Any]:
+        match_query = " ".join(f'"{term}"*' for term in terms)
+        fts: ColumnClause[Any] = literal_column("task_fts")
+        return (
+            stmt.join(
+                self._fts_table,
+                literal_column("task_fts.rowid") == literal_column("task.search_rowid"),
+            )
+            .where(fts.op("MATCH")(match_query))
+            # bm25() returns "more negative is better" values
+            .order_by(func.bm25(fts))
+        )
+
+
+_BACKENDS: dict[str, TaskSearchBackend] = {
+    "postgresql": PostgreSQLTaskSearchBackend(),
+    "sqlite": SQLiteTaskSearchBackend(),
+}
+
+
+def get_search_backend(dialect_name: str) -> TaskSearchBackend:
+    try:
+        return _BACKENDS[dialect_name]
+    except KeyError:
+        raise NotImplementedError(f"Search is not supported for {dialect_name}")
@@ -0,0 +1,69 @@
+import pytest
+
+from planty.infrastructure.cache import AccessTokenCache, VersionedLRUCache
+from planty.utils import generate_uuid
+
+
+def test_versioned_lru_cache() -> None:
+    cache: VersionedLRUCache[str, str] = VersionedLRUCache(max_size=2)
+    assert cache.get("a", version=1) is None
+    cache.set("a", 1, "a1")
+    assert cache.get("a", version=1) == "a1"
+    # outdated value isn't returned
+    assert cache.get("a", version=2) is None
+    cache.set("a", 2, "a2")
+    assert cache.get("a", version=2) == "a2"
+    # a value of an older version doesn't overwrite a newer one
+    cache.set("a", 1, "a1")
+    assert cache.get("a", version=2) == "a2"
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_versioned_lru_cache_evicts_least_recently_used() -> None:
+    cache: VersionedLRUCache[str, str] = VersionedLRUCache(max_size=2)
+    cache.set("a", 0, "a")
+    cache.set("b", 0, "b")
+    cache.get("a", version=0)
+    cache.set("c", 0, "c")
+    assert cache.get("b", version=0) is None
+    assert cache.get("a", version=0) == "a"
+    assert cache.get("c", version=0) == "c"
+    assert len(cache) == 2
+    assert cache.evictions == 1
+
+
+def test_access_token_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 0.0
+    monkeypatch.setattr("planty.infrastructure.cache.time.monotonic", lambda: now)
+    user_id, another_user_id = generate_uuid(), generate_uuid()
+    cache: AccessTokenCache[str] = AccessTokenCache(max_size=2, ttl=10)
+    assert cache.get("a") is None
+    cache.set("a", user_id, "user")
+    cache.set("b", another_user_id, "another user")
+    assert cache.get("a") == "user"
+    # least recently used token is evicted
+    cache.set("c", user_id, "user")
+    assert cache.get("b") is None
+    assert cache.evictions == 1
+
+    # all tokens of a user are invalidated at once
+    cache.invalidate_user(user_id)
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+    # values are expired after `ttl` seconds
+    cache.set("a", user_id, "user")
+    now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 5)
+    assert cache.hit_ratio == 1 / 6
+
+    # values of expiring tokens are kept no longer than the tokens live
+    cache.set("a", user_id, "user", ttl=5)
+    cache.set("b", user_id, "user", ttl=20)
+    now = 15
+    assert cache.get("a") is None
+    assert cache.get("b") == "user"
+    now = 20
+    assert cache.get("b") is None
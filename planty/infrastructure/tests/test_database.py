@@ -0,0 +1,57 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from planty.infrastructure.database import (
+    SQLiteWriteLane,
+    get_sqlite_pragmas,
+    set_sqlite_pragmas,
+)
+
+metadata = MetaData()
+counter_table = Table("counter", metadata, Column("value", Integer))
+
+
+@pytest.fixture
+async def engine(tmp_path: Path) -> AsyncIterator[AsyncEngine]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    # (writers fail right away if they can't get the database lock)
+    set_sqlite_pragmas(engine, {**get_sqlite_pragmas(), "busy_timeout": 0})
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+async def test_sqlite_pragmas(engine: AsyncEngine) -> None:
+    async with engine.connect() as conn:
+        assert await conn.scalar(text("PRAGMA journal_mode")) == "wal"
+        assert await conn.scalar(text("PRAGMA synchronous")) == 1  # NORMAL
+        assert await conn.scalar(text("PRAGMA foreign_keys")) == 1
+
+
+async def test_sqlite_write_lane(engine: AsyncEngine) -> None:
+    write_lane = SQLiteWriteLane(timeout=10)
+    write_lane.attach(engine)
+
+    async def write(value: int) -> None:
+        async with engine.connect() as conn:
+            await conn.execute(select(counter_table))
+            await conn.execute(insert(counter_table).values(value=value))
+            # (other writers try to write in the meantime)
+            await asyncio.sleep(0.01)
+            if value % 2:
+                await conn.rollback()
+            else:
+                await conn.commit()
+
+    await asyncio.gather(*(write(value) for value in range(10)))
+
+    async with engine.connect() as conn:
+        assert await conn.scalar(select(func.count()).select_from(counter_table)) == 5
+    # writers have waited for their turn instead of failing
+    assert write_lane.waits > 0
@@ -0,0 +1,74 @@
+import random
+from typing import Optional
+
+import pytest
+
+from planty.infrastructure.ordering import (
+    ORDERING_STEP,
+    assign_ordering_keys,
+    min_ordering_gap,
+    rebalanced_ordering_keys,
+)
+
+S = ORDERING_STEP
+
+
+@pytest.mark.parametrize(
+    "current_keys, expected_keys",
+    [
+        ([], []),
+        ([None, None, None], [0, S, 2 * S]),
+        ([0, S, None], [0, S, 2 * S]),  # append
+        ([None, 0, S], [-S, 0, S]),  # prepend
+        ([0, None, S], [0, S // 2, S]),  # insert
+        ([0, S], [0, S]),  # (nothing changed)
+        ([0, 2 * S], [0, 2 * S]),  # remove
+        ([2 * S, 0, S], [-S, 0, S]),  # move last to the beginning
+        ([0, 2 * S, S], [0, S // 2, S]),  # move last to the middle
+        ([5, 6, None], [5, 6, 6 + S]),  # (dense keys are valid too)
+        ([5, None, 6], rebalanced_ordering_keys(3)),  # no gap left
+    ],
+)
+def test_assign_ordering_keys(
+    current_keys: list[Optional[int]], expected_keys: list[int]
+) -> None:
+    assert assign_ordering_keys(current_keys) == expected_keys
+
+
+def test_assign_ordering_keys_changes_as_few_keys_as_possible() -> None:
+    rng = random.Random(42)
+    for _ in range(300):
+        n_items = rng.randint(0, 30)
+        current_keys: list[Optional[int]] = [
+            key if rng.random() < 0.9 else None
+            for key in rebalanced_ordering_keys(n_items)
+        ]
+        rng.shuffle(current_keys)
+        new_keys = assign_ordering_keys(current_keys)
+        assert new_keys == sorted(set(new_keys))
+        # only new items and items out of the longest increasing subsequence
+        # get new keys
+        n_changed = sum(new != old for new, old in zip(new_keys, current_keys))
+        assert n_changed == n_items - _longest_increasing_subsequence_length(
+            [key for key in current_keys if key is not None]
+        )
+
+
+def test_repeated_moves_to_the_same_place_rebalance() -> None:
+    keys: list[Optional[int]] = list(rebalanced_ordering_keys(3))
+    for _ in range(100):
+        # move the last item between the first two ones
+        new_keys = assign_ordering_keys([keys[0], keys[-1], *keys[1:-1]])
+        assert new_keys == sorted(set(new_keys))
+        keys = list(new_keys)
+    gap = min_ordering_gap([key for key in keys if key is not None])
+    assert gap is not None and gap > 0
+
+
+def _longest_increasing_subsequence_length(keys: list[int]) -> int:
+    lengths = [1] * len(keys)
+    for i in range(len(keys)):
+        for j in range(i):
+            if keys[j] < keys[i]:
+                lengths[i] = max(lengths[i], lengths[j] + 1)
+    return max(lengths, default=0)
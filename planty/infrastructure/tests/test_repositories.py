@@ -0,0 +1,167 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from uuid import UUID
+
+import pytest
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from planty.domain.task import Section
+from planty.infrastructure.database import (
+    Base,
+    get_sqlite_pragmas,
+    set_sqlite_pragmas,
+)
+from planty.infrastructure.models import UserModel
+from planty.infrastructure.repositories import (
+    SQLAlchemyChangeLogRepository,
+    SQLAlchemySectionRepository,
+    SQLAlchemyTaskRepository,
+)
+from planty.utils import generate_uuid
+
+
+@pytest.fixture
+async def engine(tmp_path: Path) -> AsyncIterator[AsyncEngine]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    set_sqlite_pragmas(engine, get_sqlite_pragmas())
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def user_id(engine: AsyncEngine) -> UUID:
+    user_id = generate_uuid()
+    async with async_sessionmaker(engine)() as session:
+        session.add(UserModel(id=user_id, email="user@example.com", hashed_password=""))
+        await session.commit()
+    return user_id
+
+
+@pytest.fixture
+async def session(engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
+    async with async_sessionmaker(engine)() as session:
+        yield session
+
+
+@pytest.fixture
+def section_repo(session: AsyncSession) -> SQLAlchemySectionRepository:
+    return SQLAlchemySectionRepository(session, SQLAlchemyTaskRepository(session))
+
+
+async def _add_section(
+    section_repo: SQLAlchemySectionRepository,
+    user_id: UUID,
+    title: str,
+    parent_id: Optional[UUID],
+    index: int,
+    has_subsections: bool = False,
+) -> Section:
+    section = Section(
+        user_id=user_id,
+        title=title,
+        parent_id=parent_id,
+        tasks=[],
+        subsections=[],
+        has_subsections=has_subsections,
+        has_tasks=False,
+    )
+    await section_repo.add(section, index=index)
+    return section
+
+
+async def test_get_subtree_without_tasks_and_is_in_subtree(
+    section_repo: SQLAlchemySectionRepository, user_id: UUID
+) -> None:
+    # root
+    # ├── current
+    # │   ├── today
+    # │   │   └── morning
+    # │   └── this week
+    # └── later
+    root = await _add_section(section_repo, user_id, "root", None, 0, True)
+    current = await _add_section(section_repo, user_id, "current", root.id, 0, True)
+    later = await _add_section(section_repo, user_id, "later", root.id, 1)
+    today = await _add_section(section_repo, user_id, "today", current.id, 0, True)
+    this_week = await _add_section(section_repo, user_id, "this week", current.id, 1)
+    morning = await _add_section(section_repo, user_id, "morning", today.id, 0)
+
+    subtree = await section_repo.get_subtree_without_tasks(current.id)
+    assert subtree.title == "current"
+    assert [s.title for s in subtree.subsections] == ["today", "this week"]
+    assert [s.title for s in subtree.subsections[0].subsections] == ["morning"]
+    assert not subtree.subsections[1].subsections
+
+    for section, subtree_root, expected in [
+        (current, current, True),
+        (today, current, True),
+        (morning, current, True),
+        (this_week, root, True),
+        (later, current, False),
+        (current, today, False),
+        (root, current, False),
+    ]:
+        assert (
+            await section_repo.is_in_subtree(section.id, subtree_root.id) == expected
+        ), (section.title, subtree_root.title)
+
+
+async def test_change_log_versions_follow_commit_order(
+    engine: AsyncEngine, user_id: UUID
+) -> None:
+    # Two transactions change data of a user: the first one records its change
+    # first, but is committed after the second one. A client which syncs in
+    # between mustn't skip the change of the first one.
+    # (SQLite serializes writers anyway, but with PostgreSQL the second
+    # transaction would be committed first)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        section_repo = SQLAlchemySectionRepository(
+            session, SQLAlchemyTaskRepository(session)
+        )
+        SQLAlchemyChangeLogRepository(session)
+        root = await _add_section(section_repo, user_id, "root", None, 0, True)
+        await session.commit()
+
+    async def get_changes(since: int) -> tuple[int, set[UUID]]:
+        # -> (current version, ids of changed entities)
+        async with session_maker() as session:
+            change_log_repo = SQLAlchemyChangeLogRepository(session)
+            changes = await change_log_repo.get_changes(user_id, since)
+            return await change_log_repo.get_data_version(user_id), {
+                entity_id for _, _, entity_id, _ in changes
+            }
+
+    async def add_section(
+        title: str, commit: bool = True
+    ) -> tuple[Section, AsyncSession]:
+        session = session_maker()
+        SQLAlchemyChangeLogRepository(session)
+        section_repo = SQLAlchemySectionRepository(
+            session, SQLAlchemyTaskRepository(session)
+        )
+        section = await _add_section(section_repo, user_id, title, root.id, 0)
+        await session.flush()
+        if commit:
+            await session.commit()
+            await session.close()
+        return section, session
+
+    cursor, _ = await get_changes(since=0)
+    first_section, first_session = await add_section("first", commit=False)
+    second_adding = asyncio.create_task(add_section("second"))
+    await asyncio.sleep(0.2)
+
+    cursor, seen_ids = await get_changes(since=cursor)
+    await first_session.commit()
+    await first_session.close()
+    second_section, _ = await second_adding
+    _, later_seen_ids = await get_changes(since=cursor)
+    assert {first_section.id, second_section.id} <= seen_ids | later_seen_ids
@@ -1,15 +1,44 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from planty.application.router import router as tasks_router
 from planty.application.auth import (
     fastapi_users_obj,
     cookie_auth_backend,
 )
+from planty.application.metrics import RequestMetricsMiddleware, request_metrics
 from planty.application.schemas import UserCreate, UserRead, UserUpdate
+from planty.application.services.attachments_gc import AttachmentsGarbageCollector
+from planty.config import settings
+from planty.infrastructure.database import engine, read_only_engine
+from planty.infrastructure.s3 import create_s3_client
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    async with create_s3_client() as s3_client:
+        app.state.s3_client = s3_client
+        app.state.attachments_gc = AttachmentsGarbageCollector(s3_client)
+        gc_task = None
+        if settings.attachments_gc_interval > 0:
+            gc_task = asyncio.create_task(app.state.attachments_gc.run())
+        try:
+            yield
+        finally:
+            if gc_task is not None:
+                gc_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await gc_task
+
 
 app = FastAPI(
     title="Planty",
+    lifespan=lifespan,
     swagger_ui_parameters={"persistAuthorization": True},
 )
 
@@ -33,6 +62,26 @@ app.include_router(
     tags=["auth"],
 )
 
+if settings.request_metrics_enabled:
+    request_metrics.attach(engine)
+    if read_only_engine is not engine:
+        request_metrics.attach(read_only_engine)
+    app.add_middleware(RequestMetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics() -> PlainTextResponse:
+        return PlainTextResponse(
+            request_metrics.to_prometheus(),
+            media_type="text/plain; version=0.0.4",
+        )
+
+
+if settings.profiling_enabled:
+    # (pyinstrument is a dev dependency, so it's imported only if needed)
+    from planty.application.profiling import ProfilingMiddleware
+
+    app.add_middleware(ProfilingMiddleware)
+
 
 app.add_middleware(
     CORSMiddleware,
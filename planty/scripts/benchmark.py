@@ -0,0 +1,834 @@
+# Benchmarks for performance-sensitive parts of the backend.
+#
+# Every benchmark recreates all tables in the given database (a separate
+# SQLite file by default), so never point `--db-url` to a real database.
+#
+# Usage: python -m planty.scripts.benchmark --help
+
+import asyncio
+import contextlib
+import random
+import statistics
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from uuid import UUID
+
+import typer
+from aiobotocore.session import get_session
+from aiohttp import web
+from fastapi_users.authentication.strategy.db import DatabaseStrategy
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from fastapi_users_db_sqlalchemy.access_token import SQLAlchemyAccessTokenDatabase
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import selectinload
+
+from planty.application.auth import TOKEN_LIFETIME, CachedDatabaseStrategy
+from planty.application.schemas import (
+    ArchivedTasks,
+    TaskMoveRequest,
+    TaskUpdateRequest,
+)
+from planty.application.services.responses_converter import (
+    convert_archived_tasks_to_response,
+    convert_tasks_to_response,
+)
+from planty.application.services.attachments import (
+    delete_objects,
+    generate_presigned_post_url,
+)
+from planty.application.services.tasks import SectionService, TaskService
+from planty.application.services.user_manager import UserManager
+from planty.application.uow import SqlAlchemyUnitOfWork
+from planty.config import settings
+from planty.domain.task import Attachment, Task
+from planty.infrastructure.cache import access_token_cache
+from planty.infrastructure.database import (
+    Base,
+    SQLiteWriteLane,
+    get_sqlite_pragmas,
+    set_sqlite_pragmas,
+)
+from planty.infrastructure.models import (
+    AccessTokenModel,
+    AttachmentModel,
+    SectionModel,
+    TaskModel,
+    UserModel,
+)
+from planty.infrastructure.ordering import ORDERING_STEP
+from planty.infrastructure.s3 import create_s3_client
+from planty.infrastructure.repositories import (
+    SQLAlchemySectionRepository,
+    SQLAlchemyTaskRepository,
+)
+from planty.utils import generate_uuid, get_datetime_now
+
+app = typer.Typer(no_args_is_help=True)
+
+DEFAULT_DB_URL = "sqlite+aiosqlite:///planty_benchmark.db"
+
+WORDS = (
+    "buy call read write watch fix plan book clean cook learn pay send check "
+    "review prepare visit order update water plants groceries report taxes "
+    "letter doctor dentist car bike garden kitchen project meeting invoice "
+    "movie series podcast article course exercise run swim laundry window"
+).split()
+
+
+@contextlib.asynccontextmanager
+async def benchmark_session_maker(
+    db_url: str,
+    setup_engine: Optional[Callable[[AsyncEngine], None]] = None,
+    pool_size: int = 5,
+    pool_timeout: float = 30,
+) -> AsyncIterator[async_sessionmaker[AsyncSession]]:
+    engine = create_async_engine(db_url, pool_size=pool_size, pool_timeout=pool_timeout)
+    if setup_engine is not None:
+        setup_engine(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+
+
+async def create_user(session: AsyncSession) -> UUID:
+    user_id = generate_uuid()
+    await session.execute(
+        insert(UserModel),
+        [
+            {
+                "id": user_id,
+                "email": f"{user_id}@example.com",
+                "hashed_password": "",
+                "is_active": True,
+                "is_superuser": False,
+                "is_verified": True,
+                "added_at": get_datetime_now(),
+            }
+        ],
+    )
+    return user_id
+
+
+async def create_section(
+    session: AsyncSession,
+    user_id: UUID,
+    parent_id: Optional[UUID] = None,
+    index: int = 0,
+    has_tasks: bool = False,
+    has_subsections: bool = False,
+) -> UUID:
+    section_id = generate_uuid()
+    parent_path = (
+        await session.scalar(
+            select(SectionModel.path).where(SectionModel.id == parent_id)
+        )
+        if parent_id is not None
+        else "/"
+    )
+    await session.execute(
+        insert(SectionModel),
+        [
+            {
+                "id": section_id,
+                "title": random_title(),
+                "user_id": user_id,
+                "parent_id": parent_id,
+                "path": f"{parent_path}{section_id.hex}/",
+                "added_at": get_datetime_now(),
+                "index": index,
+                "has_tasks": has_tasks,
+                "has_subsections": has_subsections,
+            }
+        ],
+    )
+    return section_id
+
+
+async def create_tasks(
+    session: AsyncSession,
+    user_id: UUID,
+    section_id: UUID,
+    n_tasks: int,
+    archived_ratio: float = 0.0,
+    batch_size: int = 5000,
+) -> list[UUID]:
+    task_ids = []
+    rows: list[dict[str, Any]] = []
+    for i in range(n_tasks):
+        task_id = generate_uuid()
+        task_ids.append(task_id)
+        rows.append(
+            {
+                "id": task_id,
+                "user_id": user_id,
+                "section_id": section_id,
+                "title": random_title(),
+                "description": random_title(n_words=8),
+                "is_completed": False,
+                "is_archived": random.random() < archived_ratio,
+                "added_at": get_datetime_now(),
+                "index": i * ORDERING_STEP,
+            }
+        )
+        if len(rows) == batch_size:
+            await session.execute(insert(TaskModel), rows)
+            rows = []
+    if rows:
+        await session.execute(insert(TaskModel), rows)
+    return task_ids
+
+
+async def create_attachments(
+    session: AsyncSession, task_ids: list[UUID], batch_size: int = 5000
+) -> None:
+    rows = [
+        {
+            "id": generate_uuid(),
+            "added_at": get_datetime_now(),
+            "index": 0,
+            "task_id": task_id,
+            "aes_key_b64": "",
+            "aes_iv_b64": "",
+            "s3_file_key": str(generate_uuid()),
+        }
+        for task_id in task_ids
+    ]
+    for i in range(0, len(rows), batch_size):
+        await session.execute(insert(AttachmentModel), rows[i : i + batch_size])
+
+
+def random_title(n_words: int = 3) -> str:
+    return " ".join(random.choices(WORDS, k=n_words)).capitalize()
+
+
+async def measure(
+    func: Callable[[], Awaitable[Any]], n_runs: int, n_warmup_runs: int = 3
+) -> list[float]:
+    for _ in range(n_warmup_runs):
+        await func()
+    latencies = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        await func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(title: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    p50, p99 = quantiles[49], quantiles[98]
+    print(
+        f"{title:<40} p50={p50 * 1000:8.2f} ms  p99={p99 * 1000:8.2f} ms  "
+        f"(n={len(latencies)})"
+    )
+
+
+@app.callback()
+def main() -> None:
+    # (makes Typer keep subcommands even if there is only one of them)
+    pass
+
+
+@app.command()
+def search(
+    db_url: str = DEFAULT_DB_URL,
+    n_tasks: list[int] = typer.Option([10_000, 30_000, 100_000]),
+    n_queries: int = 200,
+) -> None:
+    """p50/p99 latency of task search for users with many tasks"""
+    asyncio.run(_search(db_url, n_tasks, n_queries))
+
+
+async def _search(db_url: str, n_tasks_options: list[int], n_queries: int) -> None:
+    for n_tasks in n_tasks_options:
+        async with benchmark_session_maker(db_url) as session_maker:
+            async with session_maker() as session:
+                user_id = await create_user(session)
+                section_id = await create_section(session, user_id, has_tasks=True)
+                await create_tasks(session, user_id, section_id, n_tasks)
+                await session.commit()
+
+            async with session_maker() as session:
+                task_repo = SQLAlchemyTaskRepository(session)
+                queries = iter(
+                    [
+                        " ".join(word[:4] for word in random.sample(WORDS, k=2))
+                        for _ in range(n_queries + 3)
+                    ]
+                )
+
+                async def run_query() -> None:
+                    await task_repo.search(user_id, next(queries), limit=50)
+
+                latencies = await measure(run_query, n_runs=n_queries)
+            report(f"search, {n_tasks} tasks", latencies)
+
+
+@app.command()
+def move(
+    db_url: str = DEFAULT_DB_URL,
+    n_tasks: list[int] = typer.Option([100, 1_000, 10_000]),
+    n_moves: int = 200,
+) -> None:
+    """p50/p99 latency of moving a task inside sections of different sizes"""
+    asyncio.run(_move(db_url, n_tasks, n_moves))
+
+
+async def _move(db_url: str, n_tasks_options: list[int], n_moves: int) -> None:
+    for n_tasks in n_tasks_options:
+        async with benchmark_session_maker(db_url) as session_maker:
+            async with session_maker() as session:
+                user_id = await create_user(session)
+                section_id = await create_section(session, user_id, has_tasks=True)
+                task_ids = await create_tasks(session, user_id, section_id, n_tasks)
+                await session.commit()
+
+            async def move_task() -> None:
+                uow = SqlAlchemyUnitOfWork()
+                uow.session_factory = session_maker
+                async with uow:
+                    await SectionService(uow).move_task(
+                        user_id,
+                        TaskMoveRequest(
+                            task_id=random.choice(task_ids),
+                            section_to_id=section_id,
+                            index=random.randrange(n_tasks),
+                        ),
+                    )
+                    await uow.commit()
+
+            latencies = await measure(move_task, n_runs=n_moves)
+            report(f"move task, {n_tasks} tasks in section", latencies)
+
+
+@app.command()
+def materialize(
+    db_url: str = DEFAULT_DB_URL,
+    n_tasks: int = 10_000,
+    n_runs: int = 20,
+) -> None:
+    """p50/p99 latency of creating entities of a section with many tasks"""
+    asyncio.run(_materialize(db_url, n_tasks, n_runs))
+
+
+async def _materialize(db_url: str, n_tasks: int, n_runs: int) -> None:
+    async with benchmark_session_maker(db_url) as session_maker:
+        async with session_maker() as session:
+            user_id = await create_user(session)
+            section_id = await create_section(session, user_id, has_tasks=True)
+            task_ids = await create_tasks(session, user_id, section_id, n_tasks)
+            await create_attachments(session, task_ids)
+            await session.commit()
+
+        async with session_maker() as session:
+            task_repo = SQLAlchemyTaskRepository(session)
+            section_repo = SQLAlchemySectionRepository(session, task_repo)
+
+            async def get_section() -> None:
+                # (new rows are loaded every time)
+                session.expunge_all()
+                await section_repo.get(section_id)
+
+            latencies = await measure(get_section, n_runs=n_runs)
+            report(f"get section, {n_tasks} tasks", latencies)
+
+            result = await session.execute(
+                select(TaskModel).options(selectinload(TaskModel.attachments))
+            )
+            task_models = result.scalars().all()
+
+            async def get_entities() -> None:
+                await task_repo.get_entities(task_models)
+
+            latencies = await measure(get_entities, n_runs=n_runs)
+            report(f"only entities, {n_tasks} tasks", latencies)
+
+
+@app.command()
+def archived(
+    db_url: str = DEFAULT_DB_URL,
+    n_tasks: list[int] = typer.Option([1_000, 10_000, 100_000]),
+    page_size: int = 50,
+    n_runs: int = 100,
+) -> None:
+    """p50/p99 latency of getting pages of archived tasks of different depths"""
+    asyncio.run(_archived(db_url, n_tasks, page_size, n_runs))
+
+
+async def _archived(
+    db_url: str, n_tasks_options: list[int], page_size: int, n_runs: int
+) -> None:
+    for n_tasks in n_tasks_options:
+        async with benchmark_session_maker(db_url) as session_maker:
+            async with session_maker() as session:
+                user_id = await create_user(session)
+                section_id = await create_section(session, user_id, has_tasks=True)
+                await create_tasks(
+                    session, user_id, section_id, n_tasks, archived_ratio=1.0
+                )
+                await session.commit()
+
+            async with session_maker() as session:
+                task_repo = SQLAlchemyTaskRepository(session)
+                for depth in (0, n_tasks // 2, n_tasks - page_size):
+                    # (the key of the last task of the previous page)
+                    after = None
+                    if depth > 0:
+                        row = (
+                            await session.execute(
+                                select(TaskModel.added_at, TaskModel.id)
+                                .order_by(
+                                    TaskModel.added_at.desc(), TaskModel.id.desc()
+                                )
+                                .offset(depth - 1)
+                                .limit(1)
+                            )
+                        ).one()
+                        after = (row.added_at, row.id)
+
+                    async def get_page() -> None:
+                        session.expunge_all()
+                        await task_repo.get_archived_tasks(
+                            user_id, limit=page_size, after=after
+                        )
+
+                    latencies = await measure(get_page, n_runs=n_runs)
+                    report(f"archived page, {depth}/{n_tasks} tasks", latencies)
+
+
+@app.command()
+def section(
+    db_url: str = DEFAULT_DB_URL,
+    n_tasks: list[int] = typer.Option([1_000, 10_000]),
+    archived_ratio: float = 0.95,
+    n_runs: int = 100,
+) -> None:
+    """p50/p99 latency of getting a section with mostly archived tasks"""
+    asyncio.run(_section(db_url, n_tasks, archived_ratio, n_runs))
+
+
+async def _section(
+    db_url: str, n_tasks_options: list[int], archived_ratio: float, n_runs: int
+) -> None:
+    for n_tasks in n_tasks_options:
+        async with benchmark_session_maker(db_url) as session_maker:
+            async with session_maker() as session:
+                user_id = await create_user(session)
+                section_id = await create_section(session, user_id, has_tasks=True)
+                task_ids = await create_tasks(
+                    session, user_id, section_id, n_tasks, archived_ratio=archived_ratio
+                )
+                await create_attachments(session, task_ids)
+                await session.commit()
+
+            async with session_maker() as session:
+                section_repo = SQLAlchemySectionRepository(
+                    session, SQLAlchemyTaskRepository(session)
+                )
+
+                # (what `get_section` endpoint does)
+                async def get_section() -> None:
+                    session.expunge_all()
+                    await section_repo.get(section_id)
+
+                latencies = await measure(get_section, n_runs=n_runs)
+                report(
+                    f"get section, {n_tasks} tasks ({archived_ratio:.0%} archived)",
+                    latencies,
+                )
+
+
+@app.command()
+def convert(
+    n_tasks: list[int] = typer.Option([1_000, 5_000, 20_000]),
+    n_runs: int = 50,
+) -> None:
+    """p50/p99 latency of converting task lists into response schemas"""
+    asyncio.run(_convert(n_tasks, n_runs))
+
+
+async def _convert(n_tasks_options: list[int], n_runs: int) -> None:
+    user_id, section_id = generate_uuid(), generate_uuid()
+    for n_tasks in n_tasks_options:
+        tasks = []
+        for i in range(n_tasks):
+            task = Task(
+                user_id=user_id,
+                section_id=section_id,
+                title=random_title(),
+                description=random_title(n_words=8),
+            )
+            if i % 10 == 0:
+                task.attachments = [
+                    Attachment(
+                        aes_key_b64="",
+                        aes_iv_b64="",
+                        s3_file_key=str(generate_uuid()),
+                        task_id=task.id,
+                    )
+                ]
+            tasks.append(task)
+
+        async def convert_tasks() -> None:
+            convert_tasks_to_response(tasks)
+
+        latencies = await measure(convert_tasks, n_runs=n_runs)
+        report(f"convert {n_tasks} tasks", latencies)
+
+        archived_tasks = ArchivedTasks(tasks=tasks)
+
+        async def convert_archived_tasks() -> None:
+            convert_archived_tasks_to_response(archived_tasks)
+
+        latencies = await measure(convert_archived_tasks, n_runs=n_runs)
+        report(f"convert {n_tasks} archived tasks", latencies)
+
+
+@app.command()
+def auth(
+    db_url: str = DEFAULT_DB_URL,
+    n_requests: int = 2_000,
+) -> None:
+    """Requests/sec of authenticating by access token with and without cache"""
+    asyncio.run(_auth(db_url, n_requests))
+
+
+async def _auth(db_url: str, n_requests: int) -> None:
+    async with benchmark_session_maker(db_url) as session_maker:
+        async with session_maker() as session:
+            user_id = await create_user(session)
+            token = "benchmark-token"
+            session.add(
+                AccessTokenModel(
+                    token=token, user_id=user_id, created_at=get_datetime_now()
+                )
+            )
+            await session.commit()
+
+        for title, strategy_class in [
+            ("without cache", DatabaseStrategy),
+            ("with cache", CachedDatabaseStrategy),
+        ]:
+            access_token_cache.clear()
+
+            # (what `current_user` does on every request)
+            async def authenticate() -> None:
+                async with session_maker() as session:
+                    user_manager = UserManager(
+                        SQLAlchemyUserDatabase(session, UserModel)
+                    )
+                    strategy = strategy_class(
+                        SQLAlchemyAccessTokenDatabase(session, AccessTokenModel),
+                        lifetime_seconds=TOKEN_LIFETIME,
+                    )
+                    user = await strategy.read_token(token, user_manager)
+                    assert user is not None
+                    user.to_entity()
+
+            latencies = await measure(authenticate, n_runs=n_requests)
+            report(f"authenticate, {title}", latencies)
+            print(
+                f"{'':<40} {n_requests / sum(latencies):8.0f} requests/sec  "
+                f"hit ratio={access_token_cache.hit_ratio:.3f}"
+            )
+
+
+@contextlib.asynccontextmanager
+async def run_s3_stand_in() -> AsyncIterator[str]:
+    # Local HTTP server which accepts every request (there is nothing to
+    # store), so that only the client side of S3 requests is measured
+    async def handle(request: web.Request) -> web.Response:
+        await request.read()
+        return web.Response(status=204)
+
+    web_app = web.Application()
+    web_app.router.add_route("*", "/{path:.*}", handle)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        host, port = runner.addresses[0][:2]
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
+
+
+@app.command()
+def s3(
+    endpoint_url: Optional[str] = typer.Option(
+        None, help="S3 (e.g. MinIO) to use instead of a local stand-in"
+    ),
+    n_runs: int = 200,
+) -> None:
+    """p50/p99 latency of S3 requests with a client per call and a shared one"""
+    asyncio.run(_s3(endpoint_url, n_runs))
+
+
+async def _s3(endpoint_url: Optional[str], n_runs: int) -> None:
+    async with contextlib.AsyncExitStack() as stack:
+        if endpoint_url is None:
+            endpoint_url = await stack.enter_async_context(run_s3_stand_in())
+
+        # (how attachments were handled before: a session per request and a
+        # client per call)
+        @contextlib.asynccontextmanager
+        async def create_client_per_call() -> AsyncIterator[Any]:
+            async with get_session().create_client(
+                "s3",
+                endpoint_url=endpoint_url,
+                aws_secret_access_key=settings.aws_secret_access_key,
+                aws_access_key_id=settings.aws_access_key_id,
+            ) as client:
+                yield client
+
+        async def presign_per_call() -> None:
+            async with create_client_per_call() as client:
+                await generate_presigned_post_url(client)
+
+        async def delete_per_call() -> None:
+            async with create_client_per_call() as client:
+                await delete_objects(client, [str(generate_uuid())])
+
+        latencies = await measure(presign_per_call, n_runs=n_runs)
+        report("presign, client per call", latencies)
+        latencies = await measure(delete_per_call, n_runs=n_runs)
+        report("delete, client per call", latencies)
+
+        shared_client = await stack.enter_async_context(create_s3_client(endpoint_url))
+
+        async def presign_shared() -> None:
+            await generate_presigned_post_url(shared_client)
+
+        async def delete_shared() -> None:
+            await delete_objects(shared_client, [str(generate_uuid())])
+
+        latencies = await measure(presign_shared, n_runs=n_runs)
+        report("presign, shared client", latencies)
+        latencies = await measure(delete_shared, n_runs=n_runs)
+        report("delete, shared client", latencies)
+
+
+@app.command()
+def sqlite(
+    db_url: str = DEFAULT_DB_URL,
+    n_workers: int = 50,
+    n_requests: int = 2_000,
+    write_ratio: float = 0.3,
+    pool_size: int = typer.Option(
+        50, help="Connections of the pool (without overflow), 5 by default in the app"
+    ),
+) -> None:
+    """Requests/sec of concurrent reads and writes with the SQLite runtime profile"""
+    asyncio.run(_sqlite(db_url, n_workers, n_requests, write_ratio, pool_size))
+
+
+async def _sqlite(
+    db_url: str, n_workers: int, n_requests: int, write_ratio: float, pool_size: int
+) -> None:
+    def setup_before(engine: AsyncEngine) -> None:
+        # (the journal mode is persistent, so the default one is set back)
+        set_sqlite_pragmas(engine, {"foreign_keys": "ON", "journal_mode": "DELETE"})
+
+    def setup_runtime_profile(engine: AsyncEngine) -> None:
+        set_sqlite_pragmas(engine, get_sqlite_pragmas())
+        SQLiteWriteLane(timeout=settings.sqlite_busy_timeout).attach(engine)
+
+    for title, setup_engine in [
+        ("foreign keys only", setup_before),
+        ("runtime profile", setup_runtime_profile),
+    ]:
+        async with benchmark_session_maker(
+            db_url, setup_engine, pool_size=pool_size
+        ) as session_maker:
+            sections = []
+            async with session_maker() as session:
+                for _ in range(10):
+                    user_id = await create_user(session)
+                    section_id = await create_section(session, user_id, has_tasks=True)
+                    task_ids = await create_tasks(session, user_id, section_id, 20)
+                    sections.append((user_id, section_id, task_ids))
+                await session.commit()
+
+            latencies: dict[str, list[float]] = {"read": [], "write": []}
+            errors: dict[str, int] = {}
+            requests_left = n_requests
+
+            # (what `get_section` and `update_task` endpoints do)
+            async def worker() -> None:
+                nonlocal requests_left
+                while requests_left > 0:
+                    requests_left -= 1
+                    user_id, section_id, task_ids = random.choice(sections)
+                    kind = "write" if random.random() < write_ratio else "read"
+                    uow = SqlAlchemyUnitOfWork()
+                    uow.session_factory = session_maker
+                    start = time.perf_counter()
+                    try:
+                        async with uow:
+                            if kind == "write":
+                                await TaskService(uow).update_task(
+                                    user_id,
+                                    TaskUpdateRequest(
+                                        id=random.choice(task_ids),
+                                        title=random_title(),
+                                    ),
+                                )
+                                await uow.commit()
+                            else:
+                                await SectionService(uow).get_section(
+                                    user_id, section_id
+                                )
+                    except Exception as e:
+                        error = str(e).splitlines()[0]
+                        errors[error] = errors.get(error, 0) + 1
+                        continue
+                    latencies[kind].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(n_workers)))
+            elapsed = time.perf_counter() - start
+
+            for kind, kind_latencies in latencies.items():
+                report(f"{kind}, {title}", kind_latencies)
+            n_succeeded = sum(map(len, latencies.values()))
+            print(
+                f"{'':<40} {n_succeeded / elapsed:8.0f} requests/sec  "
+                f"failed={n_requests - n_succeeded}"
+            )
+            for error, count in errors.items():
+                print(f"{'':<40} {count} x {error}")
+
+
+@app.command()
+def pool(
+    db_url: str = DEFAULT_DB_URL,
+    n_concurrent: int = 200,
+    n_requests: int = 2_000,
+    pool_timeout: float = typer.Option(
+        5, help="How long requests wait for a connection, 30 by default in the app"
+    ),
+) -> None:
+    """Connections used by concurrent authenticated writes with shared sessions"""
+    asyncio.run(_pool(db_url, n_concurrent, n_requests, pool_timeout))
+
+
+async def _pool(
+    db_url: str, n_concurrent: int, n_requests: int, pool_timeout: float
+) -> None:
+    checkouts = checked_out = peak = 0
+
+    def setup_engine(engine: AsyncEngine) -> None:
+        set_sqlite_pragmas(engine, get_sqlite_pragmas())
+        SQLiteWriteLane(timeout=settings.sqlite_busy_timeout).attach(engine)
+
+        @event.listens_for(engine.sync_engine.pool, "checkout")
+        def on_checkout(*args: Any) -> None:
+            nonlocal checkouts, checked_out, peak
+            checkouts += 1
+            checked_out += 1
+            peak = max(peak, checked_out)
+
+        @event.listens_for(engine.sync_engine.pool, "checkin")
+        def on_checkin(*args: Any) -> None:
+            nonlocal checked_out
+            checked_out -= 1
+
+    for title, share_session in [
+        ("separate sessions", False),
+        ("shared session", True),
+    ]:
+        checked_out = 0
+        # (the default pool of the app: 5 connections and 10 of overflow)
+        async with benchmark_session_maker(
+            db_url, setup_engine, pool_timeout=pool_timeout
+        ) as session_maker:
+            users = []
+            async with session_maker() as session:
+                for i in range(10):
+                    user_id = await create_user(session)
+                    token = f"benchmark-token-{i}"
+                    session.add(
+                        AccessTokenModel(
+                            token=token, user_id=user_id, created_at=get_datetime_now()
+                        )
+                    )
+                    section_id = await create_section(session, user_id, has_tasks=True)
+                    task_ids = await create_tasks(session, user_id, section_id, 20)
+                    users.append((token, task_ids))
+                await session.commit()
+            checkouts = peak = 0
+
+            latencies: list[float] = []
+            errors: dict[str, int] = {}
+            requests_left = n_requests
+
+            # (what `update_task` endpoint does, when the user isn't cached)
+            async def handle_request(session: AsyncSession) -> None:
+                token, task_ids = random.choice(users)
+                user_manager = UserManager(SQLAlchemyUserDatabase(session, UserModel))
+                strategy: DatabaseStrategy[Any, Any, Any] = DatabaseStrategy(
+                    SQLAlchemyAccessTokenDatabase(session, AccessTokenModel),
+                    lifetime_seconds=TOKEN_LIFETIME,
+                )
+                user = await strategy.read_token(token, user_manager)
+                assert user is not None
+                if share_session:
+                    # (see `current_user`)
+                    await session.commit()
+                    uow = SqlAlchemyUnitOfWork(session)
+                else:
+                    uow = SqlAlchemyUnitOfWork()
+                    uow.session_factory = session_maker
+                async with uow:
+                    await TaskService(uow).update_task(
+                        user.id,
+                        TaskUpdateRequest(
+                            id=random.choice(task_ids), title=random_title()
+                        ),
+                    )
+                    await uow.commit()
+
+            async def client() -> None:
+                nonlocal requests_left
+                while requests_left > 0:
+                    requests_left -= 1
+                    start = time.perf_counter()
+                    try:
+                        # (the session of the request, see `get_async_session`)
+                        async with session_maker() as session:
+                            await handle_request(session)
+                    except Exception as e:
+                        error = str(e).splitlines()[0]
+                        errors[error] = errors.get(error, 0) + 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(n_concurrent)))
+            elapsed = time.perf_counter() - start
+
+            report(f"update task, {title}", latencies)
+            print(
+                f"{'':<40} {len(latencies) / elapsed:8.0f} requests/sec  "
+                f"failed={n_requests - len(latencies)}  "
+                f"checkouts/request={checkouts / n_requests:.2f}  "
+                f"peak connections={peak}"
+            )
+            for error, count in errors.items():
+                print(f"{'':<40} {count} x {error}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,293 @@
+# Generates a synthetic dataset of production scale: users with deep section
+# trees, thousands of tasks (some of them recurring or due soon) and heavy
+# archives. Tasks are put into the leaves of the trees.
+#
+# Generated users are verified, and every one of them gets a random access
+# token. Tokens are saved to `--tokens-file` (readable by the owner only),
+# where `planty.scripts.load_test` takes them from.
+#
+# Data is added to the database given by `--db-url`, tables are created if
+# they don't exist. Without it, data is added to the database of the app,
+# which has to be confirmed (or `--yes` given).
+#
+# Usage: python -m planty.scripts.generate_dataset --help
+
+import asyncio
+import json
+import os
+import random
+import secrets
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Optional, get_args
+from uuid import UUID
+
+import typer
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from planty.config import settings
+from planty.domain.types import RecurrencePeriodType
+from planty.infrastructure.database import Base, database_url
+from planty.infrastructure.models import (
+    AccessTokenModel,
+    SectionModel,
+    TaskModel,
+    UserModel,
+)
+from planty.infrastructure.ordering import ORDERING_STEP
+from planty.infrastructure.repositories import SQLAlchemyUserStatsRepository
+from planty.scripts.benchmark import random_title
+from planty.utils import generate_uuid, get_datetime_now, get_today
+
+LOAD_TOKENS_FILE = Path("load_test_tokens.json")
+
+app = typer.Typer()
+
+
+class DatasetGenerator:
+    def __init__(
+        self,
+        session: AsyncSession,
+        depth: int,
+        fan_out: int,
+        n_tasks: int,
+        archived_ratio: float,
+        recurring_ratio: float,
+        due_ratio: float,
+        batch_size: int = 5000,
+    ):
+        self._session = session
+        self._depth = depth
+        self._fan_out = fan_out
+        self._n_tasks = n_tasks
+        self._archived_ratio = archived_ratio
+        self._recurring_ratio = recurring_ratio
+        self._due_ratio = due_ratio
+        self._batch_size = batch_size
+        self._rows: dict[type[Base], list[dict[str, Any]]] = {
+            UserModel: [],
+            AccessTokenModel: [],
+            SectionModel: [],
+            TaskModel: [],
+        }
+        # access tokens of added users
+        self.tokens: list[str] = []
+
+    async def add_user(self) -> UUID:
+        user_id = generate_uuid()
+        now = get_datetime_now()
+        self._rows[UserModel].append(
+            {
+                "id": user_id,
+                "email": f"load-{user_id.hex}@example.com",
+                "hashed_password": "",
+                "is_active": True,
+                "is_superuser": False,
+                "is_verified": True,
+                "added_at": now,
+            }
+        )
+        token = secrets.token_urlsafe()
+        self._rows[AccessTokenModel].append(
+            {"token": token, "user_id": user_id, "created_at": now}
+        )
+        self.tokens.append(token)
+        leaf_ids: list[UUID] = []
+        self._add_section(user_id, None, "/", 0, 0, leaf_ids)
+        # (tasks are spread over the leaves unevenly, like in real trees)
+        task_counts = dict.fromkeys(leaf_ids, 0)
+        for section_id in random.choices(leaf_ids, k=self._n_tasks):
+            task_counts[section_id] += 1
+        for section_id, n_tasks in task_counts.items():
+            for index in range(n_tasks):
+                self._add_task(user_id, section_id, index)
+        await self._flush(force=False)
+        return user_id
+
+    def _add_section(
+        self,
+        user_id: UUID,
+        parent_id: Optional[UUID],
+        parent_path: str,
+        level: int,
+        index: int,
+        leaf_ids: list[UUID],
+    ) -> None:
+        section_id = generate_uuid()
+        path = f"{parent_path}{section_id.hex}/"
+        is_leaf = level == self._depth
+        self._rows[SectionModel].append(
+            {
+                "id": section_id,
+                "title": random_title() if parent_id else "[System] Root section",
+                "user_id": user_id,
+                "parent_id": parent_id,
+                "path": path,
+                "added_at": get_datetime_now(),
+                "index": index * ORDERING_STEP,
+                "has_tasks": is_leaf,
+                "has_subsections": not is_leaf,
+            }
+        )
+        if is_leaf:
+            leaf_ids.append(section_id)
+            return
+        for child_index in range(self._fan_out):
+            self._add_section(
+                user_id, section_id, path, level + 1, child_index, leaf_ids
+            )
+
+    def _add_task(self, user_id: UUID, section_id: UUID, index: int) -> None:
+        is_archived = random.random() < self._archived_ratio
+        is_recurring = not is_archived and random.random() < self._recurring_ratio
+        has_due_date = is_recurring or random.random() < self._due_ratio
+        self._rows[TaskModel].append(
+            {
+                "id": generate_uuid(),
+                "user_id": user_id,
+                "section_id": section_id,
+                "title": random_title(),
+                "description": random_title(n_words=8),
+                "is_completed": is_archived,
+                "is_archived": is_archived,
+                "added_at": get_datetime_now(),
+                "index": index * ORDERING_STEP,
+                "due_to": (
+                    get_today() + timedelta(days=random.randint(-30, 60))
+                    if has_due_date
+                    else None
+                ),
+                "recurrence_period": random.randint(1, 3) if is_recurring else None,
+                "recurrence_type": (
+                    random.choice(get_args(RecurrencePeriodType))
+                    if is_recurring
+                    else None
+                ),
+                "flexible_recurrence_mode": (
+                    random.random() < 0.5 if is_recurring else None
+                ),
+            }
+        )
+
+    async def _flush(self, force: bool) -> None:
+        # (rows of parents are inserted before rows of their children)
+        if not force and len(self._rows[TaskModel]) < self._batch_size:
+            return
+        for Model, rows in self._rows.items():
+            for i in range(0, len(rows), self._batch_size):
+                await self._session.execute(
+                    insert(Model), rows[i : i + self._batch_size]
+                )
+            rows.clear()
+
+    async def finish(self) -> None:
+        await self._flush(force=True)
+        await SQLAlchemyUserStatsRepository(self._session).rebuild()
+
+
+async def generate_dataset(
+    db_url: str,
+    tokens_file: Path,
+    n_users: int,
+    depth: int,
+    fan_out: int,
+    n_tasks: int,
+    archived_ratio: float,
+    recurring_ratio: float,
+    due_ratio: float,
+    seed: Optional[int],
+) -> None:
+    random.seed(seed)
+    engine = create_async_engine(db_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        start = time.perf_counter()
+        async with async_sessionmaker(engine)() as session:
+            generator = DatasetGenerator(
+                session,
+                depth=depth,
+                fan_out=fan_out,
+                n_tasks=n_tasks,
+                archived_ratio=archived_ratio,
+                recurring_ratio=recurring_ratio,
+                due_ratio=due_ratio,
+            )
+            for _ in range(n_users):
+                await generator.add_user()
+            await generator.finish()
+            await session.commit()
+    finally:
+        await engine.dispose()
+    save_tokens(tokens_file, generator.tokens)
+    n_sections = sum(fan_out**level for level in range(depth + 1))
+    print(
+        f"Added {n_users} users with {n_sections} sections and {n_tasks} tasks "
+        f"each in {time.perf_counter() - start:.1f} s, their tokens are saved to "
+        f"{tokens_file}"
+    )
+
+
+def save_tokens(tokens_file: Path, tokens: list[str]) -> None:
+    # (tokens of the previous run are replaced, they let anyone in)
+    tokens_file.unlink(missing_ok=True)
+    fd = os.open(tokens_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as file:
+        json.dump(tokens, file)
+
+
+def load_tokens(tokens_file: Path) -> list[str]:
+    tokens: list[str] = json.loads(tokens_file.read_text())
+    return tokens
+
+
+@app.command()
+def generate(
+    db_url: Optional[str] = typer.Option(
+        None, help="The database of the app if not set (has to be confirmed)"
+    ),
+    yes: bool = typer.Option(
+        False, "--yes", help="Add data to the database of the app without asking"
+    ),
+    tokens_file: Path = typer.Option(
+        LOAD_TOKENS_FILE, help="Where access tokens of generated users are saved"
+    ),
+    n_users: int = 10,
+    depth: int = typer.Option(
+        4, min=1, help="Levels of sections below the root section"
+    ),
+    fan_out: int = typer.Option(3, help="Subsections of every non-leaf section"),
+    n_tasks: int = typer.Option(2_000, help="Tasks of every user"),
+    archived_ratio: float = 0.7,
+    recurring_ratio: float = 0.1,
+    due_ratio: float = 0.3,
+    seed: Optional[int] = None,
+) -> None:
+    if db_url is None:
+        if not yes:
+            typer.confirm(
+                "Add verified users with access tokens to the database of the app "
+                f"({settings.mode} mode)?",
+                abort=True,
+            )
+        db_url = database_url
+    asyncio.run(
+        generate_dataset(
+            db_url,
+            tokens_file,
+            n_users,
+            depth,
+            fan_out,
+            n_tasks,
+            archived_ratio,
+            recurring_ratio,
+            due_ratio,
+            seed,
+        )
+    )
+
+
+if __name__ == "__main__":
+    app()
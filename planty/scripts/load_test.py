@@ -0,0 +1,408 @@
+# End-to-end load test: concurrent clients send a realistic mix of requests
+# (see `ENDPOINTS`) on behalf of users generated by
+# `planty.scripts.generate_dataset` (with tokens from its `--tokens-file`),
+# either to the app run in this process (by default) or to a running server
+# (`--base-url`). Throughput and latency percentiles of every route are
+# printed and stored as JSON, so that results of different versions can be
+# compared with `compare`.
+#
+# Writes of the mix change the dataset, so regenerate it to compare results
+# strictly.
+#
+# Usage: python -m planty.scripts.load_test --help
+
+import asyncio
+import contextlib
+import json
+import random
+import statistics
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Optional
+from uuid import UUID
+
+import httpx
+import typer
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from planty.infrastructure.database import database_url
+from planty.infrastructure.models import AccessTokenModel, SectionModel, TaskModel
+from planty.scripts.benchmark import WORDS, random_title
+from planty.scripts.generate_dataset import LOAD_TOKENS_FILE, load_tokens
+from planty.utils import get_datetime_now, get_today
+
+app = typer.Typer(no_args_is_help=True)
+
+
+@dataclass
+class LoadUser:
+    token: str
+    leaf_section_ids: list[UUID]
+    # (tasks which aren't archived)
+    task_ids: list[UUID]
+
+
+@dataclass
+class EndpointRequest:
+    method: str
+    url: str
+    params: Optional[dict[str, Any]] = None
+    json: Optional[dict[str, Any]] = None
+
+
+def _get_section(user: LoadUser) -> EndpointRequest:
+    return EndpointRequest(
+        "GET", f"/api/section/{random.choice(user.leaf_section_ids)}"
+    )
+
+
+def _get_tasks_by_date(user: LoadUser) -> EndpointRequest:
+    today = get_today()
+    return EndpointRequest(
+        "GET",
+        "/api/task/by_date",
+        params={
+            "not_before": today.isoformat(),
+            "not_after": (today + timedelta(days=7)).isoformat(),
+            "with_overdue": True,
+        },
+    )
+
+
+def _get_tasks_count_by_period(user: LoadUser) -> EndpointRequest:
+    today = get_today()
+    return EndpointRequest(
+        "GET",
+        "/api/task/count_by_period",
+        params={
+            "not_before": (today - timedelta(days=365)).isoformat(),
+            "not_after": today.isoformat(),
+        },
+    )
+
+
+def _create_task(user: LoadUser) -> EndpointRequest:
+    return EndpointRequest(
+        "POST",
+        "/api/task",
+        json={
+            "section_id": str(random.choice(user.leaf_section_ids)),
+            "title": random_title(),
+        },
+    )
+
+
+def _update_task(user: LoadUser) -> EndpointRequest:
+    return EndpointRequest(
+        "PATCH",
+        "/api/task",
+        json={"id": str(random.choice(user.task_ids)), "title": random_title()},
+    )
+
+
+def _toggle_task_completed(user: LoadUser) -> EndpointRequest:
+    return EndpointRequest(
+        "POST",
+        "/api/task/toggle_completed",
+        # (without archiving, so that tasks of the mix aren't used up)
+        json={"task_id": str(random.choice(user.task_ids)), "auto_archive": False},
+    )
+
+
+def _move_task(user: LoadUser) -> EndpointRequest:
+    return EndpointRequest(
+        "POST",
+        "/api/task/move",
+        json={
+            "task_id": str(random.choice(user.task_ids)),
+            "section_to_id": str(random.choice(user.leaf_section_ids)),
+            "index": 0,
+        },
+    )
+
+
+# route -> (weight in the mix, request of the given user)
+ENDPOINTS: dict[str, tuple[int, Callable[[LoadUser], EndpointRequest]]] = {
+    "GET /api/sections": (20, lambda user: EndpointRequest("GET", "/api/sections")),
+    "GET /api/section/{section_id}": (30, _get_section),
+    "GET /api/task/by_date": (8, _get_tasks_by_date),
+    "GET /api/task/count_by_period": (2, _get_tasks_count_by_period),
+    "GET /api/task/search": (
+        5,
+        lambda user: EndpointRequest(
+            "GET", "/api/task/search", params={"query": random.choice(WORDS)}
+        ),
+    ),
+    "GET /api/tasks/archived": (
+        5,
+        lambda user: EndpointRequest("GET", "/api/tasks/archived"),
+    ),
+    "POST /api/task": (8, _create_task),
+    "PATCH /api/task": (10, _update_task),
+    "POST /api/task/toggle_completed": (6, _toggle_task_completed),
+    "POST /api/task/move": (6, _move_task),
+}
+
+
+async def load_users(db_url: str, tokens_file: Path, max_users: int) -> list[LoadUser]:
+    # (columns of models of fastapi-users aren't typed as SQLAlchemy columns)
+    token_column: Any = AccessTokenModel.token
+    user_id_column: Any = AccessTokenModel.user_id
+    is_load_token = token_column.in_(load_tokens(tokens_file)[:max_users])
+    engine = create_async_engine(db_url)
+    try:
+        async with engine.begin() as conn:
+            # (tokens of generated users may have expired since)
+            await conn.execute(
+                update(AccessTokenModel)
+                .where(is_load_token)
+                .values(created_at=get_datetime_now())
+            )
+            tokens = (
+                await conn.execute(
+                    select(token_column, user_id_column).where(is_load_token)
+                )
+            ).all()
+            users = []
+            for token, user_id in tokens:
+                leaf_section_ids = (
+                    await conn.scalars(
+                        select(SectionModel.id).where(
+                            (SectionModel.user_id == user_id)
+                            & SectionModel.parent_id.is_not(None)
+                            & SectionModel.has_subsections.is_(False)
+                        )
+                    )
+                ).all()
+                task_ids = (
+                    await conn.scalars(
+                        select(TaskModel.id).where(
+                            (TaskModel.user_id == user_id)
+                            & TaskModel.is_archived.is_(False)
+                        )
+                    )
+                ).all()
+                if leaf_section_ids and task_ids:
+                    users.append(
+                        LoadUser(token, list(leaf_section_ids), list(task_ids))
+                    )
+    finally:
+        await engine.dispose()
+    return users
+
+
+@contextlib.asynccontextmanager
+async def create_client(base_url: Optional[str]) -> AsyncIterator[httpx.AsyncClient]:
+    if base_url is not None:
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            yield client
+        return
+
+    from planty.main import app as fastapi_app
+
+    # (`ASGITransport` doesn't run the lifespan of the app)
+    async with (
+        fastapi_app.router.lifespan_context(fastapi_app),
+        httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=fastapi_app), base_url="http://load"
+        ) as client,
+    ):
+        yield client
+
+
+def summarize(latencies: list[float], n_errors: int, elapsed: float) -> dict[str, Any]:
+    latencies = sorted(latencies)
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p90, p99 = quantiles[49], quantiles[89], quantiles[98]
+    else:
+        p50 = p90 = p99 = latencies[0] if latencies else 0.0
+    return {
+        "requests": len(latencies),
+        "errors": n_errors,
+        "requests_per_sec": len(latencies) / elapsed,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": p50 * 1000,
+        "p90_ms": p90 * 1000,
+        "p99_ms": p99 * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+async def run_load_test(
+    users: list[LoadUser],
+    client: httpx.AsyncClient,
+    concurrency: int,
+    n_requests: int,
+) -> dict[str, Any]:
+    routes = list(ENDPOINTS)
+    weights = [weight for weight, _ in ENDPOINTS.values()]
+    latencies: dict[str, list[float]] = {route: [] for route in routes}
+    errors: dict[str, int] = dict.fromkeys(routes, 0)
+    requests_left = n_requests
+
+    async def worker() -> None:
+        nonlocal requests_left
+        while requests_left > 0:
+            requests_left -= 1
+            user = random.choice(users)
+            [route] = random.choices(routes, weights)
+            request = ENDPOINTS[route][1](user)
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    request.method,
+                    request.url,
+                    params=request.params,
+                    json=request.json,
+                    headers={"Cookie": f"fastapiusersauth={user.token}"},
+                )
+            except httpx.HTTPError:
+                errors[route] += 1
+                continue
+            if response.is_error:
+                errors[route] += 1
+                continue
+            latencies[route].append(time.perf_counter() - start)
+            if route == "POST /api/task":
+                user.task_ids.append(UUID(response.json()["id"]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed_sec": elapsed,
+        "total": summarize(
+            [latency for values in latencies.values() for latency in values],
+            sum(errors.values()),
+            elapsed,
+        ),
+        "routes": {
+            route: summarize(latencies[route], errors[route], elapsed)
+            for route in routes
+            if latencies[route] or errors[route]
+        },
+    }
+
+
+def print_results(results: dict[str, Any]) -> None:
+    for route, summary in [*results["routes"].items(), ("total", results["total"])]:
+        print(
+            f"{route:<36} {summary['requests_per_sec']:8.1f} req/s  "
+            f"p50={summary['p50_ms']:8.2f} ms  p90={summary['p90_ms']:8.2f} ms  "
+            f"p99={summary['p99_ms']:8.2f} ms  errors={summary['errors']}"
+        )
+
+
+async def _run(
+    db_url: str,
+    tokens_file: Path,
+    base_url: Optional[str],
+    n_users: int,
+    concurrency: int,
+    n_requests: int,
+    output: Path,
+    seed: Optional[int],
+) -> None:
+    random.seed(seed)
+    users = await load_users(db_url, tokens_file, n_users)
+    if not users:
+        raise typer.BadParameter(
+            "There are no generated users, run planty.scripts.generate_dataset"
+        )
+    async with create_client(base_url) as client:
+        results = await run_load_test(users, client, concurrency, n_requests)
+    results = {
+        "created_at": get_datetime_now().isoformat(),
+        "target": base_url or "in-process app",
+        "config": {
+            "n_users": len(users),
+            "concurrency": concurrency,
+            "n_requests": n_requests,
+        },
+        **results,
+    }
+    print_results(results)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results are saved to {output}")
+
+
+@app.command()
+def run(
+    db_url: str = typer.Option(
+        database_url, help="Database with generated users (of the app by default)"
+    ),
+    tokens_file: Path = typer.Option(
+        LOAD_TOKENS_FILE, help="Access tokens saved by generate_dataset"
+    ),
+    base_url: Optional[str] = typer.Option(
+        None, help="URL of a running server, the app is run in this process if not set"
+    ),
+    n_users: int = 100,
+    concurrency: int = 20,
+    n_requests: int = 5_000,
+    output: Path = Path("load_test_results.json"),
+    seed: Optional[int] = None,
+) -> None:
+    """Sends a mix of requests and reports throughput and latencies per route"""
+    asyncio.run(
+        _run(
+            db_url,
+            tokens_file,
+            base_url,
+            n_users,
+            concurrency,
+            n_requests,
+            output,
+            seed,
+        )
+    )
+
+
+@app.command()
+def compare(
+    baseline: Path,
+    current: Path,
+    max_regression: float = typer.Option(
+        0.2, help="Fail if p99 of a route grows more than by this fraction"
+    ),
+) -> None:
+    """Compares results of two runs, e.g. before and after a change"""
+    baseline_results = json.loads(baseline.read_text())
+    current_results = json.loads(current.read_text())
+    regressed = []
+    for route, summary in [
+        *current_results["routes"].items(),
+        ("total", current_results["total"]),
+    ]:
+        baseline_summary = (
+            baseline_results["total"]
+            if route == "total"
+            else baseline_results["routes"].get(route)
+        )
+        if baseline_summary is None:
+            continue
+        changes = {
+            key: summary[key] / baseline_summary[key] - 1
+            if baseline_summary[key]
+            else 0.0
+            for key in ["requests_per_sec", "p50_ms", "p99_ms"]
+        }
+        print(
+            f"{route:<36} req/s {changes['requests_per_sec']:+7.1%}  "
+            f"p50 {changes['p50_ms']:+7.1%}  p99 {changes['p99_ms']:+7.1%}"
+        )
+        if changes["p99_ms"] > max_regression:
+            regressed.append(route)
+    if regressed:
+        print(f"p99 has regressed by more than {max_regression:.0%}: {regressed}")
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,45 @@
+# Removes changes older than `settings.change_log_retention_days` from the
+# change log of /api/sync (see `SQLAlchemyChangeLogRepository`), which would
+# grow without bound otherwise. Clients with older cursors get 410 and load
+# all the data again. Meant to be run periodically (e.g. daily by cron).
+#
+# Usage: python -m planty.scripts.prune_change_log --help
+
+import asyncio
+from datetime import timedelta
+
+import typer
+
+from planty.config import settings
+from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.repositories import SQLAlchemyChangeLogRepository
+from planty.utils import get_datetime_now
+
+app = typer.Typer()
+
+
+async def prune_change_log(retention_days: int, batch_size: int) -> None:
+    added_before = get_datetime_now() - timedelta(days=retention_days)
+    n_removed = 0
+    while True:
+        async with raw_async_session_maker() as session:
+            n_removed_now = await SQLAlchemyChangeLogRepository(session).prune(
+                added_before, batch_size
+            )
+            await session.commit()
+        if not n_removed_now:
+            break
+        n_removed += n_removed_now
+    print(f"Removed {n_removed} changes added before {added_before:%Y-%m-%d %H:%M}")
+
+
+@app.command()
+def prune(
+    retention_days: int = typer.Option(settings.change_log_retention_days, min=0),
+    batch_size: int = typer.Option(10_000, min=1, help="Changes removed at once"),
+) -> None:
+    asyncio.run(prune_change_log(retention_days, batch_size))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,124 @@
+# Renumbers ordering keys in crowded sections, i.e. in ones where some
+# neighbouring keys are too close to insert many more items between them (see
+# `planty.infrastructure.ordering`). Requests rebalance sections by themselves
+# when there is no gap left at all, this script is meant to be run
+# periodically (e.g. by cron) to do it in advance.
+#
+# NOTE: it must be run without concurrent writers (e.g. with the app stopped
+# or in a maintenance window): keys are read and rewritten without locks, so
+# items added or moved by requests in between could end up out of order.
+#
+# Rows are read in batches (in order of sections and keys) and every batch is
+# committed separately, so memory use doesn't depend on the size of the
+# database.
+#
+# Usage: python -m planty.scripts.rebalance_ordering --help
+
+import asyncio
+import itertools
+from typing import Any, Optional
+
+import typer
+from sqlalchemy import ColumnElement, Row, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.models import SectionModel, TaskModel
+from planty.infrastructure.ordering import (
+    ORDERING_STEP,
+    min_ordering_gap,
+    rebalanced_ordering_keys,
+)
+
+app = typer.Typer()
+
+
+async def rebalance_ordering(min_gap: int, batch_size: int) -> None:
+    async with raw_async_session_maker() as session:
+        n_task_groups = await _rebalance(
+            session,
+            TaskModel,
+            group_column=TaskModel.section_id,
+            where=TaskModel.is_archived.is_(False),
+            min_gap=min_gap,
+            batch_size=batch_size,
+        )
+        # (root sections have no siblings: every user has a single one)
+        n_section_groups = await _rebalance(
+            session,
+            SectionModel,
+            group_column=SectionModel.parent_id,
+            where=SectionModel.parent_id.is_not(None),
+            min_gap=min_gap,
+            batch_size=batch_size,
+        )
+    print(
+        f"Rebalanced tasks of {n_task_groups} sections "
+        f"and subsections of {n_section_groups} sections"
+    )
+
+
+async def _rebalance(
+    session: AsyncSession,
+    model: type[TaskModel] | type[SectionModel],
+    group_column: InstrumentedAttribute[Any],
+    where: ColumnElement[bool],
+    min_gap: int,
+    batch_size: int,
+) -> int:
+    n_groups = 0
+    # rows of the last group read, which may continue in the next batch
+    pending_rows: list[Row[Any]] = []
+    after: Optional[tuple[Any, ...]] = None
+    while True:
+        query = (
+            select(group_column, model.index, model.id)
+            .where(where)
+            .order_by(group_column, model.index, model.id)
+            .limit(batch_size)
+        )
+        if after is not None:
+            query = query.where(tuple_(group_column, model.index, model.id) > after)
+        batch = list((await session.execute(query)).all())
+        is_last_batch = len(batch) < batch_size
+        if batch:
+            after = tuple(batch[-1])
+        groups = [
+            list(group)
+            for _, group in itertools.groupby(
+                pending_rows + batch, key=lambda row: row[0]
+            )
+        ]
+        pending_rows = [] if is_last_batch or not groups else groups.pop()
+
+        rows: list[dict[str, Any]] = []
+        for group in groups:
+            _, keys, ids = zip(*group)
+            gap = min_ordering_gap(keys)
+            if gap is None or gap >= min_gap:
+                continue
+            n_groups += 1
+            rows.extend(
+                {"id": id_, "index": key}
+                for id_, key in zip(ids, rebalanced_ordering_keys(len(keys)))
+            )
+        if rows:
+            await session.execute(update(model), rows)
+        await session.commit()
+        if is_last_batch:
+            return n_groups
+
+
+@app.command()
+def rebalance(
+    min_gap: int = typer.Option(
+        ORDERING_STEP // 2**10, help="Rebalance sections with closer keys"
+    ),
+    batch_size: int = typer.Option(10_000, min=1, help="Rows read at once"),
+) -> None:
+    asyncio.run(rebalance_ordering(min_gap, batch_size))
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,31 @@
+# Recounts counters of user data in `user_stats` from scratch. The counters are
+# updated incrementally by requests (see `SQLAlchemyUserStatsRepository`), so
+# this script is only needed if they have drifted, e.g. after data was changed
+# by hand.
+#
+# Usage: python -m planty.scripts.rebuild_user_stats --help
+
+import asyncio
+
+import typer
+
+from planty.infrastructure.database import raw_async_session_maker
+from planty.infrastructure.repositories import SQLAlchemyUserStatsRepository
+
+app = typer.Typer()
+
+
+async def rebuild_user_stats() -> None:
+    async with raw_async_session_maker() as session:
+        n_users = await SQLAlchemyUserStatsRepository(session).rebuild()
+        await session.commit()
+    print(f"Rebuilt stats of {n_users} users")
+
+
+@app.command()
+def rebuild() -> None:
+    asyncio.run(rebuild_user_stats())
+
+
+if __name__ == "__main__":
+    app()